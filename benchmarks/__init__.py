@@ -0,0 +1,3 @@
+"""
+Benchmark suite of the gain_calculator hot paths, see benchmarks.run
+"""
@@ -0,0 +1,161 @@
+"""
+Benchmark cases of the hot paths of the package. Every case is a function taking the case size and returning the
+callable to be timed, the setup done in the function itself is not timed. Cases needing pfac raise ImportError
+when it is not installed and are skipped by the runner.
+"""
+import importlib
+import itertools
+import os
+
+import numpy as np
+
+import gain_calculator as gc
+from gain_calculator.core import fac_wrapper
+from gain_calculator.core.fac_wrapper.generator import FacFiles
+from gain_calculator.core.rates import read_excitation_table
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+data_folders = {
+    "Fe n=6": os.path.join(root, "run", "atomic_data", "Fe 1*2 2*8 up to n=6"),
+    "Ge n=6": os.path.join(root, "examples", "atomic_data", "Ge 1*2 2*8 up to n=6"),
+    "Ge n=3": os.path.join(root, "tests", "core", "atomic_data", "Ge 1*2 2*8 up to n=3")
+}
+"""Bundled atomic data, the n=3 data are the only ones with the excitation table"""
+
+gain_data_filename = os.path.join(root, "run", "data", "1D_Fe_data.npy")
+
+lower_level = "2p-1(1)1.3s+1(1)2"
+upper_level = "2p-1(1)1.3p-1(1)0"
+
+cases = []
+
+
+def benchmark(name, sizes):
+    """
+    Decorator registering a benchmark case
+    :param str name: name of the case
+    :param list sizes: sizes the case is run at, passed to the decorated function
+    """
+    def __register(create):
+        cases.append((name, sizes, create))
+        return create
+
+    return __register
+
+
+def get_files(data):  # type: (str) -> FacFiles
+    folder = data_folders[data]
+    binary_filename = os.path.join(folder, "fac_binary_temp")
+    return FacFiles(
+        binary_filename=binary_filename,
+        excitation_binary_filename=binary_filename + ".ce",
+        hamiltonian_binary_filename=binary_filename + ".ham",
+        levels_binary_filename=binary_filename + ".en",
+        transitions_binary_filename=binary_filename + ".tr",
+        levels_filename=os.path.join(folder, "levels.txt"),
+        excitation_filename=os.path.join(folder, "excitation.txt"),
+        transitions_filename=os.path.join(folder, "transitions.txt"),
+        dir_name=folder
+    )
+
+
+def get_grid(size):
+    return np.linspace(100.0, 1000.0, size), np.logspace(19, 22, size)
+
+
+def get_gain_calculator(size):  # type: (int) -> gc.GainCalculator
+    # The bundled table resampled to size points, the lookups scale with the table length
+    calculator = gc.GainCalculator(gain_data_filename)
+    rows = np.arange(size) % len(calculator.data["temperatures"])
+    for level in ["upper", "lower"]:
+        calculator.data[level] = {name: np.asarray(values)[rows] for name, values in calculator.data[level].items()}
+    return calculator
+
+
+@benchmark("parse_levels", sizes=["Ge n=3", "Fe n=6", "Ge n=6"])
+def parse_levels(data):
+    filename = get_files(data).levels_filename
+    return lambda: gc.core.LevelTable.from_file(filename)
+
+
+@benchmark("parse_transitions", sizes=["Ge n=3", "Fe n=6", "Ge n=6"])
+def parse_transitions(data):
+    filename = get_files(data).transitions_filename
+    return lambda: fac_wrapper.read_transitions_table(filename)
+
+
+@benchmark("parse_excitation", sizes=["Ge n=3"])
+def parse_excitation(data):
+    filename = get_files(data).excitation_filename
+    return lambda: read_excitation_table(filename)
+
+
+@benchmark("transition_lookup", sizes=["Fe n=6", "Ge n=6"])
+def transition_lookup(data):
+    files = get_files(data)
+    levels = gc.core.LevelTable.from_file(files.levels_filename)
+    transitions = fac_wrapper.read_transitions_table(files.transitions_filename)
+
+    def __lookup():
+        mask = (transitions["lower"] == levels.get_index(lower_level)) & (
+                transitions["upper"] == levels.get_index(upper_level))
+        return transitions[mask][0]
+
+    return __lookup
+
+
+@benchmark("native_population_single", sizes=["Ge n=3"])
+def native_population_single(data):
+    files = get_files(data)
+    model = gc.core.RateModel.from_files(files)
+    return lambda: model.get_populations(900.0, 1e20)
+
+
+@benchmark("native_population_grid", sizes=[4, 16])
+def native_population_grid(size):
+    model = gc.core.RateModel.from_files(get_files("Ge n=3"))
+    temperatures, densities = get_grid(size)
+    return lambda: [model.get_populations(temperature, density)
+                    for temperature, density in itertools.product(temperatures, densities)]
+
+
+@benchmark("native_sensitivities_grid", sizes=[4, 16])
+def native_sensitivities_grid(size):
+    model = gc.core.RateModel.from_files(get_files("Ge n=3"))
+    temperatures, densities = get_grid(size)
+    return lambda: [model.get_sensitivities(temperature, density)
+                    for temperature, density in itertools.product(temperatures, densities)]
+
+
+@benchmark("fac_population_single", sizes=["Ge n=3", "Fe n=6"])
+def fac_population_single(data):
+    importlib.import_module("pfac.crm")
+    files = get_files(data)
+    return lambda: fac_wrapper.calculate_populations(files, 10, "get_populations", [0, 1], 900.0, 1e20, 1.0)
+
+
+@benchmark("fac_population_grid", sizes=[2, 4])
+def fac_population_grid(size):
+    importlib.import_module("pfac.crm")
+    files = get_files("Fe n=6")
+    temperatures, densities = get_grid(size)
+    return lambda: [fac_wrapper.calculate_populations(files, 10, "get_populations", [0, 1], temperature, density, 1.0)
+                    for temperature, density in itertools.product(temperatures, densities)]
+
+
+@benchmark("gain_calculator_lookup", sizes=[200, 2000, 20000])
+def gain_calculator_lookup(size):
+    calculator = get_gain_calculator(size)
+    temperatures = calculator.data["upper"]["temperature"][:100]
+    densities = calculator.data["upper"]["electron_density"][:100]
+    return lambda: calculator.get_population_at("upper", densities, temperatures)
+
+
+@benchmark("gain_evaluation", sizes=[200, 2000])
+def gain_evaluation(size):
+    importlib.import_module("pfac.crm")
+    calculator = get_gain_calculator(size)
+    temperatures = calculator.data["upper"]["temperature"][:100]
+    densities = calculator.data["upper"]["electron_density"][:100]
+    return lambda: calculator.get_gain(densities, temperatures, temperatures, 20, 10, 26)
@@ -0,0 +1,96 @@
+"""
+Runner of the benchmark suite. Every case is timed at all its sizes and the results are appended to a JSON lines
+history, one line per case and size, so the timings of different commits can be compared. Run it from the
+repository root::
+
+    python -m benchmarks.run
+    python -m benchmarks.run --filter native --repeat 10
+
+The history lines hold **timestamp**, **commit**, **python**, **benchmark**, **size**, **number** (calls per
+repeat), **repeat**, **best** and **median** (seconds per call).
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import timeit
+
+import numpy as np
+
+from benchmarks import cases
+
+default_history = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.jsonl")
+
+
+def get_commit():  # type: () -> str
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=cases.root).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(function, repeat, min_time=0.2):
+    """
+    Time a function, the number of calls per repeat is chosen so that a repeat takes at least min_time
+    :return: tuple of number of calls per repeat and ndarray of seconds per call of each repeat
+    """
+    number = 1
+    while True:
+        elapsed = timeit.timeit(function, number=number)
+        if elapsed >= min_time or number >= 1e6:
+            break
+        number *= max(2, int(min_time / max(elapsed, 1e-9)))
+    timings = np.array(timeit.repeat(function, number=number, repeat=repeat)) / number
+    return number, timings
+
+
+def run(name_filter=None, repeat=5):
+    """
+    Run the benchmark cases
+    :param str name_filter: only cases containing this substring are run
+    :param int repeat: number of repeats of every case
+    :return: list of result dicts
+    """
+    base = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": get_commit(),
+        "python": platform.python_version()
+    }
+    results = []
+    for name, sizes, create in cases.cases:
+        if name_filter and name_filter not in name:
+            continue
+        for size in sizes:
+            try:
+                function = create(size)
+            except ImportError as error:
+                print("{:<28} {:<10} skipped: {}".format(name, size, error))
+                continue
+            number, timings = measure(function, repeat)
+            result = dict(base, benchmark=name, size=size, number=number, repeat=repeat,
+                          best=float(timings.min()), median=float(np.median(timings)))
+            print("{:<28} {:<10} best {:.4g} s  median {:.4g} s".format(name, size, result["best"],
+                                                                     result["median"]))
+            results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the gain_calculator benchmarks")
+    parser.add_argument("--filter", help="run only benchmarks containing this substring")
+    parser.add_argument("--repeat", type=int, default=5, help="number of repeats of every benchmark")
+    parser.add_argument("--history", default=default_history, help="JSON lines file the results are appended to")
+    parser.add_argument("--no-record", action="store_true", help="do not append the results to the history")
+    arguments = parser.parse_args()
+
+    results = run(arguments.filter, arguments.repeat)
+    if not arguments.no_record:
+        with open(arguments.history, "a") as f:
+            for result in results:
+                f.write(json.dumps(result, sort_keys=True) + "\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,2 @@
 from .get_variable import get_variable
+from .get_variable import get_variables
@@ -2,10 +2,15 @@ from netCDF4 import Dataset
 
 
 def get_variable(filename, variable_name):
+    return get_variables(filename, [variable_name])[0]
+
+
+def get_variables(filename, variable_names):
     root_group = Dataset(filename, "r", format="NETCDF4")
     data_dictionary = root_group.variables
 
-    data = data_dictionary[variable_name][:][-1]
+    # Slice the last timestep in the file instead of reading the whole history
+    data = [data_dictionary[variable_name][-1] for variable_name in variable_names]
 
     root_group.close()
 
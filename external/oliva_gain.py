@@ -12,12 +12,11 @@ def get_previous_gain():
     m_u = 1.6605e-24
 
     filename = "./run/data/variables.nc"
-    positions = ncu.get_variable(filename, 'cell_position')
-    densities = ncu.get_variable(filename, 'cell_density')
-    ionizations = ncu.get_variable(filename, 'cell_ionization')
-    temperatures = ncu.get_variable(filename, 'cell_temperature')
-    ionTemperatures = ncu.get_variable(filename, 'cell_ionTemperature')
-    nucleon_number = ncu.get_variable(filename, 'cell_nucleonNumber')
+    positions, densities, ionizations, temperatures, ionTemperatures, nucleon_number = ncu.get_variables(
+        filename,
+        ['cell_position', 'cell_density', 'cell_ionization', 'cell_temperature', 'cell_ionTemperature',
+         'cell_nucleonNumber']
+    )
 
     electronDensities = np.divide(ionizations * densities, nucleon_number * m_u)
 
@@ -45,12 +44,11 @@ def get_previous_inversion():
     m_u = 1.6605e-24
 
     filename = "./run/data/variables.nc"
-    positions = ncu.get_variable(filename, 'cell_position')
-    densities = ncu.get_variable(filename, 'cell_density')
-    ionizations = ncu.get_variable(filename, 'cell_ionization')
-    temperatures = ncu.get_variable(filename, 'cell_temperature')
-    ionTemperatures = ncu.get_variable(filename, 'cell_ionTemperature')
-    nucleon_number = ncu.get_variable(filename, 'cell_nucleonNumber')
+    positions, densities, ionizations, temperatures, ionTemperatures, nucleon_number = ncu.get_variables(
+        filename,
+        ['cell_position', 'cell_density', 'cell_ionization', 'cell_temperature', 'cell_ionTemperature',
+         'cell_nucleonNumber']
+    )
 
     electronDensities = np.divide(ionizations * densities, nucleon_number * m_u)
 
@@ -9,5 +9,6 @@ from gain_calculator.core import ConfigGroups
 from gain_calculator.core import init
 from gain_calculator.core import print_progress
 from gain_calculator.gain import GainCalculator
+from gain_calculator.gain import GainOptimizer
 
 name = "gain_calculator"
@@ -10,4 +10,14 @@ from gain_calculator.core.classes import Atom
 from gain_calculator.core.classes import ConfigGroups
 from gain_calculator.core.classes import ConfigGroup
 from gain_calculator.core.classes import init
+from gain_calculator.core.executors import get_executor
+from gain_calculator.core.executors import set_executor
+from gain_calculator.core.instrumentation import instrumentation
+from gain_calculator.core.levels import CompactLevel
+from gain_calculator.core.levels import encode_level_names
+from gain_calculator.core.levels import LevelTable
+from gain_calculator.core.rates import RateModel
+from gain_calculator.core.rates import SuperlevelModel
+from gain_calculator.core.emulator import PopulationEmulator
+from gain_calculator.core.quantize import quantize_states
 from gain_calculator.core.utility import print_progress
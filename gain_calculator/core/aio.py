@@ -0,0 +1,277 @@
+"""
+Module containing asyncio counterparts of the population calculations, meant for job orchestration and dashboards
+running many sweeps concurrently on one event loop. The functions submit the points to the executor and return
+asyncio futures right away, await them in a coroutine::
+
+    from gain_calculator.core import aio
+
+    result = await aio.get_level_populations(atom, indices, temperatures, electron_densities, zip)
+
+    pairs, point_futures = aio.submit_level_populations(atom, indices, temperatures, electron_densities, zip)
+    for point_future in asyncio.as_completed(point_futures):
+        populations = await point_future
+
+All sweeps on an event loop share the window of in-flight calculations of their executor, see
+:func:`executors.get_window_size`. Waiting points are submitted by callbacks of the event loop as the results arrive,
+so no thread is blocked per sweep. Cancelling a sweep future cancels all its points, the points not yet submitted
+are dropped and the submitted ones are cancelled where the executor supports it. The serial executor would calculate
+in the event loop thread and block it, so the process pool replaces it as the default here.
+
+The module uses no async syntax, on Python 2 it runs with the trollius backport of asyncio.
+"""
+import collections
+import functools
+import itertools
+import weakref
+
+import numpy as np
+from concurrent import futures
+
+try:
+    import asyncio
+except ImportError:
+    import trollius as asyncio
+
+from gain_calculator.core import executors
+from gain_calculator.core.classes import structurize_populations
+
+
+class Window:
+    """
+    Bounded window of in-flight calculations of an executor shared by all sweeps of an event loop, created by
+    :func:`get_window`. Results are delivered to the loop by done callbacks of the executor futures, results of Ray
+    tasks by polling :func:`ray.wait` from the loop, so no thread waits for any calculation.
+
+    :ivar executor: the executor, never the serial one
+    :ivar int size: maximal number of calls in flight, see :func:`executors.get_window_size`
+    :ivar int running: number of calls in flight
+    :ivar float poll_interval: interval of polling the Ray tasks in s
+    """
+
+    def __init__(self, executor, loop, poll_interval=0.01):
+        self.executor = executor
+        self.size = executor.get_window_size()
+        self.running = 0
+        self.poll_interval = poll_interval
+        # The loop owns the window through the cache of get_window, a strong reference would keep it alive forever
+        self.__loop = weakref.ref(loop)
+        self.__queue = collections.deque()
+        self.__ray_futures = {}
+
+    def __len__(self):
+        return len(self.__queue)
+
+    @property
+    def loop(self):
+        return self.__loop()
+
+    def submit(self, function, *args):  # type: (...) -> asyncio.Future
+        """
+        Queue a call, it is submitted to the executor once the window has room
+        :return: asyncio future of the call result
+        """
+        future = asyncio.Future(loop=self.loop)
+        self.__queue.append((future, function, args))
+        self.__fill()
+        return future
+
+    def __fill(self):
+        while self.running < self.size and self.__queue:
+            future, function, args = self.__queue.popleft()
+            if future.done():  # cancelled while queued
+                continue
+            self.running += 1
+            executor_future = self.executor.submit(function, *args)
+            future.add_done_callback(functools.partial(self.__cancel, executor_future))
+            if isinstance(executor_future, executors.RayFuture):
+                if not self.__ray_futures:
+                    self.loop.call_later(self.poll_interval, self.__poll_ray)
+                self.__ray_futures[executor_future.object_id] = future
+            else:
+                executor_future.add_done_callback(functools.partial(self.__deliver, future))
+
+    @staticmethod
+    def __cancel(executor_future, future):
+        if future.cancelled():
+            executor_future.cancel()
+
+    def __deliver(self, future, executor_future):
+        # Called by the executor in its own thread
+        self.loop.call_soon_threadsafe(self.__finish, future, executor_future)
+
+    def __poll_ray(self):
+        import ray
+
+        object_ids = list(self.__ray_futures)
+        ready, _ = ray.wait(object_ids, num_returns=len(object_ids), timeout=0)
+        for object_id in ready:
+            self.__finish(self.__ray_futures.pop(object_id), executors.RayFuture(object_id))
+        if self.__ray_futures:
+            self.loop.call_later(self.poll_interval, self.__poll_ray)
+
+    def __finish(self, future, executor_future):
+        self.running -= 1
+        if not future.done():
+            try:
+                future.set_result(executor_future.result())
+            except futures.CancelledError:
+                future.cancel()
+            except Exception as error:
+                future.set_exception(error)
+        self.__fill()
+
+
+__windows = weakref.WeakKeyDictionary()
+
+
+def get_window(executor=None, loop=None):  # type: (...) -> Window
+    """
+    Returns the window shared by all sweeps of given executor on given event loop. The serial executor would block
+    the loop, so the process pool is used instead of the default serial one and the serial one is refused.
+
+    :param executor: executor instance or name, the default set by :func:`init` if None
+    :param loop: event loop, the current one if None
+    :return: Window instance
+    """
+    resolved = executors.get_executor(executor)
+    if isinstance(resolved, executors.SerialExecutor):
+        assert executor is None, "The serial executor blocks the event loop, use the process or ray executor"
+        resolved = executors.get_executor(executors.ProcessPoolExecutor.name)
+    loop = loop or asyncio.get_event_loop()
+    windows = __windows.setdefault(loop, {})
+    if resolved not in windows:
+        windows[resolved] = Window(resolved, loop)
+    return windows[resolved]
+
+
+def __collect(point_futures, create_result, loop):
+    # Future of create_result applied to the results of all points, cancelling it cancels the points and a failed
+    # point fails it
+    result = asyncio.Future(loop=loop)
+    remaining = [len(point_futures)]
+
+    def __cancel_points(_):
+        for point_future in point_futures:
+            point_future.cancel()
+
+    def __point_done(point_future):
+        if result.done():
+            return
+        if point_future.cancelled():
+            result.cancel()
+        elif point_future.exception() is not None:
+            result.set_exception(point_future.exception())
+        else:
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                result.set_result(create_result([future.result() for future in point_futures]))
+
+    result.add_done_callback(__cancel_points)
+    for point_future in point_futures:
+        point_future.add_done_callback(__point_done)
+    if not point_futures:
+        result.set_result(create_result([]))
+    return result
+
+
+def __as_array(array_or_number):
+    return np.atleast_1d(np.asarray(array_or_number))
+
+
+def submit_level_populations(atom, indices, temperatures, electron_densities, combine, population_total=1.0,
+                             executor=None, solver="default", reference_solver=None, loop=None):
+    """
+    Submit populations of levels given by FAC indices at every point of a sweep, see
+    :meth:`Atom.get_level_populations`
+
+    :param Atom atom: the atom
+    :param indices: FAC indices of the energy levels
+    :param ndarray temperatures: temperature in eV (could be iterable)
+    :param ndarray electron_densities: electron density in cm^-3 (could be iterable)
+    :param function combine: Function taking two lists and returning a single list of tuples
+    :param float population_total: 1 by default
+    :param executor: executor instance or name, the default set by :func:`init` if None, see :func:`get_window`
+    :param str solver: CRM iteration preset, "fast", "default" or "precise"
+    :param str reference_solver: CRM iteration preset of a second solve, the points then resolve to tuples of
+        populations and convergence error
+    :param loop: event loop, the current one if None
+    :return: tuple of the list of (temperature, electron density) pairs and the list of asyncio futures of the
+        populations at each pair
+    """
+    indices = np.asarray(indices, dtype=int).ravel()
+    pairs = list(combine(__as_array(temperatures), __as_array(electron_densities)))
+    window = get_window(executor, loop)
+    point_futures = []
+    for temperature, electron_density in pairs:
+        function, arguments = atom.get_population_task(indices, temperature, electron_density, population_total,
+                                                       solver, reference_solver)
+        point_futures.append(window.submit(function, *arguments))
+    return pairs, point_futures
+
+
+def get_level_populations(atom, indices, temperatures, electron_densities, combine, population_total=1.0,
+                          executor=None, solver="default", reference_solver=None, loop=None):
+    """
+    Asyncio counterpart of :meth:`Atom.get_level_populations`, parameters are the same as of
+    :func:`submit_level_populations`
+    :return: asyncio future of the numpy structured array returned by :meth:`Atom.get_level_populations`
+    """
+    pairs, point_futures = submit_level_populations(atom, indices, temperatures, electron_densities, combine,
+                                                    population_total, executor, solver, reference_solver, loop)
+
+    def __create_result(results):
+        if reference_solver is not None:
+            populations, convergence_errors = [np.array(column) for column in zip(*results)] if results else ([], [])
+        else:
+            populations, convergence_errors = results, None
+        populations = np.asarray(populations, dtype=float).reshape(len(pairs), -1)
+        return structurize_populations(pairs, populations, convergence_errors)
+
+    return __collect(point_futures, __create_result, get_window(executor, loop).loop)
+
+
+def get_populations(atom, energy_level, temperatures, electron_densities, combine, population_total=1.0,
+                    executor=None, solver="default", reference_solver=None, loop=None):
+    """
+    Asyncio counterpart of :meth:`Atom.get_populations`
+    :param Atom atom: the atom
+    :param EnergyLevel energy_level: the energy level instance
+    :return: asyncio future of the numpy structured array returned by :meth:`Atom.get_populations`
+    """
+    indices = [atom.get_level_table().get_index(energy_level.get_fac_repr())]
+    level_populations = get_level_populations(atom, indices, temperatures, electron_densities, combine,
+                                              population_total, executor, solver, reference_solver, loop)
+
+    def __create_result(results):
+        populations = results[0]
+        pairs = list(zip(populations["temperature"], populations["electron_density"]))
+        convergence_errors = None if reference_solver is None else populations["convergence_error"]
+        return structurize_populations(pairs, populations["population"][:, 0], convergence_errors)
+
+    return __collect([level_populations], __create_result, get_window(executor, loop).loop)
+
+
+def get_transition_populations(transition, temperatures, electron_densities, combine=itertools.product,
+                               population_total=1.0, executor=None, solver="default", reference_solver=None, loop=None):
+    """
+    Asyncio counterpart of :meth:`Transition.get_populations`, both levels come from a single calculation per point
+    :param Transition transition: the transition
+    :return: asyncio future of the dict returned by :meth:`Transition.get_populations`
+    """
+    table = transition.atom.get_level_table()
+    indices = [table.get_index(transition.lower.get_fac_repr()), table.get_index(transition.upper.get_fac_repr())]
+    level_populations = get_level_populations(transition.atom, indices, temperatures, electron_densities, combine,
+                                              population_total, executor, solver, reference_solver, loop)
+
+    def __create_result(results):
+        populations = results[0]
+        pairs = list(zip(populations["temperature"], populations["electron_density"]))
+        convergence_errors = None if reference_solver is None else populations["convergence_error"]
+        return {
+            "lower": structurize_populations(pairs, populations["population"][:, 0] / transition.lower.degeneracy,
+                                             convergence_errors),
+            "upper": structurize_populations(pairs, populations["population"][:, 1] / transition.upper.degeneracy,
+                                             convergence_errors)
+        }
+
+    return __collect([level_populations], __create_result, get_window(executor, loop).loop)
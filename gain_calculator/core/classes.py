@@ -3,28 +3,34 @@ Module containing the core classes of the GainCalculator project. End user shoul
 A convention is used that principal quantum number is denoted n and orbital quantum number is denoted l, keep
 this in mind.
 """
+import collections
 import logging
 import os
 import re
 
 import numpy as np
 import itertools
-import ray
 import typing
+from gain_calculator.core import executors
 from gain_calculator.core import fac_wrapper
+from gain_calculator.core.instrumentation import instrumentation
+from gain_calculator.core.levels import CompactLevel
+from gain_calculator.core.levels import LevelTable
+from gain_calculator.core.rates import RateModel
 
 
-def init(logging_handler=logging.FileHandler(os.devnull)):
+def init(logging_handler=logging.FileHandler(os.devnull), executor="ray"):
     """
-    Must be called anytime you want to use gain_calculator, preferably in main calling script
-    """
-    ray_logger = logging.getLogger('ray')
-    ray_logger.addHandler(logging_handler)
-    ray_logger.propagate = False
+    Must be called anytime you want to use gain_calculator, preferably in main calling script. Sets the default
+    backend of population calculations, see :mod:`gain_calculator.core.executors`. Use executor="serial" to avoid
+    starting Ray for small jobs.
 
-    if not ray.is_initialized():
-        ray.init(configure_logging=False)
-    pass
+    :param logging_handler: handler of the Ray logger
+    :param executor: executor instance or its name, one of "serial", "process" and "ray"
+    """
+    if executor == executors.RayExecutor.name:
+        executor = executors.RayExecutor(logging_handler)
+    executors.set_executor(executor)
 
 
 class ConfigGroup:
@@ -98,15 +104,25 @@ class ConfigGroups:
         return max([group.index for group in self.all_groups])
 
 
-def get_population_wrapper(inputs):
-    self, energy_level, pair, population_total = inputs
-    temperature, electron_density = pair
-    return self.get_population(
-        energy_level=energy_level,
-        temperature=temperature,
-        electron_density=electron_density,
-        population_total=population_total
-    )
+def structurize_populations(pairs, populations, convergence_errors=None):
+    """
+    Collect populations of a sweep into the structured array returned by :meth:`Atom.get_populations`
+    :param list pairs: tuples of temperature and electron density of every point
+    :param ndarray populations: populations of every point, of one or more levels
+    :param ndarray convergence_errors: convergence error of every point, the field **convergence_error** is added if
+        given
+    :return: numpy structured array with named fields **population**, **electron_density** and **temperature**
+    """
+    fields = [("temperature", float), ("electron_density", float), ("population", float, populations.shape[1:])]
+    if convergence_errors is not None:
+        fields.append(("convergence_error", float))
+    result = np.zeros(len(pairs), dtype=fields)
+    result["temperature"] = [temperature for temperature, _ in pairs]
+    result["electron_density"] = [electron_density for _, electron_density in pairs]
+    result["population"] = populations
+    if convergence_errors is not None:
+        result["convergence_error"] = convergence_errors
+    return result
 
 
 class Atom:
@@ -127,13 +143,24 @@ class Atom:
     :param ConfigGroups config_groups: Instance of class ConfigGroups representing possible shell configurations.
         For more info see :class:`ConfigGroups`.
     :param str data_folder: Folder where the atomic data are stored, if it doesnt exist, it will be created
+    :param bool extend_smaller_models: if True and the data folder holds a model of the same ion with smaller
+        max_n, the atomic data are generated by extending it, so only tables of the pairs involving the new config
+        groups are calculated. The new groups are diagonalized separately from the old ones, configuration
+        interaction between them is neglected, so the levels differ slightly from the ones generated from scratch.
+        False by default, the data are always generated from scratch then.
     """
 
-    def __init__(self, symbol, config_groups, data_folder):  # type: (str, ConfigGroups, str) -> None
+    def __init__(self, symbol, config_groups, data_folder, extend_smaller_models=False):
+        # type: (str, ConfigGroups, str, bool) -> None
         self.symbol = symbol
         self.config_groups = config_groups
         self.electron_count = config_groups.base_group.get_electron_count()
         self.data_folder = data_folder
+        self.extend_smaller_models = extend_smaller_models
+        self.__files = None
+        self.__level_table = None
+        self.__transitions_table = None
+        self.__rate_model = None
 
     def __repr__(self):
         return " ".join([self.symbol, self.config_groups.base_group.config])
@@ -143,38 +170,143 @@ class Atom:
         return (np.asarray(array_or_number) if
                 isinstance(array_or_number, typing.Iterable) else np.asarray([array_or_number]))
 
-    def __get_populations_from_pairs(self, pairs, energy_level, population_total, log):
-        ray_ids = []
-        files = fac_wrapper.generate_files(self, self.data_folder)
-        for temperature, electron_density in pairs:
-            ray_ids.append(self.__get_population_ray_id(
-                files=files,
-                energy_level=energy_level,
-                temperature=temperature,
-                electron_density=electron_density,
-                population_total=population_total
-            ))
-
-        for i, _id in enumerate(ray_ids):
+    def __get_files(self):
+        if self.__files is None:
+            with instrumentation.stage("atom.generate_files"):
+                self.__files = fac_wrapper.generate_files(self, self.data_folder)
+        return self.__files
+
+    def get_population_task(self, indices, temperature, electron_density, population_total=1.0, solver="default",
+                            reference_solver=None):
+        """
+        Returns the call calculating populations of levels at a single point as submitted to the executors. The
+        worker gets only the FAC indices and returns only their populations, so it needs no level tables.
+
+        :param indices: FAC indices of the energy levels
+        :param float temperature: temperature in eV
+        :param float electron_density: electron density in cm^-3
+        :param float population_total: 1 by default
+        :param str solver: CRM iteration preset, see :meth:`get_level_populations`
+        :param str reference_solver: CRM iteration preset of a second solve, the call then returns a tuple of the
+            populations and the convergence error
+        :return: tuple of the function and its arguments
+        """
+        for preset in [solver] + ([] if reference_solver is None else [reference_solver]):
+            assert preset in fac_wrapper.solver_presets, "Unknown solver {}, use one of {}".format(
+                preset, ", ".join(sorted(fac_wrapper.solver_presets)))
+        return fac_wrapper.calculate_populations, (
+            self.__get_files(), self.electron_count, "get_populations", indices, temperature, electron_density,
+            population_total, solver, reference_solver)
+
+    def __get_populations_from_pairs(self, pairs, indices, population_total, log, executor=None, solver="default",
+                                     reference_solver=None):
+        # The results are written into one preallocated array
+        executor = executors.get_executor(executor)
+        populations = np.empty((len(pairs), len(indices)))
+        convergence_errors = None if reference_solver is None else np.empty(len(pairs))
+        # Only a window of calculations is in flight, next one is submitted whenever the oldest one is collected
+        pending_pairs = iter(pairs)
+        population_futures = collections.deque()
+
+        def __submit_next():
+            pair = next(pending_pairs, None)
+            if pair is not None:
+                with instrumentation.stage("atom.submit"):
+                    function, arguments = self.get_population_task(indices, pair[0], pair[1], population_total,
+                                                                   solver, reference_solver)
+                    population_futures.append(executor.submit(function, *arguments))
+
+        for _ in range(executor.get_window_size()):
+            __submit_next()
+
+        for i in range(len(pairs)):
             if log:
-                log(float(i), float(len(ray_ids)))
-            yield ray.get(_id)
+                log(float(i), float(len(pairs)))
+            with instrumentation.stage("atom.wait"):
+                if reference_solver is not None:
+                    populations[i], convergence_errors[i] = population_futures.popleft().result()
+                else:
+                    populations[i] = population_futures.popleft().result()
+            __submit_next()
+        return populations, convergence_errors
+
+    def get_level_table(self):  # type: () -> LevelTable
+        """
+        Returns the table of all levels of the atom, generating the atomic data if needed. The table is read once
+        per Atom instance. Use it to select levels by vectorized queries, see :class:`LevelTable`.
+        :return: LevelTable instance
+        """
+        if self.__level_table is None:
+            self.__level_table = LevelTable.from_file(self.__get_files().levels_filename)
+        return self.__level_table
 
-    @staticmethod
-    def __create_population_tuple(pair, population):
-        temperature, electron_density = pair
-        return (
-            temperature,
-            electron_density,
-            population
-        )
+    def select_levels(self, **conditions):
+        """
+        Returns FAC indices of all levels matching given conditions, see :meth:`LevelTable.mask` for the accepted
+        keywords. Example selecting all 2p5 3p levels with J=0::
+
+            atom.select_levels(configuration="2p5 3p", j2=0)
+
+        :return: integer ndarray of FAC level indices
+        """
+        return self.get_level_table().select(**conditions)
+
+    def get_transitions_table(self):  # type: () -> np.ndarray
+        """
+        Returns all radiative transitions of the atom as a structured array with fields **lower**, **upper**,
+        **energy**, **strength** and **rate**. The table is read once per Atom instance.
+        :return: numpy structured array
+        """
+        if self.__transitions_table is None:
+            self.__transitions_table = fac_wrapper.read_transitions_table(self.__get_files().transitions_filename)
+        return self.__transitions_table
+
+    def find_transitions(self, lower_indices, upper_indices):
+        """
+        Returns all radiative transitions from any of the upper levels to any of the lower levels, e.g.::
+
+            atom.find_transitions(atom.select_levels(configuration="2p5 3s"), atom.select_levels(configuration="2p5 3p"))
+
+        :param lower_indices: FAC indices of allowed lower levels
+        :param upper_indices: FAC indices of allowed upper levels
+        :return: numpy structured array, see :meth:`get_transitions_table`
+        """
+        transitions = self.get_transitions_table()
+        mask = np.in1d(transitions["lower"], lower_indices) & np.in1d(transitions["upper"], upper_indices)
+        return transitions[mask]
+
+    def get_level_populations(self, indices, temperatures, electron_densities, combine, population_total=1.0,
+                              log=None, executor=None, solver="default", reference_solver=None):
+        """
+        Same as :meth:`get_populations` but for many levels at once given by their FAC indices, e.g. as returned by
+        :meth:`select_levels`. All levels are extracted from a single population calculation per point.
+
+        :param indices: FAC indices of the energy levels
+        :param ndarray temperatures: temperature in eV (could be iterable)
+        :param ndarray electron_densities: electron density in cm^-3 (could be iterable)
+        :param function combine: Function taking two lists and returning a single list of tuples
+        :param float population_total: 1 by default
+        :param func log: Function that get called each time an iteration is made.
+        :param executor: executor instance or name, the default set by :func:`init` if None
+        :param str solver: CRM iteration preset, "fast", "default" or "precise", see
+            :data:`fac_wrapper.parser.solver_presets`
+        :param str reference_solver: CRM iteration preset the points are solved with a second time, the result then
+            gets the field **convergence_error**, see :meth:`Parser.get_populations`. None skips the second solve.
+        :return: numpy structured array with named fields **population** (one value per index),
+            **electron_density** and **temperature**
+        """
+        indices = np.asarray(indices, dtype=int).ravel()
+        temperatures = self.__as_array(temperatures)
+        electron_densities = self.__as_array(electron_densities)
+        pairs = list(combine(temperatures, electron_densities))
+
+        populations, convergence_errors = self.__get_populations_from_pairs(pairs, indices, population_total, log,
+                                                                            executor, solver, reference_solver)
 
-    def __structurize_populations(self, pairs, populations):
-        return np.array(
-            [self.__create_population_tuple(pair, population) for pair, population in zip(pairs, populations)],
-            dtype=[("temperature", float), ("electron_density", float), ("population", float)])
+        return structurize_populations(pairs, populations, convergence_errors)
 
-    def get_combined_populations(self, energy_level, temperatures, electron_densities, population_total=1.0, log=None):
+    def get_combined_populations(self, energy_level, temperatures, electron_densities, population_total=1.0, log=None,
+                                 executor=None, solver="default", reference_solver=None):
         """
         Convenience wrapper around get_populations with combine parameter set to itertools.product.
         Thus it performs the calculation over all possible combinations of temperature and density.
@@ -185,6 +317,11 @@ class Atom:
         :param float population_total: 1 by default
         :param func log: Function that get called each time an iteration is made. The passed arguments are current index
         of the iteration and total length of the iteration. The function is None by default, meaning none is called.
+        :param executor: executor instance or name, the default set by :func:`init` if None
+        :param str solver: CRM iteration preset, "fast", "default" or "precise", see
+            :data:`fac_wrapper.parser.solver_presets`
+        :param str reference_solver: CRM iteration preset the points are solved with a second time, the result then
+            gets the field **convergence_error**, see :meth:`Parser.get_populations`. None skips the second solve.
         :return: numpy structured array with named fields **population**, **electron_density** and temperature**
         """
         return self.get_populations(
@@ -193,10 +330,14 @@ class Atom:
             electron_densities=electron_densities,
             combine=itertools.product,
             population_total=population_total,
-            log=log
+            log=log,
+            executor=executor,
+            solver=solver,
+            reference_solver=reference_solver
         )
 
-    def get_populations(self, energy_level, temperatures, electron_densities, combine, population_total=1.0, log=None):
+    def get_populations(self, energy_level, temperatures, electron_densities, combine, population_total=1.0, log=None,
+                        executor=None, solver="default", reference_solver=None):
         """
         Get electron population on single energy level at given temperature and electron density given by arrays/lists.
         The calculation will be done over the list of tuples generated by applying *combine* on temperatures
@@ -228,20 +369,149 @@ class Atom:
         :param float population_total: 1 by default
         :param func log: Function that get called each time an iteration is made. The passed arguments are current index
         of the iteration and total length of the iteration. The function is None by default, meaning none is called.
+        :param executor: executor instance or name, the default set by :func:`init` if None
+        :param str solver: CRM iteration preset, "fast", "default" or "precise", see
+            :data:`fac_wrapper.parser.solver_presets`
+        :param str reference_solver: CRM iteration preset the points are solved with a second time, the result then
+            gets the field **convergence_error**, see :meth:`Parser.get_populations`. None skips the second solve.
         :return: numpy structured array with named fields **population**, **electron_density** and **temperature**
         """
         temperatures = self.__as_array(temperatures)
         electron_densities = self.__as_array(electron_densities)
         pairs = list(combine(temperatures, electron_densities))
 
-        populations = self.__get_populations_from_pairs(pairs, energy_level, population_total, log)
+        indices = [self.get_level_table().get_index(energy_level.get_fac_repr())]
+        populations, convergence_errors = self.__get_populations_from_pairs(pairs, indices, population_total, log,
+                                                                            executor, solver, reference_solver)
+
+        return structurize_populations(pairs, populations[:, 0], convergence_errors)
+
+    def get_rate_model(self):  # type: () -> RateModel
+        """
+        Returns the rate model of the atom assembled from the FAC text tables, see :class:`RateModel`. The model is
+        built once per Atom instance. It needs the excitation table, data folders lacking it get it printed from the
+        binary table, see :meth:`RateModel.from_files`.
+        :return: RateModel instance
+        :raise IOError: if the excitation table is missing and cannot be printed
+        """
+        if self.__rate_model is None:
+            self.__rate_model = RateModel.from_files(self.__get_files())
+        return self.__rate_model
+
+    def get_sensitivities(self, indices, temperatures, electron_densities, combine, population_total=1.0, log=None):
+        """
+        Get populations of levels given by FAC indices together with their derivatives with respect to temperature
+        and electron density. The populations and derivatives come from the same factorized rate matrix of the
+        :class:`RateModel`, so the derivatives cost one extra back substitution per point instead of finite
+        differencing the whole calculation::
+
+            result = atom.get_sensitivities(atom.select_levels(configuration="2p5 3p", j2=0), [900.0], [1e20], zip)
+            result["d_temperature"]  # dN/dT in eV^-1, one value per index
 
-        return self.__structurize_populations(pairs, populations)
+        :param indices: FAC indices of the energy levels
+        :param ndarray temperatures: temperature in eV (could be iterable)
+        :param ndarray electron_densities: electron density in cm^-3 (could be iterable)
+        :param function combine: Function taking two lists and returning a single list of tuples
+        :param float population_total: 1 by default
+        :param func log: Function that get called each time an iteration is made.
+        :return: numpy structured array with named fields **temperature**, **electron_density**, **population**,
+            **d_temperature** and **d_electron_density**, the last three hold one value per index
+        """
+        indices = np.asarray(indices, dtype=int).ravel()
+        temperatures = self.__as_array(temperatures)
+        electron_densities = self.__as_array(electron_densities)
+        pairs = list(combine(temperatures, electron_densities))
+        rate_model = self.get_rate_model()
+        rows = rate_model.levels.get_rows(indices)
+
+        result = np.zeros(len(pairs), dtype=[
+            ("temperature", float),
+            ("electron_density", float),
+            ("population", float, (len(indices),)),
+            ("d_temperature", float, (len(indices),)),
+            ("d_electron_density", float, (len(indices),))
+        ])
+        for i, (temperature, electron_density) in enumerate(pairs):
+            if log:
+                log(float(i), float(len(pairs)))
+            populations, d_temperature, d_electron_density = rate_model.get_sensitivities(
+                temperature, electron_density, population_total)
+            result[i] = (temperature, electron_density, populations[rows], d_temperature[rows],
+                         d_electron_density[rows])
+        return result
+
+    def get_bundled_populations(self, indices, temperatures, electron_densities, combine, min_n=None,
+                                min_energy=None, population_total=1.0, log=None, estimate_error=False):
+        """
+        Get populations of levels given by FAC indices from the :class:`RateModel` reduced by bundling the levels
+        above the n or energy threshold into configuration averaged superlevels, see :meth:`RateModel.bundle`. The
+        levels given by indices are always kept resolved::
 
-    def __get_population_ray_id(self, files, energy_level, temperature, electron_density, population_total):
-        parser = fac_wrapper.Parser.remote(files, self.electron_count)
-        ray_id = parser.get_population.remote(energy_level, temperature, electron_density, population_total)
-        return ray_id
+            result = atom.get_bundled_populations(indices, [900.0], [1e20], zip, min_n=5, estimate_error=True)
+            result["error"]  # relative error of the resolved levels against the detailed model
+
+        The populations come from the native rate model, not from the FAC CRM. It needs the excitation table, the
+        bundled high n data come without it and it is printed from the binary files first, which needs pfac, see
+        :meth:`get_rate_model`.
+
+        :param indices: FAC indices of the energy levels
+        :param ndarray temperatures: temperature in eV (could be iterable)
+        :param ndarray electron_densities: electron density in cm^-3 (could be iterable)
+        :param function combine: Function taking two lists and returning a single list of tuples
+        :param int min_n: levels with an electron in shell min_n or higher are bundled
+        :param float min_energy: levels with energy in eV at least min_energy are bundled
+        :param float population_total: 1 by default
+        :param func log: Function that get called each time an iteration is made.
+        :param bool estimate_error: the result gets the field **error** if True, it costs a detailed solve per point
+        :return: numpy structured array with named fields **temperature**, **electron_density** and **population**,
+            the last holds one value per index
+        :raise IOError: if the excitation table is missing and cannot be printed
+        """
+        indices = np.asarray(indices, dtype=int).ravel()
+        temperatures = self.__as_array(temperatures)
+        electron_densities = self.__as_array(electron_densities)
+        pairs = list(combine(temperatures, electron_densities))
+        reduced_model = self.get_rate_model().bundle(min_n, min_energy, retained=indices)
+        rows = reduced_model.model.levels.get_rows(indices)
+
+        fields = [("temperature", float), ("electron_density", float), ("population", float, (len(indices),))]
+        if estimate_error:
+            fields.append(("error", float))
+        result = np.zeros(len(pairs), dtype=fields)
+        for i, (temperature, electron_density) in enumerate(pairs):
+            if log:
+                log(float(i), float(len(pairs)))
+            result["temperature"][i] = temperature
+            result["electron_density"][i] = electron_density
+            result["population"][i] = reduced_model.get_populations(
+                temperature, electron_density, population_total)[rows]
+            if estimate_error:
+                result["error"][i] = reduced_model.get_error(temperature, electron_density, population_total)
+        return result
+
+    def get_transient_populations(self, indices, times, temperatures, electron_densities, initial=None, substeps=4,
+                                  population_total=1.0):
+        """
+        Get time dependent populations of levels given by FAC indices along trajectories of plasma cells, see
+        :meth:`RateModel.evolve`. Use it where the conditions change on time scales comparable to the level
+        relaxation and the steady state populations are not accurate::
+
+            populations = atom.get_transient_populations(indices, times, cell_temperatures, cell_densities)
+
+        :param indices: FAC indices of the energy levels
+        :param ndarray times: times in s
+        :param ndarray temperatures: temperatures in eV of shape (time count, cell count)
+        :param ndarray electron_densities: electron densities in cm^-3 of shape (time count, cell count)
+        :param ndarray initial: populations of all levels of shape (cell count, level count) at the first time,
+            the steady state by default
+        :param int substeps: number of implicit Euler steps per time interval
+        :param float population_total: 1 by default
+        :return: ndarray of populations of shape (time count, cell count, index count)
+        """
+        rate_model = self.get_rate_model()
+        rows = rate_model.levels.get_rows(np.asarray(indices, dtype=int).ravel())
+        populations = rate_model.evolve(times, temperatures, electron_densities, initial, substeps, population_total)
+        return populations[..., rows]
 
 
 class LevelTerm:
@@ -273,6 +543,9 @@ class LevelTerm:
     def __ne__(self, other):  # type: (LevelTerm, LevelTerm) -> bool
         return not self == other
 
+    def __hash__(self):
+        return hash(str(self))
+
 
 class Shell:
     """
@@ -323,6 +596,9 @@ class Shell:
     def __ne__(self, other):  # type: (Shell, Shell) -> bool
         return not self == other
 
+    def __hash__(self):
+        return hash(str(self))
+
     def get_latex_repr(self):  # type: () -> str
         """
         Method to generate shell representation in latex format
@@ -357,9 +633,7 @@ class Shell:
         :param shell_repr: string to deconstruct
         :return: instance of Shell
         """
-        orbitals = reduce(lambda string_so_far, orbital: string_so_far + orbital, Shell.orbital_letters.itervalues())
-        pattern = re.compile(r"^\d[" + orbitals + r"][+-]\d\(\d\)$")
-        assert pattern.match(shell_repr) is not None, "Invalid string to generate shell {}".format(shell_repr)
+        assert Shell.pattern.match(shell_repr) is not None, "Invalid string to generate shell {}".format(shell_repr)
 
         return Shell(
             n=int(shell_repr[0]),
@@ -372,6 +646,7 @@ class Shell:
     orbital_numbers = {"s": 0, "p": 1, "d": 2, "f": 3, "g": 4, "h": 5, "i": 6}
     orbital_letters = {number: letter for letter, number in orbital_numbers.iteritems()}
     spin_direction_sign = {"+": 1, "-": -1}
+    pattern = re.compile(r"^\d[" + "".join(orbital_numbers) + r"][+-]\d\(\d\)$")
 
     def __assert_state_is_fine(self):
         assert self.n > 0, \
@@ -404,14 +679,25 @@ class EnergyLevel:
     :ivar int degeneracy: A number representing the degeneracy of the level. It is usually denoted :math:`g`.
     """
 
-    def __init__(self, config):  # type: (str) -> None
-        self.configuration = map(lambda term_string: LevelTerm(
-            shell=Shell.create_from_string(term_string[:-1]),
-            j2=int(term_string[-1])
-        ), config.split(" "))
+    __parsed_configurations = {}
 
+    def __init__(self, config):  # type: (str) -> None
+        self.configuration = list(self.__parse_configuration(config))
         self.degeneracy = self.configuration[-1].j2 + 1
 
+    @staticmethod
+    def __parse_configuration(config):  # type: (str) -> tuple
+        # Terms are parsed once per distinct config string, levels with equal config share the LevelTerm instances
+        try:
+            return EnergyLevel.__parsed_configurations[config]
+        except KeyError:
+            configuration = tuple(LevelTerm(
+                shell=Shell.create_from_string(term_string[:-1]),
+                j2=int(term_string[-1])
+            ) for term_string in config.split(" "))
+            EnergyLevel.__parsed_configurations[config] = configuration
+            return configuration
+
     def __repr__(self):  # type: () -> str
         return " ".join(map(lambda term: str(term.shell) + str(term.j2), self.configuration))
 
@@ -421,6 +707,9 @@ class EnergyLevel:
     def __ne__(self, other):  # type: (EnergyLevel, EnergyLevel) -> bool
         return not self == other
 
+    def __hash__(self):
+        return hash(str(self))
+
     def get_fac_repr(self):
         """
         Returns a string of terms separated by dot. The terms are string representations of LevelTerm. Only terms
@@ -429,6 +718,14 @@ class EnergyLevel:
         """
         return ".".join([str(term) for term in self.configuration if not term.shell.is_full()])
 
+    def get_compact(self):  # type: () -> CompactLevel
+        """
+        Returns the interned compact representation of the level, see :class:`CompactLevel`. Compact levels compare
+        and hash in constant time, use them when many levels are handled at once.
+        :return: CompactLevel instance
+        """
+        return CompactLevel.from_fac_name(self.get_fac_repr())
+
     def get_latex_repr(self):
         """
         Generates and returns the latex representation of the energy level as a string. It has the following format:
@@ -469,50 +766,140 @@ class Transition:
         self.lower = lower
         self.upper = upper
         self.atom = atom
-        self.__fac_parser = fac_wrapper.Parser.remote(fac_wrapper.generate_files(atom, atom.data_folder),
-                                                      atom.electron_count)
-        self.weighted_oscillator_strength = ray.get(
-            self.__fac_parser.get_weighted_oscillator_strength.remote(lower, upper))
+        with instrumentation.stage("transition.init"):
+            table = atom.get_level_table()
+            transitions = atom.find_transitions([table.get_index(lower.get_fac_repr())],
+                                                [table.get_index(upper.get_fac_repr())])
+        if len(transitions) == 0:
+            raise Exception("Failed to find transition!")
+        self.weighted_oscillator_strength = float(transitions[0]["strength"])
+        self.energy = float(transitions[0]["energy"])
+
+    def get_sensitivities(self, temperatures, electron_densities, combine=itertools.product, population_total=1.0,
+                          log=None):
+        """
+        Get populations of both levels divided by their degeneracy together with derivatives with respect to
+        temperature and electron density, see :meth:`Atom.get_sensitivities`. Both levels are solved at once.
+
+        :param ndarray temperatures: temperature in eV
+        :param ndarray electron_densities: electron density in cm^-3
+        :param combine: the way to combine densities and temperatures, default is itertools.product
+        :param float population_total: 1 by default
+        :return: a dict with two keys: {upper: ..., lower: ...} - the values are numpy structured arrays
+            with fields **temperature**, **electron_density**, **population**, **d_temperature** and
+            **d_electron_density**
+        """
+        table = self.atom.get_level_table()
+        indices = [table.get_index(self.lower.get_fac_repr()), table.get_index(self.upper.get_fac_repr())]
+        sensitivities = self.atom.get_sensitivities(indices, temperatures, electron_densities, combine,
+                                                    population_total, log)
+
+        def __level_result(column, degeneracy):
+            result = np.zeros(len(sensitivities), dtype=[(name, float) for name in sensitivities.dtype.names])
+            result["temperature"] = sensitivities["temperature"]
+            result["electron_density"] = sensitivities["electron_density"]
+            for name in ["population", "d_temperature", "d_electron_density"]:
+                result[name] = sensitivities[name][:, column] / degeneracy
+            return result
 
-        self.energy = ray.get(
-            self.__fac_parser.get_transition_energy.remote(lower, upper))
+        return {
+            "lower": __level_result(0, self.lower.degeneracy),
+            "upper": __level_result(1, self.upper.degeneracy)
+        }
+
+    def get_transient_populations(self, times, temperatures, electron_densities, initial=None, substeps=4,
+                                  population_total=1.0):
+        """
+        Get time dependent populations of both levels divided by their degeneracy along trajectories of plasma
+        cells, see :meth:`Atom.get_transient_populations`.
+
+        :param ndarray times: times in s
+        :param ndarray temperatures: temperatures in eV of shape (time count, cell count)
+        :param ndarray electron_densities: electron densities in cm^-3 of shape (time count, cell count)
+        :param ndarray initial: populations of all levels of shape (cell count, level count) at the first time,
+            the steady state by default
+        :param int substeps: number of implicit Euler steps per time interval
+        :param float population_total: 1 by default
+        :return: a dict with two keys: {upper: ..., lower: ...} - the values are ndarrays of shape
+            (time count, cell count)
+        """
+        table = self.atom.get_level_table()
+        indices = [table.get_index(self.lower.get_fac_repr()), table.get_index(self.upper.get_fac_repr())]
+        populations = self.atom.get_transient_populations(indices, times, temperatures, electron_densities, initial,
+                                                          substeps, population_total)
+        return {
+            "lower": populations[..., 0] / self.lower.degeneracy,
+            "upper": populations[..., 1] / self.upper.degeneracy
+        }
+
+    def get_population_samples(self, temperatures, electron_densities, combine=itertools.product, samples=100,
+                               radiative_uncertainty=0.1, collision_uncertainty=0.2, seed=None, population_total=1.0):
+        """
+        Get Monte Carlo samples of populations of both levels divided by their degeneracy under perturbed atomic
+        data, see :meth:`RateModel.sample_populations`. All samples at all points are one batched solve.
+
+        :param ndarray temperatures: temperature in eV
+        :param ndarray electron_densities: electron density in cm^-3
+        :param combine: the way to combine densities and temperatures, default is itertools.product
+        :param int samples: number of samples
+        :param float radiative_uncertainty: relative uncertainty of the radiative rates
+        :param float collision_uncertainty: relative uncertainty of the collision strengths
+        :param seed: seed of the random generator for reproducible samples
+        :param float population_total: 1 by default
+        :return: dict with keys **temperature** and **electron_density** (one value per point), **lower** and
+            **upper** (populations of shape (samples, points)), **lower_nominal** and **upper_nominal** (populations
+            of the unperturbed data) and **oscillator_strength_factor** (scale of gf of the transition per sample)
+        """
+        pairs = list(combine(np.atleast_1d(temperatures), np.atleast_1d(electron_densities)))
+        rate_model = self.atom.get_rate_model()
+        table = self.atom.get_level_table()
+        lower_index = table.get_index(self.lower.get_fac_repr())
+        upper_index = table.get_index(self.upper.get_fac_repr())
+        lower_row, upper_row = rate_model.levels.get_rows([lower_index, upper_index])
+        result = rate_model.sample_populations([pair[0] for pair in pairs], [pair[1] for pair in pairs], samples,
+                                               radiative_uncertainty, collision_uncertainty, seed, population_total)
+
+        # gf is proportional to the radiative rate of the transition
+        line = np.flatnonzero((rate_model.transitions["lower"] == lower_index) &
+                              (rate_model.transitions["upper"] == upper_index))[0]
+        return {
+            "temperature": np.array([pair[0] for pair in pairs], dtype=float),
+            "electron_density": np.array([pair[1] for pair in pairs], dtype=float),
+            "lower": result["populations"][..., lower_row] / self.lower.degeneracy,
+            "upper": result["populations"][..., upper_row] / self.upper.degeneracy,
+            "lower_nominal": result["nominal"][:, lower_row] / self.lower.degeneracy,
+            "upper_nominal": result["nominal"][:, upper_row] / self.upper.degeneracy,
+            "oscillator_strength_factor": result["radiative_factors"][:, line]
+        }
 
     def get_populations(self, temperatures, electron_densities, combine=itertools.product, population_total=1.0,
-                        log=None):
+                        log=None, executor=None, solver="default", reference_solver=None):
         """
         Simple convenience wrapper around
-        :func:`EnergyLevel.get_population`
+        :func:`Atom.get_level_populations`
         to get both lower and upper energy
-        levels populations.
+        levels populations, both come from a single population calculation per point.
 
         :param ndarray temperatures: temperature in eV
         :param ndarray electron_densities: electron density in cm^-3
         :param combine: the way to combine densities and temperatures, default is zip
         :param float population_total: 1 by default
+        :param executor: executor instance or name, the default set by :func:`init` if None
+        :param str solver: CRM iteration preset, see :meth:`Atom.get_populations`
+        :param str reference_solver: CRM iteration preset of a second solve, the arrays then get the field
+            **convergence_error**, see :meth:`Atom.get_populations`
         :return: a dict with two keys: {upper: ..., lower: ...} - the values are numpy structured arrays
             with fields **temperature**, **electron_density** and **population**
         """
-        lower_populations = self.atom.get_populations(
-            self.lower,
-            temperatures,
-            electron_densities,
-            combine,
-            population_total,
-            log=lambda current, total: log(current, total * 2) if log else None
-        )
-        lower_populations["population"] = lower_populations["population"] / self.lower.degeneracy
-
-        upper_populations = self.atom.get_populations(
-            self.upper,
-            temperatures,
-            electron_densities,
-            combine,
-            population_total,
-            log=lambda current, total: log(total + current, total * 2) if log else None
-        )
-        upper_populations["population"] = upper_populations["population"] / self.upper.degeneracy
-
+        table = self.atom.get_level_table()
+        indices = [table.get_index(self.lower.get_fac_repr()), table.get_index(self.upper.get_fac_repr())]
+        populations = self.atom.get_level_populations(indices, temperatures, electron_densities, combine,
+                                                      population_total, log, executor, solver, reference_solver)
+        pairs = list(zip(populations["temperature"], populations["electron_density"]))
+        convergence_errors = None if reference_solver is None else populations["convergence_error"]
         return {
-            "lower": lower_populations,
-            "upper": upper_populations
+            "lower": structurize_populations(pairs, populations["population"][:, 0] / self.lower.degeneracy,
+                                             convergence_errors),
+            "upper": structurize_populations(pairs, populations["population"][:, 1] / self.upper.degeneracy,
+                                             convergence_errors)
         }
@@ -0,0 +1,181 @@
+"""
+Module containing a smooth surrogate of level populations. Populations of a fixed set of levels are fitted by
+Chebyshev polynomials in logarithm of temperature and electron density, so evaluating them at millions of hydro
+cell states is a vectorized polynomial evaluation instead of a population solve or table lookup.
+"""
+import numpy as np
+from numpy.polynomial import chebyshev
+
+min_population = 1e-30
+"""Populations are fitted in logarithm, smaller values are clipped to this floor"""
+
+
+class PopulationEmulator:
+    """
+    Piecewise Chebyshev fit of level populations over a rectangle of temperatures and electron densities. Create it
+    from an atom using :meth:`from_atom`::
+
+        emulator = PopulationEmulator.from_atom(
+            atom=atom,
+            indices=atom.select_levels(configuration="2p5 3p", j2=0),
+            temperature_bounds=(100, 1000),  # eV
+            density_bounds=(1e19, 1e22)  # cm^-3
+        )
+        populations = emulator.evaluate(temperatures, densities)  # shape temperatures.shape + (len(indices),)
+        emulator.save("Fe_emulator.npz")
+
+    Every patch is fitted from populations solved at Chebyshev nodes and checked against solves at points in
+    between the nodes. Patches whose error exceeds the tolerance are split into four and refitted, up to max_depth
+    times, so only the regions where populations change quickly get refined.
+
+    :ivar ndarray indices: FAC indices of the emulated levels
+    :ivar ndarray bounds: bounds of patches, one row (log T min, log T max, log ne min, log ne max) per patch
+    :ivar ndarray coefficients: Chebyshev coefficients of logarithm of populations, shape (patch count, degree + 1,
+        degree + 1, level count)
+    :ivar ndarray errors: maximal relative population error measured on the validation points of each patch
+    :ivar int solves: number of population solves used to build the emulator
+    """
+
+    def __init__(self, indices, bounds, coefficients, errors, solves=0):
+        self.indices = np.asarray(indices)
+        self.bounds = np.asarray(bounds, dtype=float)
+        self.coefficients = np.asarray(coefficients, dtype=float)
+        self.errors = np.asarray(errors, dtype=float)
+        self.solves = solves
+
+    def get_error_bound(self):  # type: () -> float
+        """
+        Returns the maximal relative population error measured over all patches
+        """
+        return float(self.errors.max())
+
+    @staticmethod
+    def fit(solve, indices, temperature_bounds, density_bounds, degree=6, tolerance=1e-2, max_depth=3,
+            validation_size=3):
+        """
+        Build the emulator from arbitrary population solver.
+
+        :param solve: function taking arrays of temperatures and electron densities of equal length and returning
+            populations of shape (point count, level count)
+        :param indices: FAC indices of the emulated levels, stored for reference
+        :param tuple temperature_bounds: minimal and maximal temperature in eV
+        :param tuple density_bounds: minimal and maximal electron density in cm^-3
+        :param int degree: polynomial degree in each direction, every patch costs (degree + 1)^2 solves
+        :param float tolerance: maximal allowed relative population error
+        :param int max_depth: maximal number of patch splits
+        :param int validation_size: every patch is validated by validation_size^2 additional solves
+        :return: PopulationEmulator instance
+        """
+        fitted = []
+        solves = [0]
+
+        def __solve(log_temperatures, log_densities):
+            solves[0] += len(log_temperatures)
+            populations = np.asarray(solve(np.exp(log_temperatures), np.exp(log_densities)), dtype=float)
+            return np.log(np.clip(populations.reshape(len(log_temperatures), -1), min_population, None))
+
+        def __fit_patch(patch, depth):
+            nodes = np.cos(np.pi * (np.arange(degree + 1) + 0.5) / (degree + 1))
+            x, y = [grid.ravel() for grid in np.meshgrid(nodes, nodes, indexing="ij")]
+            values = __solve(*PopulationEmulator.__to_log_state(patch, x, y))
+            vandermonde = chebyshev.chebvander2d(x, y, [degree, degree])
+            coefficients = np.linalg.lstsq(vandermonde, values, rcond=None)[0].reshape(degree + 1, degree + 1, -1)
+
+            # Validate in between the nodes, where the interpolation error is largest
+            validation = np.linspace(-1, 1, validation_size + 2)[1:-1]
+            x, y = [grid.ravel() for grid in np.meshgrid(validation, validation, indexing="ij")]
+            expected = __solve(*PopulationEmulator.__to_log_state(patch, x, y))
+            error = float(np.max(np.abs(np.expm1(PopulationEmulator.__evaluate_patch(x, y, coefficients) - expected))))
+
+            if error > tolerance and depth < max_depth:
+                temperature_middle = (patch[0] + patch[1]) / 2
+                density_middle = (patch[2] + patch[3]) / 2
+                for temperature_range in [(patch[0], temperature_middle), (temperature_middle, patch[1])]:
+                    for density_range in [(patch[2], density_middle), (density_middle, patch[3])]:
+                        __fit_patch(temperature_range + density_range, depth + 1)
+            else:
+                fitted.append((patch, coefficients, error))
+
+        __fit_patch(tuple(np.log(temperature_bounds)) + tuple(np.log(density_bounds)), 0)
+
+        return PopulationEmulator(
+            indices=indices,
+            bounds=[patch for patch, _, _ in fitted],
+            coefficients=[coefficients for _, coefficients, _ in fitted],
+            errors=[error for _, _, error in fitted],
+            solves=solves[0]
+        )
+
+    @staticmethod
+    def from_atom(atom, indices, temperature_bounds, density_bounds, population_total=1.0, **fit_parameters):
+        """
+        Build the emulator of populations of levels of an atom, see :meth:`fit` for the fit parameters.
+
+        :param Atom atom: the atom
+        :param indices: FAC indices of the emulated levels
+        :param tuple temperature_bounds: minimal and maximal temperature in eV
+        :param tuple density_bounds: minimal and maximal electron density in cm^-3
+        :param float population_total: 1 by default
+        :return: PopulationEmulator instance
+        """
+        def __solve(temperatures, densities):
+            return atom.get_level_populations(indices, temperatures, densities, zip, population_total)["population"]
+
+        return PopulationEmulator.fit(__solve, indices, temperature_bounds, density_bounds, **fit_parameters)
+
+    @staticmethod
+    def __to_log_state(patch, x, y):
+        return (patch[0] + (x + 1) / 2 * (patch[1] - patch[0]),
+                patch[2] + (y + 1) / 2 * (patch[3] - patch[2]))
+
+    def evaluate(self, temperatures, electron_densities):
+        """
+        Evaluate populations of the emulated levels, the evaluation is vectorized over all points. Points outside
+        the fitted bounds are clamped to the bounds.
+
+        :param temperatures: temperatures in eV
+        :param electron_densities: electron densities in cm^-3, broadcastable to temperatures
+        :return: ndarray of shape broadcast(temperatures, electron_densities).shape + (level count,)
+        """
+        temperatures, electron_densities = np.broadcast_arrays(np.asarray(temperatures, dtype=float),
+                                                               np.asarray(electron_densities, dtype=float))
+        shape = temperatures.shape
+        log_temperatures = np.clip(np.log(temperatures.ravel()), self.bounds[:, 0].min(), self.bounds[:, 1].max())
+        log_densities = np.clip(np.log(electron_densities.ravel()), self.bounds[:, 2].min(), self.bounds[:, 3].max())
+
+        result = np.empty((len(log_temperatures), self.coefficients.shape[-1]))
+        assigned = np.zeros(len(log_temperatures), dtype=bool)
+        for patch, coefficients in zip(self.bounds, self.coefficients):
+            mask = ~assigned & (log_temperatures >= patch[0]) & (log_temperatures <= patch[1]) & (
+                    log_densities >= patch[2]) & (log_densities <= patch[3])
+            x = 2 * (log_temperatures[mask] - patch[0]) / (patch[1] - patch[0]) - 1
+            y = 2 * (log_densities[mask] - patch[2]) / (patch[3] - patch[2]) - 1
+            result[mask] = np.exp(self.__evaluate_patch(x, y, coefficients))
+            assigned |= mask
+        return result.reshape(shape + (-1,))
+
+    @staticmethod
+    def __evaluate_patch(x, y, coefficients):
+        # Contract the temperature axis by one matrix product, much faster than chebval2d for many points
+        degree = coefficients.shape[0] - 1
+        partial = chebyshev.chebvander(x, degree).dot(coefficients.reshape(degree + 1, -1))
+        return np.einsum("nij,ni->nj", partial.reshape(len(x), degree + 1, -1), chebyshev.chebvander(y, degree))
+
+    def save(self, filename):
+        """
+        Save the emulator into a compressed NumPy archive
+        :param str filename: path of the archive
+        """
+        np.savez_compressed(filename, indices=self.indices, bounds=self.bounds, coefficients=self.coefficients,
+                            errors=self.errors, solves=self.solves)
+
+    @staticmethod
+    def load(filename):  # type: (str) -> PopulationEmulator
+        """
+        Load the emulator saved by :meth:`save`
+        :param str filename: path of the archive
+        :return: PopulationEmulator instance
+        """
+        archive = np.load(filename)
+        return PopulationEmulator(archive["indices"], archive["bounds"], archive["coefficients"], archive["errors"],
+                                  int(archive["solves"]))
@@ -0,0 +1,225 @@
+"""
+Module containing the backends running FAC population calculations. Every backend submits a function call and
+returns a future, so the atom does not need to know whether the work runs in the calling process, in a pool of
+local processes or on a Ray cluster. Pick the backend globally::
+
+    gain_calculator.init(executor="serial")
+
+or per call, e.g. ``atom.get_populations(..., executor="process")``. All backends run the same parser code, so the
+results do not depend on the backend.
+
+Parallel backends keep only a bounded window of calculations in flight, see :func:`get_window_size`. New work is
+submitted as the results drain, so huge sweeps run in predictable memory. Tune the window by the per node memory
+budget and the memory estimate of a single calculation::
+
+    gain_calculator.init(executor=executors.ProcessPoolExecutor(memory_budget=8000, task_memory=1000))  # MB
+"""
+import logging
+import multiprocessing
+import os
+
+from concurrent import futures
+
+default_task_memory = 500.0
+"""Estimated memory of a single in-flight population calculation in MB, i.e. the worker with pfac, its parsed tables
+and the result"""
+
+
+def get_physical_memory():  # type: () -> float
+    """
+    Returns the physical memory of the node in MB, None if it cannot be determined
+    """
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / 1024.0 ** 2
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def get_window_size(cores, memory_budget=None, task_memory=default_task_memory, oversubscription=2):
+    """
+    Returns the number of calculations allowed in flight at once. Every core gets oversubscription calculations so
+    it never idles while results are collected, unless the memory budget allows fewer.
+
+    :param int cores: number of cores doing the calculations
+    :param float memory_budget: memory available to the calculations in MB, half of the physical memory by default
+    :param float task_memory: memory of a single in-flight calculation in MB
+    :param int oversubscription: calculations in flight per core
+    :return: int window size, at least 1
+    """
+    if memory_budget is None:
+        physical_memory = get_physical_memory()
+        memory_budget = physical_memory / 2 if physical_memory else None
+    window_size = int(cores * oversubscription)
+    if memory_budget is not None:
+        window_size = min(window_size, int(memory_budget // task_memory))
+    return max(1, window_size)
+
+
+def get_cluster_window_size(node_cores, memory_budget=None, task_memory=default_task_memory, oversubscription=2):
+    """
+    Returns the number of calculations allowed in flight on a cluster. The memory budget is per node, so every node
+    gets its own window, see :func:`get_window_size`, and the windows add up.
+
+    :param list node_cores: number of cores of every node
+    :param float memory_budget: memory available to the calculations on every node in MB, half of the physical
+        memory of the calling node by default
+    :param float task_memory: memory of a single in-flight calculation in MB
+    :param int oversubscription: calculations in flight per core
+    :return: int window size, at least 1
+    """
+    return max(1, sum(get_window_size(cores, memory_budget, task_memory, oversubscription)
+                      for cores in node_cores))
+
+
+class SerialExecutor:
+    """
+    Runs every call immediately in the calling process. It has no startup cost, use it for small jobs and debugging.
+    """
+    name = "serial"
+
+    def get_window_size(self):  # type: () -> int
+        return 1
+
+    def submit(self, function, *args):
+        future = futures.Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+    def shutdown(self):
+        pass
+
+
+class ProcessPoolExecutor:
+    """
+    Runs the calls in a pool of local worker processes, every worker reuses its parsers between calls.
+
+    :param int max_workers: number of worker processes, the number of cores by default
+    :param float memory_budget: memory available to the calculations in MB, see :func:`get_window_size`
+    :param float task_memory: memory of a single in-flight calculation in MB
+    """
+    name = "process"
+
+    def __init__(self, max_workers=None, memory_budget=None, task_memory=default_task_memory):
+        # type: (int, float, float) -> None
+        max_workers = max_workers or multiprocessing.cpu_count()
+        self.__window_size = get_window_size(max_workers, memory_budget, task_memory)
+        self.__pool = futures.ProcessPoolExecutor(min(max_workers, self.__window_size))
+
+    def get_window_size(self):  # type: () -> int
+        return self.__window_size
+
+    def submit(self, function, *args):
+        return self.__pool.submit(function, *args)
+
+    def shutdown(self):
+        self.__pool.shutdown()
+
+
+class RayFuture:
+    """
+    Minimal future interface over a Ray object id
+    """
+
+    def __init__(self, object_id):
+        self.object_id = object_id
+
+    def result(self, timeout=None):
+        import ray
+
+        return ray.get(self.object_id, timeout=timeout)
+
+    def cancel(self):  # type: () -> bool
+        import ray
+
+        if not hasattr(ray, "cancel"):
+            return False
+        ray.cancel(self.object_id)
+        return True
+
+
+class RayExecutor:
+    """
+    Runs the calls as Ray tasks, Ray is initialized if it is not yet. The window of in-flight tasks is the sum of
+    the windows of the nodes, each derived from the CPU count and the memory budget of the node, see
+    :func:`get_cluster_window_size`.
+
+    :param logging_handler: handler of the Ray logger
+    :param float memory_budget: memory available to the calculations on every node in MB, half of the physical memory
+        of the calling node by default
+    :param float task_memory: memory of a single in-flight calculation in MB
+    """
+    name = "ray"
+
+    def __init__(self, logging_handler=None, memory_budget=None, task_memory=default_task_memory):
+        # type: (logging.Handler, float, float) -> None
+        import ray
+
+        ray_logger = logging.getLogger('ray')
+        ray_logger.addHandler(logging_handler or logging.FileHandler(os.devnull))
+        ray_logger.propagate = False
+        if not ray.is_initialized():
+            ray.init(configure_logging=False)
+        self.__remote_functions = {}
+        self.__window_size = get_cluster_window_size(self.__get_node_cores(ray), memory_budget, task_memory)
+
+    @staticmethod
+    def __get_node_cores(ray):
+        try:
+            nodes = [node for node in ray.nodes() if node.get("Alive", True)]
+        except AttributeError:  # Ray without the node list
+            nodes = []
+        node_cores = [node.get("Resources", {}).get("CPU", 0) for node in nodes]
+        return [cores for cores in node_cores if cores > 0] or [
+            ray.cluster_resources().get("CPU", multiprocessing.cpu_count())]
+
+    def get_window_size(self):  # type: () -> int
+        return self.__window_size
+
+    def submit(self, function, *args):
+        import ray
+
+        if function not in self.__remote_functions:
+            self.__remote_functions[function] = ray.remote(num_cpus=1)(function)
+        return RayFuture(self.__remote_functions[function].remote(*args))
+
+    def shutdown(self):
+        pass
+
+
+executor_types = {executor_type.name: executor_type for executor_type in
+                  [SerialExecutor, ProcessPoolExecutor, RayExecutor]}
+"""Executor classes by their names"""
+
+__default_executor = [None]
+__named_executors = {}
+
+
+def set_executor(executor):
+    """
+    Set the default executor used by all calculations that do not choose one
+    :param executor: executor instance or its name, one of "serial", "process" and "ray"
+    """
+    executor = get_executor(executor)
+    __named_executors.setdefault(executor.name, executor)
+    __default_executor[0] = executor
+
+
+def get_executor(executor=None):
+    """
+    Resolve executor given by an instance or name, the executors given by name are created once and shared
+    :param executor: executor instance, its name or None for the default executor, which is serial unless changed
+        by :func:`set_executor`
+    :return: executor instance
+    """
+    if executor is None:
+        return __default_executor[0] or get_executor(SerialExecutor.name)
+    if isinstance(executor, basestring):
+        assert executor in executor_types, "Unknown executor {}, use one of {}".format(
+            executor, ", ".join(sorted(executor_types)))
+        if executor not in __named_executors:
+            __named_executors[executor] = executor_types[executor]()
+        return __named_executors[executor]
+    return executor
@@ -1,2 +1,7 @@
 from generator import generate_files
+from generator import print_excitation_table
 from parser import Parser
+from parser import calculate_populations
+from parser import get_convergence_error
+from parser import read_transitions_table
+from parser import solver_presets
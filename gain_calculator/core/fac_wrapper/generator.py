@@ -4,6 +4,10 @@ import os
 import itertools
 from multiprocessing import Process, Queue
 
+import numpy as np
+
+from gain_calculator.core.levels import LevelTable
+
 
 def __generate_files(queue, atom, fac_temp_folder):
     queue.put(Generator(atom, fac_temp_folder).get_files())
@@ -17,6 +21,28 @@ def generate_files(atom, fac_temp_folder):
     return queue.get()
 
 
+def __print_excitation_table(files):
+    importlib.import_module("pfac.fac").PrintTable(files.excitation_binary_filename, files.excitation_filename, 1)
+
+
+def print_excitation_table(files):
+    """
+    Print the collision strengths text table of generated files from their binary table, data folders copied
+    without it lack the table the rate model needs. FAC runs in a child process as importing it allocates much memory.
+    :param FacFiles files: the generated files
+    :raise IOError: if there is no binary table or FAC failed to print it
+    """
+    if not os.path.exists(files.excitation_binary_filename):
+        raise IOError("{} is missing and there is no binary table {} to print it from, regenerate the atomic "
+                      "data".format(files.excitation_filename, files.excitation_binary_filename))
+    process = Process(target=__print_excitation_table, args=(files,))
+    process.start()
+    process.join()
+    if not os.path.exists(files.excitation_filename):
+        raise IOError("{} is missing and printing it from {} failed, pfac is needed to print it".format(
+            files.excitation_filename, files.excitation_binary_filename))
+
+
 class FacFiles:
     def __init__(
             self,
@@ -67,7 +93,11 @@ class Generator:
         return self.__files
 
     def __generate_structure(self, groups):
-        self.fac.Structure(self.__files.levels_binary_filename, self.__files.hamiltonian_binary_filename, groups)
+        # Either a list of group names diagonalized together or a list of such lists diagonalized one by one, the
+        # levels of each call are appended after the levels of the previous ones
+        for structure_groups in (groups if isinstance(groups[0], list) else [groups]):
+            self.fac.Structure(self.__files.levels_binary_filename, self.__files.hamiltonian_binary_filename,
+                               structure_groups)
         self.fac.MemENTable(self.__files.levels_binary_filename)
         self.fac.PrintTable(self.__files.levels_binary_filename, self.__files.levels_filename, 1)
 
@@ -98,9 +128,35 @@ class Generator:
             self.fac.Config(config_group.get_name(), config_group.config)
 
         self.fac.ConfigEnergy(0)
-        self.fac.OptimizeRadial(config_groups.base_group.get_name())
+        self.__optimize_radial(config_groups.base_group)
         self.fac.ConfigEnergy(1)
 
+    def __get_potential_filename(self):
+        # The potential is optimized on the base group only, so all models of the ion share it
+        return os.path.join(self.__fac_temp_folder, "potentials", "{}.pot".format(self.__atom))
+
+    def __optimize_radial(self, base_group):
+        """
+        Optimize the radial potential on the base group or restore it from the cache of potentials in the data
+        folder, the cache is used only if pfac can save and restore potentials
+        """
+        potential_filename = self.__get_potential_filename()
+        cache_supported = hasattr(self.fac, "SavePotential") and hasattr(self.fac, "RestorePotential")
+        if cache_supported and os.path.isfile(potential_filename):
+            self.fac.RestorePotential(potential_filename)
+            return
+
+        self.fac.OptimizeRadial(base_group.get_name())
+        if cache_supported:
+            try:
+                os.makedirs(os.path.dirname(potential_filename))
+            except OSError:
+                pass  # already exists
+            # Other generators may save the same potential concurrently, the rename makes the file appear at once
+            temporary_filename = "{}.{}".format(potential_filename, os.getpid())
+            self.fac.SavePotential(temporary_filename)
+            os.rename(temporary_filename, potential_filename)
+
     def __initialize_fac(self):
         self.fac.Reinit(0)
 
@@ -112,7 +168,73 @@ class Generator:
 
         self.__dir_name = self.__create_dir()
         self.__init_filenames()
-        self.__generate_files()
+
+        smaller_model = self.__find_smaller_model() if self.__atom.extend_smaller_models else None
+        if smaller_model is None or not self.__extend_files(*smaller_model):
+            self.__generate_files()
+
+    def __find_smaller_model(self):
+        # The largest complete cached model of the same ion with smaller max_n
+        prefix = str(self.__atom) + " up to n="
+        max_n = self.__atom.config_groups.get_max_n()
+        candidates = []
+        for dir_name in os.listdir(self.__fac_temp_folder):
+            if not dir_name.startswith(prefix) or not dir_name[len(prefix):].isdigit():
+                continue
+            files = self.__create_files(os.path.join(self.__fac_temp_folder, dir_name))
+            complete = all(os.path.isfile(filename) for filename in [
+                files.levels_filename, files.levels_binary_filename, files.transitions_binary_filename,
+                files.excitation_binary_filename])
+            if complete and int(dir_name[len(prefix):]) < max_n:
+                candidates.append((int(dir_name[len(prefix):]), files))
+        return max(candidates) if candidates else None
+
+    def __extend_files(self, smaller_max_n, smaller_files):
+        """
+        Generate the files by extending a model with smaller max_n. Levels of the new groups are appended to the
+        old ones, so all the old transition and collision tables stay valid and only the tables of group pairs
+        involving a new group are calculated. The new groups are diagonalized separately, i.e. configuration
+        interaction between the new and old groups is neglected.
+        :return: False if FAC cannot join tables or the old levels were not reproduced, nothing is generated then
+        """
+        config_groups = self.__atom.config_groups
+        old_names = [group.get_name() for group in config_groups.all_groups if group.index <= smaller_max_n]
+        new_names = [group.get_name() for group in config_groups.all_groups if group.index > smaller_max_n]
+        if not hasattr(self.fac, "JoinTable") or not new_names:
+            return False
+
+        self.fac.SetAtom(self.__atom.symbol)
+        self.__configure_ion(config_groups)
+        self.__generate_structure([old_names, new_names])
+        if not self.__levels_match(smaller_files.levels_filename):
+            self.__initialize_fac()
+            for filename in os.listdir(self.__dir_name):
+                os.remove(os.path.join(self.__dir_name, filename))
+            return False
+
+        added_combinations = [(lower, upper) for lower, upper in self.__generate_group_combinations(config_groups)
+                              if max(lower.index, upper.index) > smaller_max_n]
+        for smaller_filename, filename, create_table in [
+            (smaller_files.transitions_binary_filename, self.__files.transitions_binary_filename,
+             self.fac.TransitionTable),
+            (smaller_files.excitation_binary_filename, self.__files.excitation_binary_filename, self.fac.CETable)
+        ]:
+            added_filename = filename + ".added"
+            for lower, upper in added_combinations:
+                create_table(added_filename, lower.get_name(), upper.get_name())
+            self.fac.JoinTable(smaller_filename, added_filename, filename)
+            os.remove(added_filename)
+
+        self.fac.PrintTable(self.__files.transitions_binary_filename, self.__files.transitions_filename, 1)
+        self.fac.PrintTable(self.__files.excitation_binary_filename, self.__files.excitation_filename, 1)
+        return True
+
+    def __levels_match(self, smaller_levels_filename):
+        smaller_levels = LevelTable.from_file(smaller_levels_filename)
+        levels = LevelTable.from_file(self.__files.levels_filename)
+        rows = slice(0, len(smaller_levels))
+        return len(levels) > len(smaller_levels) and np.array_equal(
+            levels.name[rows], smaller_levels.name) and np.allclose(levels.energy[rows], smaller_levels.energy)
 
     def __create_dir(self):
         dir_name = self.__get_dir_name()
@@ -125,17 +247,21 @@ class Generator:
         return dir_path
 
     def __init_filenames(self):
-        binary_filename = os.path.join(self.__dir_name, "fac_binary_temp")
-        self.__files = FacFiles(
+        self.__files = self.__create_files(self.__dir_name)
+
+    @staticmethod
+    def __create_files(dir_name):
+        binary_filename = os.path.join(dir_name, "fac_binary_temp")
+        return FacFiles(
             binary_filename=binary_filename,
             excitation_binary_filename=binary_filename + ".ce",
             hamiltonian_binary_filename=binary_filename + ".ham",
             levels_binary_filename=binary_filename + ".en",
             transitions_binary_filename=binary_filename + ".tr",
-            levels_filename=os.path.join(self.__dir_name, "levels.txt"),
-            excitation_filename=os.path.join(self.__dir_name, "excitation.txt"),
-            transitions_filename=os.path.join(self.__dir_name, "transitions.txt"),
-            dir_name=self.__dir_name
+            levels_filename=os.path.join(dir_name, "levels.txt"),
+            excitation_filename=os.path.join(dir_name, "excitation.txt"),
+            transitions_filename=os.path.join(dir_name, "transitions.txt"),
+            dir_name=dir_name
         )
 
     def __get_dir_name(self):
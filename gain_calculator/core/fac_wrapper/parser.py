@@ -1,40 +1,140 @@
 """
 Module containing useful abstractions to encapsulate FAC
 """
+import importlib
 import re
 import os
 import uuid
-import ray
-from pfac import crm
+import numpy as np
 import generator
 
 from gain_calculator.core import utility
+from gain_calculator.core.instrumentation import instrumentation
+from gain_calculator.core.levels import LevelTable
+
+solver_presets = {
+    "fast": (1e-3, 0.5, 300),
+    "default": (1e-4, 0.5, 1500),
+    "precise": (1e-6, 0.5, 10000)
+}
+"""Arguments of crm.SetIteration (tolerance, stabilizer, maximal iteration count) by preset name, "fast" is meant
+for exploratory surveys and "precise" for the final calculations"""
+
+
+transitions_dtype = [("lower", np.int32), ("upper", np.int32), ("energy", float), ("strength", float),
+                     ("rate", float)]
+
+
+def get_convergence_error(populations, reference_populations):  # type: (np.ndarray, np.ndarray) -> float
+    """
+    Returns the largest relative difference of populations to the populations of a tighter solve, empty levels of
+    the reference are skipped
+    :param populations: populations of the solve
+    :param reference_populations: populations of the reference solve in the same order
+    :return: the convergence error, 0 if no level is populated
+    """
+    populated = reference_populations > 0
+    if not np.any(populated):
+        return 0.0
+    return float(np.max(np.abs(populations[populated] - reference_populations[populated]) /
+                        reference_populations[populated]))
+
+
+def read_transitions_table(filename):  # type: (str) -> np.ndarray
+    """
+    Read the FAC transitions file as printed by PrintTable into a structured array
+    :param filename: path to the transitions file
+    :return: numpy structured array with fields **lower**, **upper**, **energy** (eV), **strength** (gf) and
+        **rate** (A in s^-1)
+    """
+    pattern = re.compile(
+        r"^\s*(?P<upper_index>\d+)\s+\d+\s+(?P<lower_index>\d+)\s+\d+\s+(?P<energy>\S+)\s+(?P<strength>\S+)"
+        r"\s+(?P<rate>\S+)")
+
+    def __parse_line(line):
+        match = pattern.match(line)
+        if match is None:
+            return None
+        return int(match.group('lower_index')), int(match.group('upper_index')), float(
+            match.group('energy')), float(match.group('strength')), float(match.group('rate'))
+
+    with open(filename, 'r') as f:
+        transitions = filter(None, map(__parse_line, f.readlines()))
+        assert transitions, "Fatal error, no transitions parsed"
+        return np.array(transitions, dtype=transitions_dtype)
+
+
+__parsers = {}
+
+
+def calculate_populations(files, electron_count, method, selection, temperature, density, population_total, *options):
+    """
+    Call a population method of the Parser of given files, this is the unit of work submitted to executors. The
+    parsers are created once per process and reused by subsequent calls. Remaining positional arguments are passed
+    to the method, e.g. the solver preset.
+
+    :param files: FacFiles instance as returned by generate_files
+    :param int electron_count: electron count of the ion
+    :param str method: name of the Parser method, "get_population" or "get_populations"
+    :param selection: EnergyLevel instance or FAC indices, the first argument of the method
+    :param float temperature: temperature in eV
+    :param float density: electron density in cm^-3
+    :param float population_total: The sum of all populations over all levels
+    :return: result of the method
+    """
+    key = (files.binary_filename, electron_count)
+    if key not in __parsers:
+        with instrumentation.stage("parser.init"):
+            __parsers[key] = Parser(files, electron_count)
+    return getattr(__parsers[key], method)(selection, temperature, density, population_total, *options)
 
 
-@ray.remote(num_cpus=1)
 class Parser(object):
     def __init__(self, files, electron_count):  # type: (generator.FacFiles, int) -> None
         self.__files = files
         self.__electron_count = electron_count
-        self.levels = self.__parse_levels_file()
-        self.transitions = self.__parse_transitions_file()
+        self.__levels = None
+        self.__transitions = None
+
+    def get_levels(self):  # type: () -> LevelTable
+        """
+        Returns the level table, it is read on first use only as population calculations by FAC indices do not
+        need it
+        """
+        if self.__levels is None:
+            self.__levels = LevelTable.from_file(self.__files.levels_filename)
+        return self.__levels
 
-    def get_all_populations(self, temperature, density, population_total):  # type: (float, float, float) -> dict
+    def get_transitions(self):  # type: () -> np.ndarray
+        """
+        Returns the transitions table, see :func:`read_transitions_table`, read on first use only
+        """
+        if self.__transitions is None:
+            self.__transitions = read_transitions_table(self.__files.transitions_filename)
+        return self.__transitions
+
+    def get_all_populations(self, temperature, density, population_total, solver="default"):
+        # type: (float, float, float, str) -> dict
         """
         Generate all level populations in given atom with max_n using temperature and density
         as params
         :param population_total: The sum of all populations over all levels
         :param temperature: temperature of plasma in eV
         :param density: density of plasma in cm^-3
+        :param solver: name of the CRM iteration preset, see :data:`solver_presets`
         :return: returns a dict of populations indexed by energy level index, eg. {0: 0.25e-3, 1: 0.33e-4, ...}
         """
 
         self.__choose_population_filenames()
-        with utility.no_stdout():
-            self.__generate_populations(temperature=temperature, density=density, population_total=population_total)
-        populations = self.__parse_population_file()
-        self.__clean_population_files()
-        return populations
+        try:
+            with instrumentation.stage("parser.crm_solve"), utility.no_stdout():
+                self.__generate_populations(temperature=temperature, density=density,
+                                            population_total=population_total, solver=solver)
+            with instrumentation.stage("parser.file_io"):
+                return self.__parse_population_file()
+        finally:
+            # Failed solves must not leave their files in the in-memory scratch folder either
+            self.__clean_population_files()
 
     def get_weighted_oscillator_strength(self, lower, upper):
         # type: (classes.EnergyLevel, classes.EnergyLevel) -> float
@@ -57,62 +157,34 @@ class Parser(object):
         return self.__parse_transition_energy(lower, upper)
 
     def __get_level_index(self, energy_level):
-        return self.levels[energy_level.get_fac_repr()]
+        return self.get_levels().get_index(energy_level.get_fac_repr())
 
-    def __indexes_match(self, lower_index, upper_index, lower_level, upper_level):
-        lower = self.__get_level_index(lower_level)
-        upper = self.__get_level_index(upper_level)
-        return lower == lower_index and upper == upper_index
+    def __find_transition(self, lower_level, upper_level):
+        transitions = self.get_transitions()
+        mask = (transitions["lower"] == self.__get_level_index(lower_level)) & (
+                transitions["upper"] == self.__get_level_index(upper_level))
+        if not mask.any():
+            raise Exception("Failed to find transition!")
+        return transitions[mask][0]
 
     def __parse_oscillator_strength(self, lower_level, upper_level):
-        for lower_index, upper_index, energy, strength in self.transitions:
-            if self.__indexes_match(lower_index, upper_index, lower_level, upper_level):
-                return strength
-
-        raise Exception("Failed to find transition!")
+        return float(self.__find_transition(lower_level, upper_level)["strength"])
 
     def __parse_transition_energy(self, lower_level, upper_level):
-        for lower_index, upper_index, energy, strength in self.transitions:
-            if self.__indexes_match(lower_index, upper_index, lower_level, upper_level):
-                return energy
-
-        raise Exception("Failed to find transition!")
-
-    def __parse_levels_file(self):
-        def __parse_line(line):
-            match = re.search(r"\s+(?P<index>\d+)\s+\S+\s+\S+\s+\d+\s+\d+\s+\d+\s+\S+\s+\S+\s+(?P<name>\S+)", line)
-            if match is None:
-                return None
-            return str(match.group('name')), int(match.group('index'))
-
-        with open(self.__files.levels_filename, 'r') as f:
-            levels = filter(None, map(__parse_line, f.readlines()))
-            assert levels, "Fatal error, no levels parsed"
-            return {level[0]: level[1] for level in levels}
-
-    def __parse_transitions_file(self):
-        def __parse_line(line):
-            match = re.search(
-                r"\s*(?P<upper_index>\d+)\s+\d+\s+(?P<lower_index>\d+)\s+\d+\s+(?P<energy>\S+)\s+(?P<strength>\S+)",
-                line)
-            if match is None:
-                return None
-            return int(match.group('lower_index')), int(match.group('upper_index')), float(
-                match.group('energy')), float(match.group('strength'))
-
-        with open(self.__files.transitions_filename, 'r') as f:
-            transitions = filter(None, map(__parse_line, f.readlines()))
-            assert transitions, "Fatal error, no transitions parsed"
-            return transitions
+        return float(self.__find_transition(lower_level, upper_level)["energy"])
 
     def __choose_population_filenames(self):
-        name = uuid.uuid4().hex[:6].upper()
+        # The files live in the scratch folder of the process, not in the working directory
+        name = os.path.join(utility.get_scratch_folder(), uuid.uuid4().hex[:6].upper())
         self.__spec_binary_filename = name + ".sp"
         self.__spec_filename = name + ".txt"
 
-    def __generate_populations(self, temperature, density, population_total):  # type: (float, float, float) -> None
+    def __generate_populations(self, temperature, density, population_total, solver):
+        # type: (float, float, float, str) -> None
 
-        # Keeping this in one method as I find it easier to manage FAC in one place
+        # Keeping this in one method as I find it easier to manage FAC in one place, pfac is imported only here
+        # as importing it is slow and memory hungry
+        crm = importlib.import_module("pfac.crm")
         electron_count = self.__electron_count
         crm.ReinitCRM()
         crm.NormalizeMode(1)
@@ -126,7 +198,7 @@ class Parser(object):
         crm.SetCERates(1)
 
         crm.InitBlocks()
-        crm.SetIteration(1e-4, 0.5, 1500)
+        crm.SetIteration(*solver_presets[solver])
 
         crm.LevelPopulation()
 
@@ -147,7 +219,7 @@ class Parser(object):
             assert populations, "Fatal error, no populations parsed"
             return {index: population for index, population in populations}
 
-    def get_population(self, energy_level, temperature, density, population_total):
+    def get_population(self, energy_level, temperature, density, population_total, solver="default"):
         """
         Calculate population of a single energy level at given temperature density with population total stating
         the sum of all energy levels.
@@ -156,14 +228,50 @@ class Parser(object):
         :param temperature: temperature in eV
         :param density: electron density in cm^-3
         :param population_total:
+        :param solver: name of the CRM iteration preset, see :data:`solver_presets`
         :return:
         """
         populations = self.get_all_populations(
             temperature=temperature,
             density=density,
-            population_total=population_total)
+            population_total=population_total,
+            solver=solver)
         return populations[self.__get_level_index(energy_level)]
 
+    def get_populations(self, indices, temperature, density, population_total, solver="default",
+                        reference_solver=None):
+        """
+        Calculate populations of many energy levels at once, e.g. levels selected by :meth:`LevelTable.select`
+
+        :param indices: FAC indices of the levels
+        :param temperature: temperature in eV
+        :param density: electron density in cm^-3
+        :param population_total: The sum of all populations over all levels
+        :param solver: name of the CRM iteration preset, see :data:`solver_presets`
+        :param reference_solver: name of a tighter CRM iteration preset, if given the point is solved a second time
+            with it and the convergence error, the largest relative change of the selected populations, is returned
+            too. pfac reports neither the iteration count nor the residual of LevelPopulation, so the second solve
+            is the only way to tell points that hit the iteration cap. It costs at least as much as the first one,
+            e.g. "default" checks "fast" for a fraction of the cost of "precise".
+        :return: ndarray of populations in the order of indices or a tuple of it and the convergence error
+        """
+        populations = self.get_all_populations(
+            temperature=temperature,
+            density=density,
+            population_total=population_total,
+            solver=solver)
+        selected_populations = np.array([populations[index] for index in indices], dtype=float)
+        if reference_solver is None:
+            return selected_populations
+        reference = self.get_all_populations(
+            temperature=temperature,
+            density=density,
+            population_total=population_total,
+            solver=reference_solver)
+        return selected_populations, get_convergence_error(
+            selected_populations, np.array([reference[index] for index in indices], dtype=float))
+
     def __clean_population_files(self):
-        os.remove(self.__spec_binary_filename)
-        os.remove(self.__spec_filename)
+        for filename in [self.__spec_binary_filename, self.__spec_filename]:
+            if os.path.exists(filename):
+                os.remove(filename)
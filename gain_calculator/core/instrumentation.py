@@ -0,0 +1,187 @@
+"""
+Module measuring where the time of population calculations goes. The package code wraps its stages (file
+generation, table parsing, CRM solves, temporary file I/O, waiting for workers, ...) in :func:`stage` blocks, each
+block records its wall time, call count and the peak memory of the process. A stage costs two clock reads and one
+resource query, so the instrumentation stays enabled by default. Inspect it like this::
+
+    from gain_calculator.core import instrumentation
+
+    instrumentation.reset()
+    instrumentation.tracing = True  # keep individual events for the Chrome trace
+    atom.get_populations(...)
+    print(instrumentation.get_report())
+    instrumentation.save_report("report.json")
+    instrumentation.save_chrome_trace("trace.json")  # open in chrome://tracing or Perfetto
+
+Stages run by process pool or Ray workers are recorded in the worker processes, the calling process sees their
+total as the "atom.wait" stage. Use the serial executor to break the worker stages down.
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def get_peak_memory():  # type: () -> float
+    """
+    Returns the peak resident memory of the process in MB, zero if it cannot be measured
+    """
+    if resource is None:
+        return 0.0
+    # ru_maxrss is in bytes on macOS and in KB elsewhere
+    unit = 1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit
+
+
+class StageStatistics:
+    """
+    Statistics of a single stage
+
+    :ivar int count: number of calls
+    :ivar float total: total wall time in s
+    :ivar float max: maximal wall time of a single call in s
+    :ivar float peak_memory: peak resident memory of the process in MB observed at the end of the stage
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.peak_memory = 0.0
+
+    def as_dict(self):  # type: () -> dict
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "peak_memory": self.peak_memory
+        }
+
+
+class Stage:
+    """
+    Context manager timing a single execution of a stage, created by :meth:`Instrumentation.stage`
+    """
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.instrumentation.record(self.name, self.start, time.time())
+
+
+class Instrumentation:
+    """
+    Collector of stage statistics, the package uses the module level instance :data:`instrumentation`.
+
+    :ivar bool enabled: stages are not recorded if False
+    :ivar bool tracing: individual stage events are kept for :meth:`save_chrome_trace` if True
+    :ivar int max_events: maximal number of kept events, the later ones are dropped
+    """
+
+    def __init__(self, enabled=True, tracing=False, max_events=100000):
+        self.enabled = enabled
+        self.tracing = tracing
+        self.max_events = max_events
+        self.__statistics = {}
+        self.__events = []
+        self.__lock = threading.Lock()
+
+    def reset(self):
+        """
+        Forget all recorded statistics and events
+        """
+        with self.__lock:
+            self.__statistics = {}
+            self.__events = []
+
+    def stage(self, name):  # type: (str) -> Stage
+        """
+        Returns context manager recording the wrapped block as a stage, e.g.::
+
+            with instrumentation.stage("parser.crm_solve"):
+                ...
+
+        :param str name: name of the stage, dotted by the component, e.g. "atom.generate_files"
+        """
+        return Stage(self, name)
+
+    def record(self, name, start, end):
+        """
+        Record a single execution of a stage
+        :param str name: name of the stage
+        :param float start: start time as returned by time.time()
+        :param float end: end time as returned by time.time()
+        """
+        if not self.enabled:
+            return
+        duration = end - start
+        peak_memory = get_peak_memory()
+        with self.__lock:
+            statistics = self.__statistics.get(name)
+            if statistics is None:
+                statistics = self.__statistics[name] = StageStatistics()
+            statistics.count += 1
+            statistics.total += duration
+            statistics.max = max(statistics.max, duration)
+            statistics.peak_memory = max(statistics.peak_memory, peak_memory)
+            if self.tracing and len(self.__events) < self.max_events:
+                self.__events.append((name, start, duration, threading.current_thread().ident))
+
+    def get_report(self):  # type: () -> dict
+        """
+        Returns the statistics of all stages as a dict of dicts with keys **count**, **total**, **mean**, **max**
+        (times in s) and **peak_memory** (MB) by stage name
+        """
+        with self.__lock:
+            return {name: statistics.as_dict() for name, statistics in self.__statistics.items()}
+
+    def save_report(self, filename):
+        """
+        Save the report given by :meth:`get_report` as JSON
+        :param str filename: path of the JSON file
+        """
+        with open(filename, "w") as f:
+            json.dump(self.get_report(), f, indent=2, sort_keys=True)
+
+    def get_chrome_trace(self):  # type: () -> dict
+        """
+        Returns the recorded events in the Chrome trace event format, events are recorded only while tracing
+        """
+        with self.__lock:
+            events = list(self.__events)
+        return {
+            "traceEvents": [
+                {"name": name, "cat": name.split(".")[0], "ph": "X", "ts": start * 1e6, "dur": duration * 1e6,
+                 "pid": os.getpid(), "tid": thread}
+                for name, start, duration, thread in events
+            ],
+            "displayTimeUnit": "ms"
+        }
+
+    def save_chrome_trace(self, filename):
+        """
+        Save the events given by :meth:`get_chrome_trace` as JSON
+        :param str filename: path of the JSON file
+        """
+        with open(filename, "w") as f:
+            json.dump(self.get_chrome_trace(), f)
+
+
+instrumentation = Instrumentation()
+"""The instrumentation the package records its stages to"""
+
+stage = instrumentation.stage
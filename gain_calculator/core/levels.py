@@ -0,0 +1,320 @@
+"""
+Module containing compact, integer coded representations of energy levels. These are meant for the hot paths where
+whole level tables of an atom are enumerated, :class:`gain_calculator.core.classes.EnergyLevel` stays the user facing
+representation.
+"""
+import re
+
+import numpy as np
+
+TERM_FIELDS = ("n", "l", "spin", "electron_count", "shell_j2", "j2")
+"""Order of the integer columns of a single coded term, see :func:`encode_level_names`"""
+
+ORBITAL_NUMBERS = {"s": 0, "p": 1, "d": 2, "f": 3, "g": 4, "h": 5, "i": 6, "k": 7}
+SPIN_SIGNS = {"+": 1, "-": -1}
+
+_term_pattern = re.compile(r"(\d+)([spdfghik])([+-])(\d+)\((\d+)\)(\d+)")
+_name_pattern = re.compile(r"^(?:\d+[spdfghik][+-]\d+\(\d+\)\d+(?:\.(?!$)|$))*$")
+
+
+def _parse_terms(name):  # type: (str) -> tuple
+    assert _name_pattern.match(name) is not None, "Invalid level name {}".format(name)
+    return tuple(
+        (int(n), ORBITAL_NUMBERS[l], SPIN_SIGNS[spin], int(electron_count), int(shell_j2), int(j2))
+        for n, l, spin, electron_count, shell_j2, j2 in _term_pattern.findall(name)
+    )
+
+
+class CompactLevel(object):
+    """
+    Immutable, interned representation of a level given by its FAC name, e.g. "2p-1(1)1.3p-1(1)0". Only the shells
+    that are not full are part of the name, exactly as in :meth:`EnergyLevel.get_fac_repr`. Create it using the
+    factory methods, never directly::
+
+        level = CompactLevel.from_fac_name("2p-1(1)1.3p-1(1)0")
+        level is CompactLevel.from_fac_name("2p-1(1)1.3p-1(1)0")  # True
+
+    As there is only a single instance per name, equality is identity and the hash is precomputed.
+
+    :ivar str name: the FAC name of the level
+    :ivar tuple terms: tuple of integer tuples, one per term, ordered as :data:`TERM_FIELDS`
+    :ivar int j2: double the value of total angular momentum of the level
+    :ivar int degeneracy: statistical weight of the level :math:`g = 2J + 1`
+    """
+
+    __slots__ = ("name", "terms", "j2", "degeneracy", "_hash")
+
+    __interned = {}
+
+    def __init__(self, name, terms):  # type: (str, tuple) -> None
+        self.name = name
+        self.terms = terms
+        self.j2 = terms[-1][5] if terms else 0
+        self.degeneracy = self.j2 + 1
+        self._hash = hash(name)
+
+    def __repr__(self):  # type: () -> str
+        return self.name
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        # Keep instances interned when they travel between processes
+        return _from_fac_name, (self.name,)
+
+    def as_array(self):  # type: () -> np.ndarray
+        """
+        Returns the terms of the level as integer array of shape (term count, len(TERM_FIELDS))
+        :return: integer coded terms
+        """
+        return np.array(self.terms, dtype=np.int16).reshape(-1, len(TERM_FIELDS))
+
+    @staticmethod
+    def from_fac_name(name):  # type: (str) -> CompactLevel
+        """
+        Factory method returning the interned instance for given FAC level name, the name is parsed only once
+        :param name: FAC level name, terms separated by dots
+        :return: interned CompactLevel instance
+        """
+        try:
+            return CompactLevel.__interned[name]
+        except KeyError:
+            level = CompactLevel(name, _parse_terms(name))
+            return CompactLevel.__interned.setdefault(name, level)
+
+    @staticmethod
+    def from_fac_names(names):  # type: (typing.Iterable[str]) -> list
+        """
+        Bulk factory method, e.g. for all the names in the levels table of an atom
+        :param names: iterable of FAC level names
+        :return: list of interned CompactLevel instances in the same order
+        """
+        return [CompactLevel.from_fac_name(name) for name in names]
+
+
+def _from_fac_name(name):  # type: (str) -> CompactLevel
+    return CompactLevel.from_fac_name(name)
+
+
+def encode_level_names(names, max_terms=None):
+    """
+    Parses level names in bulk into a single integer array. Levels with fewer terms than the widest one are padded
+    with zeros, a zero principal quantum number therefore marks padding::
+
+        codes, term_counts = encode_level_names(["2p+4(0)0", "2p-1(1)1.3p-1(1)0"])
+        codes.shape  # (2, 2, 6)
+        codes[1, 1]  # [3, 1, -1, 1, 1, 0] i.e. n, l, spin, electron count, 2J of shell, 2J up to this shell
+
+    :param names: iterable of FAC level names
+    :param int max_terms: width of the term axis, by default the widest level
+    :return: tuple of integer array of shape (level count, max_terms, len(TERM_FIELDS)) and term count per level
+    """
+    levels = CompactLevel.from_fac_names(names)
+    term_counts = np.array([len(level.terms) for level in levels], dtype=np.int16)
+    if max_terms is None:
+        max_terms = int(term_counts.max()) if len(levels) else 0
+    assert np.all(term_counts <= max_terms), "Some levels have more than {} terms".format(max_terms)
+
+    codes = np.zeros((len(levels), max_terms, len(TERM_FIELDS)), dtype=np.int16)
+    for index, level in enumerate(levels):
+        if level.terms:
+            codes[index, :len(level.terms)] = level.terms
+    return codes, term_counts
+
+
+_levels_line_pattern = re.compile(
+    r"^\s*(?P<index>\d+)\s+-?\d+\s+(?P<energy>\S+)\s+(?P<parity>\d+)\s+\d+\s+(?P<j2>\d+)\s+"
+    r"(?P<complex>\S+)\s+(?P<configuration>\S+)\s+(?P<name>\S+)\s*$")
+_subshell_pattern = re.compile(r"(\d+)([spdfghik])(\d*)")
+
+
+def _subshell_label(n, l):  # type: (int, int) -> str
+    return str(n) + "spdfghik"[l]
+
+
+def _parse_occupancy(spec):  # type: (str) -> dict
+    """
+    Parses non relativistic configuration such as "2p5.3p1" or "2p5 3p" into {"2p": 5, "3p": 1}, missing electron
+    count means a single electron
+    """
+    return {n + l: int(count) if count else 1 for n, l, count in _subshell_pattern.findall(spec)}
+
+
+class LevelTable:
+    """
+    In memory, column oriented table of all levels of an atom as listed in the FAC levels file. Every column is a
+    NumPy array indexed by table row, so selecting levels is a vectorized boolean mask instead of a loop over
+    string parsing::
+
+        table = LevelTable.from_file("levels.txt")
+        table.select(configuration="2p5 3p", j2=0)  # FAC indices of all 2p5 3p levels with J=0
+
+    :ivar ndarray index: FAC level index
+    :ivar ndarray energy: level energy in eV relative to the ground level
+    :ivar ndarray parity: 0 for even and 1 for odd levels
+    :ivar ndarray j2: double the value of total angular momentum
+    :ivar ndarray complex: FAC complex of the level e.g. "1*2.2*7.3*1"
+    :ivar ndarray configuration: non relativistic configuration e.g. "2p5.3p1"
+    :ivar ndarray name: FAC level name in jj coupling e.g. "2p-1(1)1.3p-1(1)0"
+    :ivar ndarray shell_occupancy: electron count per shell, column n - 1 holds shell n
+    :ivar ndarray subshell_occupancy: electron count per subshell, columns labeled by :attr:`subshells`
+    :ivar list subshells: labels of subshell occupancy columns e.g. ["1s", "2s", "2p", "3s", ...]
+    """
+
+    def __init__(self, index, energy, parity, j2, complex, configuration, name):
+        self.index = np.asarray(index, dtype=np.int32)
+        self.energy = np.asarray(energy, dtype=float)
+        self.parity = np.asarray(parity, dtype=np.int8)
+        self.j2 = np.asarray(j2, dtype=np.int16)
+        self.complex = np.asarray(complex, dtype=str)
+        self.configuration = np.asarray(configuration, dtype=str)
+        self.name = np.asarray(name, dtype=str)
+        self.degeneracy = self.j2 + 1
+
+        self.shell_occupancy = self.__create_shell_occupancy()
+        self.subshells, self.subshell_occupancy = self.__create_subshell_occupancy()
+        self.__rows = {level_name: row for row, level_name in enumerate(self.name)}
+        self.__rows_of_indices = np.full(int(self.index.max()) + 1, -1, dtype=np.int32)
+        self.__rows_of_indices[self.index] = np.arange(len(self), dtype=np.int32)
+
+    def __len__(self):
+        return len(self.index)
+
+    @staticmethod
+    def from_file(filename):  # type: (str) -> LevelTable
+        """
+        Factory method reading the FAC levels file as printed by PrintTable
+        :param filename: path to the levels file
+        :return: LevelTable instance
+        """
+        with open(filename, 'r') as f:
+            matches = filter(None, map(_levels_line_pattern.match, f.readlines()))
+        assert matches, "Fatal error, no levels parsed"
+
+        columns = zip(*[(
+            int(match.group('index')),
+            float(match.group('energy')),
+            int(match.group('parity')),
+            int(match.group('j2')),
+            match.group('complex'),
+            match.group('configuration'),
+            match.group('name')
+        ) for match in matches])
+        return LevelTable(*columns)
+
+    def __create_shell_occupancy(self):
+        complexes = [[tuple(int(number) for number in shell.split("*")) for shell in level_complex.split(".")]
+                     for level_complex in self.complex]
+        max_n = max(n for shells in complexes for n, _ in shells)
+
+        occupancy = np.zeros((len(self), max_n), dtype=np.int8)
+        for row, shells in enumerate(complexes):
+            for n, count in shells:
+                occupancy[row, n - 1] = count
+        return occupancy
+
+    def __create_subshell_occupancy(self):
+        max_n = self.shell_occupancy.shape[1]
+        subshells = [_subshell_label(n, l) for n in range(1, max_n + 1) for l in range(n)]
+        columns = {label: column for column, label in enumerate(subshells)}
+
+        occupancy = np.zeros((len(self), len(subshells)), dtype=np.int8)
+        for row, configuration in enumerate(self.configuration):
+            listed = _parse_occupancy(configuration)
+            for label, count in listed.items():
+                occupancy[row, columns[label]] = count
+            # Subshells missing in the FAC configuration are closed, fill the rest of each shell from the lowest l
+            for n in range(1, max_n + 1):
+                remaining = self.shell_occupancy[row, n - 1] - sum(
+                    count for label, count in listed.items() if int(label[:-1]) == n)
+                for l in range(n):
+                    label = _subshell_label(n, l)
+                    if remaining <= 0:
+                        break
+                    if label in listed:
+                        continue
+                    count = min(remaining, 2 * (2 * l + 1))
+                    occupancy[row, columns[label]] = count
+                    remaining -= count
+        return subshells, occupancy
+
+    def get_row(self, name):  # type: (str) -> int
+        """
+        Returns the table row of a level given by its FAC name
+        :param name: FAC level name as in :meth:`EnergyLevel.get_fac_repr`
+        :return: row of the level in the table
+        """
+        try:
+            return self.__rows[name]
+        except KeyError:
+            raise Exception("Level {} not found in the levels table".format(name))
+
+    def get_index(self, name):  # type: (str) -> int
+        """
+        Returns FAC index of a level given by its FAC name
+        :param name: FAC level name as in :meth:`EnergyLevel.get_fac_repr`
+        :return: FAC index of the level
+        """
+        return int(self.index[self.get_row(name)])
+
+    def get_rows(self, indices):  # type: (np.ndarray) -> np.ndarray
+        """
+        Returns table rows of levels given by FAC indices
+        :param indices: FAC level indices
+        :return: integer ndarray of rows
+        """
+        return self.__rows_of_indices[np.asarray(indices, dtype=int)]
+
+    def get_compact_levels(self):  # type: () -> list
+        """
+        Returns interned :class:`CompactLevel` instances of all levels in table order
+        """
+        return CompactLevel.from_fac_names(self.name)
+
+    def mask(self, configuration=None, occupancy=None, j2=None, parity=None, min_energy=None, max_energy=None,
+             max_n=None):
+        """
+        Creates a boolean mask over table rows of levels matching all the given conditions, None means no condition.
+        The conditions on j2 and parity accept single values or iterables of allowed values.
+
+        :param str configuration: non relativistic configuration e.g. "2p5 3p" or "2p5.3p1", only the listed
+            subshells are checked
+        :param dict occupancy: required electron count per subshell e.g. {"2p": 5, "3p": 1}
+        :param j2: double the value of total angular momentum
+        :param parity: 0 for even, 1 for odd
+        :param float min_energy: minimal level energy in eV
+        :param float max_energy: maximal level energy in eV
+        :param int max_n: only levels with all electrons in shells up to max_n
+        :return: boolean ndarray of table length
+        """
+        mask = np.ones(len(self), dtype=bool)
+        required = {}
+        if configuration is not None:
+            required.update(_parse_occupancy(configuration))
+        if occupancy is not None:
+            required.update(occupancy)
+        for label, count in required.items():
+            if label not in self.subshells:
+                mask &= count == 0
+                continue
+            mask &= self.subshell_occupancy[:, self.subshells.index(label)] == count
+
+        if j2 is not None:
+            mask &= np.in1d(self.j2, np.atleast_1d(j2))
+        if parity is not None:
+            mask &= np.in1d(self.parity, np.atleast_1d(parity))
+        if min_energy is not None:
+            mask &= self.energy >= min_energy
+        if max_energy is not None:
+            mask &= self.energy <= max_energy
+        if max_n is not None and max_n < self.shell_occupancy.shape[1]:
+            mask &= np.all(self.shell_occupancy[:, max_n:] == 0, axis=1)
+        return mask
+
+    def select(self, **conditions):
+        """
+        Returns FAC indices of levels matching the conditions, see :meth:`mask` for the accepted keywords
+        :return: integer ndarray of FAC level indices
+        """
+        return self.index[self.mask(**conditions)]
@@ -0,0 +1,113 @@
+"""
+Module reducing plasma states of many hydro cells to a small set of representatives before population solves.
+Neighbouring cells and successive timesteps often have nearly identical states, solving each one separately
+wastes whole CRM runs.
+"""
+import numpy as np
+
+
+class QuantizedStates:
+    """
+    Result of :func:`quantize_states`.
+
+    :ivar ndarray temperatures: temperatures of the representative states in eV
+    :ivar ndarray electron_densities: electron densities of the representative states in cm^-3
+    :ivar ndarray inverse: index of the representative of every original state
+    :ivar float compression_ratio: number of original states per representative
+    :ivar float max_temperature_error: maximal relative temperature difference between a state and its representative
+    :ivar float max_density_error: maximal relative density difference between a state and its representative
+    """
+
+    def __init__(self, temperatures, electron_densities, inverse, original_temperatures, original_densities, keys,
+                 step):
+        self.temperatures = temperatures
+        self.electron_densities = electron_densities
+        self.inverse = inverse
+        self.__keys = keys
+        self.__step = step
+        self.__log_offsets = np.abs(np.column_stack([np.log(original_temperatures / temperatures[inverse]),
+                                                     np.log(original_densities / electron_densities[inverse])]))
+        self.compression_ratio = len(inverse) / float(len(temperatures)) if len(temperatures) else 1.0
+        self.max_temperature_error = float(np.max(np.abs(temperatures[inverse] / original_temperatures - 1),
+                                                  initial=0.0))
+        self.max_density_error = float(np.max(np.abs(electron_densities[inverse] / original_densities - 1),
+                                              initial=0.0))
+
+    def __repr__(self):
+        return "{} states -> {} representatives (ratio {:.1f}), max error T {:.2e}, ne {:.2e}".format(
+            len(self.inverse), len(self.temperatures), self.compression_ratio, self.max_temperature_error,
+            self.max_density_error)
+
+    def scatter(self, values):  # type: (np.ndarray) -> np.ndarray
+        """
+        Distribute values calculated for the representatives back to all original states
+        :param values: array with the first axis over representatives
+        :return: array with the first axis over original states
+        """
+        return np.asarray(values)[self.inverse]
+
+    def __get_log_slopes(self, values):
+        # Derivatives of values by the logarithms of temperature and density, central differences between the
+        # neighbouring occupied lattice cells, one sided where only one neighbour is occupied
+        rows = {tuple(key): row for row, key in enumerate(self.__keys.astype(int))}
+        slopes = np.zeros((2,) + values.shape)
+        for row, key in enumerate(self.__keys.astype(int)):
+            for axis in range(2):
+                shift = np.eye(2, dtype=int)[axis]
+                upper = rows.get(tuple(key + shift), row)
+                lower = rows.get(tuple(key - shift), row)
+                if upper != lower:
+                    slopes[axis, row] = (values[upper] - values[lower]) / (
+                            (self.__keys[upper, axis] - self.__keys[lower, axis]) * self.__step)
+        return slopes
+
+    def propagate_error(self, values):  # type: (np.ndarray) -> np.ndarray
+        """
+        Estimate the error of values calculated for the representatives, e.g. populations, at the original states
+        they are scattered to, see :meth:`scatter`. The error is the first order change of the values over the
+        distance of every state from its representative, the slopes are finite differences between neighbouring
+        representatives. Representatives without an occupied neighbour along an axis add no error along it.
+
+        :param values: array with the first axis over representatives
+        :return: array of absolute errors with the first axis over original states
+        """
+        values = np.asarray(values, dtype=float)
+        slopes = np.abs(self.__get_log_slopes(values))[:, self.inverse]
+        offsets = self.__log_offsets.T.reshape((2, len(self.inverse)) + (1,) * (values.ndim - 1))
+        return (slopes * offsets).sum(axis=0)
+
+
+def quantize_states(temperatures, electron_densities, tolerance=1e-2):
+    """
+    Bin states on a logarithmic lattice with relative spacing given by tolerance and keep one representative per
+    occupied lattice cell. The representative is the lattice cell centre, so the relative error of every state is
+    at most about tolerance / 2 in both temperature and density::
+
+        states = quantize_states(temperatures, electron_densities, tolerance=1e-2)
+        populations = states.scatter(solve(states.temperatures, states.electron_densities))
+
+    :param temperatures: temperatures in eV
+    :param electron_densities: electron densities in cm^-3
+    :param float tolerance: relative spacing of the lattice
+    :return: QuantizedStates instance
+    """
+    temperatures = np.asarray(temperatures, dtype=float).ravel()
+    electron_densities = np.asarray(electron_densities, dtype=float).ravel()
+    if np.any(temperatures <= 0) or np.any(electron_densities <= 0):
+        raise ValueError("Temperatures and electron densities must be positive")
+    assert tolerance > 0, "The tolerance must be positive"
+    step = np.log1p(tolerance)
+
+    keys = np.column_stack([np.round(np.log(temperatures) / step), np.round(np.log(electron_densities) / step)])
+    unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+    representatives = np.exp(unique_keys * step)
+
+    return QuantizedStates(
+        temperatures=representatives[:, 0],
+        electron_densities=representatives[:, 1],
+        inverse=inverse.ravel(),
+        original_temperatures=temperatures,
+        original_densities=electron_densities,
+        keys=unique_keys,
+        step=step
+    )
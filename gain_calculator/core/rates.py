@@ -0,0 +1,499 @@
+"""
+Module containing a collisional-radiative rate model rebuilt from the FAC text tables. Unlike the FAC CRM, which
+is a black box accessible through files only, the rate matrix here is available explicitly, so one factorization
+of it serves the populations as well as their derivatives. The model includes the same processes the FAC CRM is
+configured with, i.e. spontaneous radiative decay and electron impact excitation and deexcitation within one ion.
+"""
+import os
+import re
+
+import numpy as np
+from scipy import linalg
+
+from gain_calculator.core.fac_wrapper.generator import print_excitation_table
+from gain_calculator.core.fac_wrapper.parser import read_transitions_table
+from gain_calculator.core.levels import LevelTable
+
+excitation_constant = 8.010e-8
+"""Constant of the Maxwellian averaged excitation rate coefficient in cm^3 s^-1 eV^(1/2)"""
+
+
+def read_excitation_table(filename):  # type: (str) -> dict
+    """
+    Read the FAC collision strengths file as printed by PrintTable. The collision strengths of each transition are
+    tabulated at energies of the scattered electron, all the grids are padded to the same length.
+
+    :param filename: path to the excitation file
+    :return: dict of ndarrays **lower**, **upper**, **energy** (transition energy in eV), **grid** (scattered
+        electron energies in eV, one row per transition) and **collision_strength** (same shape as grid)
+    """
+    record_pattern = re.compile(r"^\s*(\d+)\s+\d+\s+(\d+)\s+\d+\s+(\S+)\s+\d+\s*$")
+    grid_size_pattern = re.compile(r"^NUSR\s*=\s*(\d+)")
+
+    lower, upper, energy, grids, collision_strengths = [], [], [], [], []
+    with open(filename, 'r') as f:
+        lines = f.readlines()
+
+    grid_size = 0
+    line_index = 0
+    while line_index < len(lines):
+        line = lines[line_index]
+        line_index += 1
+        match = grid_size_pattern.match(line)
+        if match is not None:
+            grid_size = int(match.group(1))
+            continue
+        match = record_pattern.match(line)
+        if match is None:
+            continue
+
+        # The record is followed by a line of Bethe coefficients and grid_size lines of tabulated values
+        values = np.array([[float(value) for value in value_line.split()[:2]]
+                           for value_line in lines[line_index + 1:line_index + 1 + grid_size]])
+        line_index += 1 + grid_size
+        lower.append(int(match.group(1)))
+        upper.append(int(match.group(2)))
+        energy.append(float(match.group(3)))
+        grids.append(values[:, 0])
+        collision_strengths.append(values[:, 1])
+
+    assert lower, "Fatal error, no collision strengths parsed"
+
+    width = max(len(grid) for grid in grids)
+    grid = np.zeros((len(grids), width))
+    collision_strength = np.zeros((len(grids), width))
+    for row, (row_grid, row_strength) in enumerate(zip(grids, collision_strengths)):
+        # Pad by repeating the last point, such intervals have zero width and do not contribute to integrals
+        grid[row] = np.concatenate([row_grid, np.repeat(row_grid[-1], width - len(row_grid))])
+        collision_strength[row] = np.concatenate([row_strength, np.repeat(row_strength[-1], width - len(row_grid))])
+
+    return {
+        "lower": np.array(lower, dtype=np.int32),
+        "upper": np.array(upper, dtype=np.int32),
+        "energy": np.array(energy),
+        "grid": grid,
+        "collision_strength": collision_strength
+    }
+
+
+class RateModel:
+    """
+    Collisional-radiative model of a single ion assembled from FAC text tables. Initialize it from generated
+    files like this::
+
+        model = RateModel.from_files(fac_wrapper.generate_files(atom, atom.data_folder))
+        populations = model.get_populations(temperature=900, electron_density=1e20)
+
+    Rows and columns of all matrices are table rows of :attr:`levels`, see :meth:`LevelTable.get_rows`.
+
+    :ivar LevelTable levels: table of all levels of the ion
+    :ivar ndarray transitions: radiative transitions, see :func:`read_transitions_table`
+    :ivar dict excitations: collision strengths, see :func:`read_excitation_table`
+    """
+
+    def __init__(self, levels, transitions, excitations):  # type: (LevelTable, np.ndarray, dict) -> None
+        self.levels = levels
+        self.transitions = transitions
+        self.excitations = excitations
+
+        self.__radiative_sources = levels.get_rows(transitions["upper"])
+        self.__radiative_destinations = levels.get_rows(transitions["lower"])
+        self.__radiative = self.__create_radiative_matrix(transitions["rate"])
+
+        self.__lower = levels.get_rows(excitations["lower"])
+        self.__upper = levels.get_rows(excitations["upper"])
+        self.__transition_energy = excitations["energy"]
+        self.__lower_degeneracy = levels.degeneracy[self.__lower].astype(float)
+        self.__upper_degeneracy = levels.degeneracy[self.__upper].astype(float)
+        self.__grid, self.__weighted_strength = self.__create_quadrature(
+            excitations["grid"], excitations["collision_strength"])
+
+    @staticmethod
+    def from_files(files):  # type: (generator.FacFiles) -> RateModel
+        """
+        Factory method reading the levels, transitions and excitation text tables of generated FAC files. A missing
+        excitation table is printed from the binary one first, see :func:`print_excitation_table`.
+        :param files: FacFiles instance as returned by generate_files
+        :return: RateModel instance
+        :raise IOError: if the excitation table is missing and cannot be printed
+        """
+        if not os.path.exists(files.excitation_filename):
+            print_excitation_table(files)
+        return RateModel(
+            levels=LevelTable.from_file(files.levels_filename),
+            transitions=read_transitions_table(files.transitions_filename),
+            excitations=read_excitation_table(files.excitation_filename)
+        )
+
+    def __len__(self):
+        return len(self.levels)
+
+    def __create_radiative_matrix(self, rates):
+        # Rates may have leading dimensions, e.g. samples, the matrices then get them too
+        sources, destinations = self.__radiative_sources, self.__radiative_destinations
+        radiative = np.zeros(rates.shape[:-1] + (len(self), len(self)))
+        np.add.at(radiative, (Ellipsis, destinations, sources), rates)
+        np.add.at(radiative, (Ellipsis, sources, sources), -rates)
+        return radiative
+
+    @staticmethod
+    def __create_quadrature(grid, collision_strength):
+        # Trapezoidal weights over scattered electron energy starting at zero, where the collision strength
+        # is extrapolated as constant
+        grid = np.hstack([np.zeros((len(grid), 1)), grid])
+        collision_strength = np.hstack([collision_strength[:, :1], collision_strength])
+        widths = np.diff(grid, axis=1)
+        weights = np.zeros_like(grid)
+        weights[:, :-1] += widths / 2.0
+        weights[:, 1:] += widths / 2.0
+        return grid, weights * collision_strength
+
+    def __get_collision_integrals(self, temperature, derivative=False):
+        # sum_k w_k * Omega_k * exp(-E_k / T) * T^(-3/2) and optionally its derivative with respect to T
+        temperature = temperature[..., None]
+        exponent = self.__grid / temperature
+        terms = self.__weighted_strength * np.exp(-exponent) * np.power(temperature, -1.5)
+        integrals = terms.sum(axis=-1)
+        if not derivative:
+            return integrals, None
+        return integrals, (terms * (exponent - 1.5) / temperature).sum(axis=-1)
+
+    def __get_collision_rates(self, temperature, derivative=False):
+        # Temperature may be an array, the rates then get its shape as leading dimensions
+        temperature = np.asarray(temperature, dtype=float)[..., None]
+        integrals, integral_derivatives = self.__get_collision_integrals(temperature, derivative)
+        boltzmann = np.exp(-self.__transition_energy / temperature)
+        deexcitation = excitation_constant * integrals / self.__upper_degeneracy
+        excitation = excitation_constant * integrals * boltzmann / self.__lower_degeneracy
+        if not derivative:
+            return excitation, deexcitation, None, None
+
+        deexcitation_derivative = excitation_constant * integral_derivatives / self.__upper_degeneracy
+        excitation_derivative = excitation_constant * boltzmann / self.__lower_degeneracy * (
+                integral_derivatives + integrals * self.__transition_energy / np.power(temperature, 2))
+        return excitation, deexcitation, excitation_derivative, deexcitation_derivative
+
+    def __create_collision_matrix(self, excitation, deexcitation):
+        collision = np.zeros(excitation.shape[:-1] + (len(self), len(self)))
+        np.add.at(collision, (Ellipsis, self.__upper, self.__lower), excitation)
+        np.add.at(collision, (Ellipsis, self.__lower, self.__lower), -excitation)
+        np.add.at(collision, (Ellipsis, self.__lower, self.__upper), deexcitation)
+        np.add.at(collision, (Ellipsis, self.__upper, self.__upper), -deexcitation)
+        return collision
+
+    def get_rate_matrix(self, temperature, electron_density):  # type: (float, float) -> np.ndarray
+        """
+        Returns the rate matrix R of the system dN/dt = R N, element R[i, j] is the rate from level j to level i
+        in s^-1, the diagonal holds the total depopulation rates with negative sign. Arrays of states give a stack
+        of matrices.
+
+        :param temperature: electron temperature in eV, a number or an array
+        :param electron_density: electron density in cm^-3, a number or an array of the shape of temperature
+        :return: ndarray of shape temperature.shape + (level count, level count)
+        """
+        excitation, deexcitation, _, _ = self.__get_collision_rates(temperature)
+        electron_density = np.asarray(electron_density, dtype=float)[..., None, None]
+        return self.__radiative + electron_density * self.__create_collision_matrix(excitation, deexcitation)
+
+    def get_process_rates(self, temperature, electron_density):  # type: (float, float) -> tuple
+        """
+        Returns the rates of all radiative and collisional processes one by one instead of assembled into the rate
+        matrix, a process moves population from its source level to its destination level. Reduced models
+        accumulate them into their own matrices without building the full one.
+
+        :param float temperature: electron temperature in eV
+        :param float electron_density: electron density in cm^-3
+        :return: tuple of ndarrays of source rows, destination rows and rates in s^-1
+        """
+        excitation, deexcitation, _, _ = self.__get_collision_rates(temperature)
+        return (np.concatenate([self.__radiative_sources, self.__lower, self.__upper]),
+                np.concatenate([self.__radiative_destinations, self.__upper, self.__lower]),
+                np.concatenate([self.transitions["rate"], electron_density * excitation,
+                                electron_density * deexcitation]))
+
+    def get_rate_matrix_derivatives(self, temperature, electron_density):
+        """
+        Returns derivatives of the rate matrix with respect to temperature and electron density
+        :param float temperature: electron temperature in eV
+        :param float electron_density: electron density in cm^-3
+        :return: tuple of square ndarrays dR/dT and dR/dne
+        """
+        excitation, deexcitation, excitation_derivative, deexcitation_derivative = self.__get_collision_rates(
+            temperature, derivative=True)
+        return (electron_density * self.__create_collision_matrix(excitation_derivative, deexcitation_derivative),
+                self.__create_collision_matrix(excitation, deexcitation))
+
+    @staticmethod
+    def __get_steady_state_matrix(rate_matrix):
+        # Replace the first balance equation by the normalization condition
+        steady_state_matrix = rate_matrix.copy()
+        steady_state_matrix[0, :] = 1.0
+        return steady_state_matrix
+
+    def get_populations(self, temperature, electron_density, population_total=1.0):
+        """
+        Solve the steady state level populations
+        :param float temperature: electron temperature in eV
+        :param float electron_density: electron density in cm^-3
+        :param float population_total: the sum of populations over all levels
+        :return: ndarray of populations of all levels
+        """
+        right_hand_side = np.zeros(len(self))
+        right_hand_side[0] = population_total
+        return linalg.solve(self.__get_steady_state_matrix(self.get_rate_matrix(temperature, electron_density)),
+                            right_hand_side)
+
+    def get_residual(self, populations, temperature, electron_density):
+        """
+        Returns the relative residual of the steady state balance max|R N| / max(|diag R| N) of given populations of
+        all levels. Applied to populations solved by the FAC CRM it is a model consistency check, it measures how much
+        the FAC rates differ from the rates of this model and says nothing about the convergence of the FAC solve,
+        for that see :meth:`Parser.get_populations` with a reference solver.
+
+        :param ndarray populations: populations of all levels
+        :param float temperature: electron temperature in eV
+        :param float electron_density: electron density in cm^-3
+        :return: float residual
+        """
+        rate_matrix = self.get_rate_matrix(temperature, electron_density)
+        outflow = np.abs(np.diag(rate_matrix)) * populations
+        return float(np.abs(rate_matrix.dot(populations)).max() / outflow.max())
+
+    def get_sensitivities(self, temperature, electron_density, population_total=1.0):
+        """
+        Solve the steady state level populations together with their derivatives with respect to temperature and
+        electron density. Differentiating R N = 0 gives R dN = -dR N with the normalization keeping sum(dN) = 0, so
+        the derivatives cost one extra back substitution with the already factorized matrix.
+
+        :param float temperature: electron temperature in eV
+        :param float electron_density: electron density in cm^-3
+        :param float population_total: the sum of populations over all levels
+        :return: tuple of ndarrays populations, dN/dT and dN/dne of all levels
+        """
+        factorization = linalg.lu_factor(
+            self.__get_steady_state_matrix(self.get_rate_matrix(temperature, electron_density)))
+
+        right_hand_side = np.zeros(len(self))
+        right_hand_side[0] = population_total
+        populations = linalg.lu_solve(factorization, right_hand_side)
+
+        temperature_derivative, density_derivative = self.get_rate_matrix_derivatives(temperature, electron_density)
+        right_hand_sides = -np.column_stack([temperature_derivative.dot(populations),
+                                             density_derivative.dot(populations)])
+        right_hand_sides[0, :] = 0.0
+        derivatives = linalg.lu_solve(factorization, right_hand_sides)
+
+        return populations, derivatives[:, 0], derivatives[:, 1]
+
+    def evolve(self, times, temperatures, electron_densities, initial=None, substeps=4, population_total=1.0):
+        """
+        Integrate the time dependent populations dN/dt = R(T(t), ne(t)) N of a set of cells along their trajectories,
+        e.g. hydro cells whose conditions change faster than the levels relax to the steady state. Example::
+
+            populations = model.evolve(times, cell_temperatures, cell_densities)  # shape (time, cell, level)
+
+        The plasma state is held at the mean of the interval end points within every interval. The system is stiff,
+        so it is integrated by the implicit Euler method. The matrices (I - h R) of all cells are built once per
+        interval and every substep is one batched solve over all cells, there is no Python loop over cells.
+
+        :param times: ndarray of times in s, increasing
+        :param temperatures: electron temperatures in eV of shape (time count, cell count)
+        :param electron_densities: electron densities in cm^-3 of shape (time count, cell count)
+        :param initial: populations of shape (cell count, level count) at the first time, the steady state at the
+            first time by default
+        :param int substeps: number of implicit Euler steps per interval
+        :param float population_total: the sum of populations over all levels, used by the default initial state
+        :return: ndarray of populations of shape (time count, cell count, level count)
+        """
+        times = np.asarray(times, dtype=float)
+        temperatures = np.asarray(temperatures, dtype=float).reshape(len(times), -1)
+        electron_densities = np.asarray(electron_densities, dtype=float).reshape(len(times), -1)
+
+        if initial is None:
+            initial = [self.get_populations(temperature, electron_density, population_total)
+                       for temperature, electron_density in zip(temperatures[0], electron_densities[0])]
+        populations = np.empty(temperatures.shape + (len(self),))
+        populations[0] = initial
+
+        identity = np.eye(len(self))
+        for step in range(1, len(times)):
+            rate_matrices = self.get_rate_matrix((temperatures[step - 1] + temperatures[step]) / 2,
+                                                 (electron_densities[step - 1] + electron_densities[step]) / 2)
+            step_matrices = identity - (times[step] - times[step - 1]) / substeps * rate_matrices
+            current = populations[step - 1]
+            for _ in range(substeps):
+                current = np.linalg.solve(step_matrices, current[..., None])[..., 0]
+            populations[step] = current
+        return populations
+
+    def sample_populations(self, temperatures, electron_densities, samples=100, radiative_uncertainty=0.1,
+                           collision_uncertainty=0.2, seed=None, population_total=1.0, max_memory=256.0):
+        """
+        Propagate uncertainties of the atomic data into the steady state populations by Monte Carlo. Every sample
+        scales the rate of each radiative transition and the collision strength of each collisional one by an
+        independent log-normal factor of median 1, the excitation and deexcitation of a transition share the factor
+        so the detailed balance holds. All samples at all points are solved as one batched linear system::
+
+            result = model.sample_populations(temperatures, densities, samples=200, seed=0)
+            np.percentile(result["populations"][..., row], [5, 95], axis=0)  # band of one level
+
+        :param temperatures: electron temperatures in eV, a number or a 1D array
+        :param electron_densities: electron densities in cm^-3 of the shape of temperatures
+        :param int samples: number of samples
+        :param float radiative_uncertainty: relative uncertainty of the radiative rates, the factors have log
+            standard deviation log(1 + radiative_uncertainty)
+        :param float collision_uncertainty: relative uncertainty of the collision strengths
+        :param seed: seed of the random generator for reproducible samples
+        :param float population_total: the sum of populations over all levels
+        :param float max_memory: memory of the batched matrices in MB, the samples are solved in chunks fitting it
+        :return: dict of ndarrays **populations** of shape (samples, points, level count), **nominal** populations of
+            unperturbed data of shape (points, level count), **radiative_factors** of shape (samples, transitions
+            count) and **collision_factors** of shape (samples, excitations count)
+        """
+        temperatures = np.atleast_1d(np.asarray(temperatures, dtype=float))
+        electron_densities = np.atleast_1d(np.asarray(electron_densities, dtype=float))
+        random = np.random.RandomState(seed)
+        radiative_factors = np.exp(np.log1p(radiative_uncertainty) * random.standard_normal(
+            (samples, len(self.transitions))))
+        collision_factors = np.exp(np.log1p(collision_uncertainty) * random.standard_normal(
+            (samples, len(self.__lower))))
+
+        excitation, deexcitation, _, _ = self.__get_collision_rates(temperatures)
+        excitation = excitation * electron_densities[:, None]
+        deexcitation = deexcitation * electron_densities[:, None]
+        right_hand_side = np.zeros(len(self))
+        right_hand_side[0] = population_total
+
+        def __solve(rate_matrices):
+            rate_matrices[..., 0, :] = 1.0
+            return np.linalg.solve(rate_matrices, np.broadcast_to(right_hand_side, rate_matrices.shape[:-1])[
+                ..., None])[..., 0]
+
+        nominal = __solve(self.__radiative + self.__create_collision_matrix(excitation, deexcitation))
+        populations = np.empty((samples,) + nominal.shape)
+        chunk = max(1, int(max_memory * 1024 ** 2 // (len(temperatures) * len(self) ** 2 * 8)))
+        for start in range(0, samples, chunk):
+            end = min(samples, start + chunk)
+            radiative = self.__create_radiative_matrix(self.transitions["rate"] * radiative_factors[start:end])
+            factors = collision_factors[start:end, None, :]
+            collision = self.__create_collision_matrix(excitation * factors, deexcitation * factors)
+            populations[start:end] = __solve(radiative[:, None] + collision)
+
+        return {
+            "populations": populations,
+            "nominal": nominal,
+            "radiative_factors": radiative_factors,
+            "collision_factors": collision_factors
+        }
+
+    def bundle(self, min_n=None, min_energy=None, retained=()):
+        """
+        Create a reduced model bundling the levels above a threshold into configuration averaged superlevels, see
+        :class:`SuperlevelModel`. A level is bundled if any of its electrons is in a shell n >= min_n or its energy
+        is at least min_energy, unless it is retained.
+
+        :param int min_n: levels with an electron in shell min_n or higher are bundled
+        :param float min_energy: levels with energy in eV at least min_energy are bundled
+        :param retained: FAC indices of levels kept resolved regardless of the thresholds, e.g. the lasing levels
+        :return: SuperlevelModel instance
+        """
+        bundled = np.zeros(len(self), dtype=bool)
+        if min_n is not None:
+            bundled |= np.any(self.levels.shell_occupancy[:, min_n - 1:] > 0, axis=1)
+        if min_energy is not None:
+            bundled |= self.levels.energy >= min_energy
+        bundled[self.levels.get_rows(np.asarray(retained, dtype=int))] = False
+        return SuperlevelModel(self, bundled)
+
+
+class SuperlevelModel:
+    """
+    Reduced collisional-radiative model in which the bundled levels of the same configuration are replaced by a
+    single superlevel, the rest of the levels stays resolved. Most of the high n levels only act as population
+    reservoirs, so the populations of the resolved levels barely change while the solve scales with the number of
+    superlevels. Create it by :meth:`RateModel.bundle`::
+
+        reduced = model.bundle(min_n=5, retained=[lower_index, upper_index])
+        populations = reduced.get_populations(temperature=900, electron_density=1e20)
+        reduced.get_error(900, 1e20)  # maximal relative error of the resolved levels
+
+    Levels within a superlevel are assumed in Boltzmann equilibrium at the electron temperature, the reduced rate
+    matrix is the full one aggregated over the superlevels and weighted by this distribution. It is accumulated
+    from the individual process rates (see :meth:`RateModel.get_process_rates`), so the full matrix of the detailed
+    model is never built, only :meth:`get_error` solves the detailed model.
+
+    The reduction is built on the native :class:`RateModel` only, the FAC CRM solve cannot be bundled as it is
+    accessible through files only. The rate model needs the excitation table, which is not part of the bundled
+    high n data (e.g. run/atomic_data "up to n=6"). It is printed from the binary .ce file on first use, which needs
+    pfac, otherwise an IOError is raised, see :meth:`RateModel.from_files`.
+
+    :ivar RateModel model: the detailed model
+    :ivar ndarray superlevels: superlevel of every table row of the detailed model
+    :ivar ndarray resolved: table rows of the levels that are not bundled
+    :ivar list labels: FAC level name of resolved superlevels, configuration of the bundled ones
+    """
+
+    def __init__(self, model, bundled):  # type: (RateModel, np.ndarray) -> None
+        self.model = model
+        keys = np.where(bundled, np.char.add("bundle ", model.levels.configuration), model.levels.name)
+        labels, self.superlevels = np.unique(keys, return_inverse=True)
+        self.labels = [label.replace("bundle ", "") for label in labels]
+        self.resolved = np.flatnonzero(~bundled)
+        # Energies relative to the lowest level of each superlevel, so the Boltzmann factors never underflow
+        lowest = np.full(len(labels), np.inf)
+        np.minimum.at(lowest, self.superlevels, model.levels.energy)
+        self.__energy = model.levels.energy - lowest[self.superlevels]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __get_distribution(self, temperature):
+        # Boltzmann fractions of the levels within their superlevels, resolved levels get 1
+        weights = self.model.levels.degeneracy * np.exp(-self.__energy / temperature)
+        return weights / np.bincount(self.superlevels, weights, minlength=len(self))[self.superlevels]
+
+    def get_rate_matrix(self, temperature, electron_density):  # type: (float, float) -> np.ndarray
+        """
+        Returns the rate matrix between superlevels, see :meth:`RateModel.get_rate_matrix`
+        :param float temperature: electron temperature in eV
+        :param float electron_density: electron density in cm^-3
+        :return: square ndarray of superlevel count
+        """
+        sources, destinations, rates = self.model.get_process_rates(temperature, electron_density)
+        # The flow out of a superlevel is its population times the Boltzmann fraction of the source level
+        rates = rates * self.__get_distribution(temperature)[sources]
+        sources, destinations = self.superlevels[sources], self.superlevels[destinations]
+        rate_matrix = np.zeros((len(self), len(self)))
+        np.add.at(rate_matrix, (destinations, sources), rates)
+        np.add.at(rate_matrix, (sources, sources), -rates)
+        return rate_matrix
+
+    def get_populations(self, temperature, electron_density, population_total=1.0):
+        """
+        Solve the steady state populations of the reduced model, the superlevel populations are split over their
+        levels by the Boltzmann distribution
+        :param float temperature: electron temperature in eV
+        :param float electron_density: electron density in cm^-3
+        :param float population_total: the sum of populations over all levels
+        :return: ndarray of populations of all levels of the detailed model
+        """
+        rate_matrix = self.get_rate_matrix(temperature, electron_density)
+        rate_matrix[0, :] = 1.0
+        right_hand_side = np.zeros(len(self))
+        right_hand_side[0] = population_total
+        populations = linalg.solve(rate_matrix, right_hand_side)
+        return populations[self.superlevels] * self.__get_distribution(temperature)
+
+    def get_error(self, temperature, electron_density, population_total=1.0):
+        """
+        Returns the maximal relative error of the resolved level populations against the detailed model. It costs
+        a detailed solve, evaluate it at a few representative points to choose the thresholds.
+
+        :param float temperature: electron temperature in eV
+        :param float electron_density: electron density in cm^-3
+        :param float population_total: the sum of populations over all levels
+        :return: float relative error
+        """
+        detailed = self.model.get_populations(temperature, electron_density, population_total)[self.resolved]
+        reduced = self.get_populations(temperature, electron_density, population_total)[self.resolved]
+        return float(np.max(np.abs(reduced - detailed) / np.abs(detailed)))
@@ -2,20 +2,51 @@
 
 import contextlib
 import os
+import shutil
 import sys
+import tempfile
+from multiprocessing import util
+
+__output_descriptors = {}
+__scratch_folders = {}
 
 
 @contextlib.contextmanager
 def no_stdout(output=os.devnull):
+    """
+    Redirect the standard output file descriptor into output, so even the output of C extensions like FAC is
+    silenced. The output is opened once per process and kept open, the original descriptor is restored on exit.
+    :param str output: path of the file receiving the output
+    """
+    if output not in __output_descriptors:
+        __output_descriptors[output] = os.open(output, os.O_WRONLY)
     sys.stdout.flush()  # <--- important when redirecting to files
-    save_stdout = sys.stdout
-    new_stdout = os.dup(1)
-    devnull = os.open(output, os.O_WRONLY)
-    os.dup2(devnull, 1)
-    os.close(devnull)
-    sys.stdout = os.fdopen(new_stdout, 'w')
-    yield
-    sys.stdout = save_stdout
+    saved_descriptor = os.dup(1)
+    os.dup2(__output_descriptors[output], 1)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved_descriptor, 1)
+        os.close(saved_descriptor)
+
+
+def get_scratch_folder():  # type: () -> str
+    """
+    Returns a scratch folder private to the current process for short lived files, e.g. the FAC population
+    files. It is created on the in-memory /dev/shm if available and removed when the process exits. The removal is
+    a multiprocessing finalizer, unlike atexit handlers those run in pool workers too, which leave by os._exit, and
+    they never run in forked children, which would remove the folder of the parent.
+    :return: path of the folder
+    """
+    process_id = os.getpid()
+    if process_id not in __scratch_folders:
+        shared_memory = "/dev/shm"
+        base = shared_memory if os.path.isdir(shared_memory) and os.access(shared_memory, os.W_OK) else None
+        folder = tempfile.mkdtemp(prefix="gain_calculator_{}_".format(process_id), dir=base)
+        util.Finalize(None, shutil.rmtree, args=(folder, True), exitpriority=0)
+        __scratch_folders[process_id] = folder
+    return __scratch_folders[process_id]
 
 
 # taken from https://gist.github.com/aubricus/f91fb55dc6ba5557fbab06119420dd6a
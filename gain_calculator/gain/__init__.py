@@ -1 +1,8 @@
 from gain_calculator.gain.calculate import GainCalculator
+from gain_calculator.gain.optimize import GainOptimizer
+from gain_calculator.gain.hydro import HydroReader
+from gain_calculator.gain.hydro import write_gain_history
+from gain_calculator.gain.interpolate import StateIndex
+from gain_calculator.gain.amplification import get_amplified_intensity
+from gain_calculator.gain.amplification import integrate_intensity
+from gain_calculator.gain.profiles import get_gain_cube
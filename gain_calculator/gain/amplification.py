@@ -0,0 +1,172 @@
+"""
+Module integrating amplified spontaneous emission (ASE) through the plasma column. The hydro run gives a transverse
+profile of cells, the gain coefficient and the emissivity of the lasing line on its cells come from
+:class:`GainCalculator`. Rays travel along the column of the line focus, each given by its transverse offset and
+angle, and are optionally bent by the electron density gradient. The transport equation with gain saturation
+
+.. math:: \\frac{dI}{dz} = \\frac{g I}{1 + I / I_s} + \\varepsilon
+
+is stepped along the column for all rays at once, so a study of thousands of geometries costs a few hundred array
+operations::
+
+    result = get_amplified_intensity(positions, gain, emissivity, offsets, angles, length=0.5,
+                                     saturation_intensity=1e10, electron_densities=densities,
+                                     transition_energy=calculator.data["transition_energy"])
+    result["intensity"]
+
+Gain and emissivity vanish outside the profile, rays leaving the plasma are no longer amplified. Intensities are in
+any unit, the emissivity (per cm) and the saturation intensity have to use the same one.
+"""
+import numpy as np
+
+electron_mass = 9.1093897e-28
+"""Electron mass in g"""
+
+elementary_charge = 4.8032068e-10
+"""Elementary charge in statC"""
+
+planck_constant = 6.626068760e-27
+"""Planck constant in erg s"""
+
+electronvolt = 1.6021773e-12
+"""Electronvolt in erg"""
+
+
+def get_critical_density(transition_energy):
+    """
+    Returns the critical electron density of radiation of given photon energy, :math:`n_c = m_e \\omega^2 / 4 \\pi e^2`
+    :param transition_energy: photon energy in eV
+    :return: critical density in cm^-3
+    """
+    angular_frequency = 2 * np.pi * np.asarray(transition_energy) * electronvolt / planck_constant
+    return electron_mass * np.power(angular_frequency, 2) / (4 * np.pi * np.power(elementary_charge, 2))
+
+
+def __sort_profile(positions, *fields):
+    # np.interp needs increasing positions, Lagrangian cells may be stored in reverse
+    positions = np.asarray(positions, dtype=float)
+    order = np.argsort(positions)
+    return [positions[order]] + [None if field is None else np.asarray(field, dtype=float)[order] for field in fields]
+
+
+def trace_rays(positions, offsets, angles, length, steps, electron_densities=None, critical_density=None):
+    """
+    Trace rays along the column, all rays are traced at once. Without electron densities the rays are straight
+    lines, otherwise they follow the paraxial ray equation :math:`x'' = -\\partial_x n_e / 2 n_c` integrated by the
+    velocity Verlet scheme.
+
+    :param positions: transverse positions of the cells in cm
+    :param offsets: transverse positions of the rays at the start of the column in cm, an array of rays
+    :param angles: angles of the rays to the column axis in rad of the shape of offsets
+    :param float length: length of the column in cm
+    :param int steps: number of steps along the column
+    :param electron_densities: electron densities of the cells in cm^-3, None for no refraction
+    :param float critical_density: critical density of the line in cm^-3, see :func:`get_critical_density`
+    :return: ndarray of transverse positions of the rays at the step boundaries, shape offsets.shape + (steps + 1,)
+    """
+    offsets, angles = np.broadcast_arrays(np.asarray(offsets, dtype=float), np.asarray(angles, dtype=float))
+    step_length = float(length) / steps
+    if electron_densities is None:
+        return offsets[..., None] + angles[..., None] * step_length * np.arange(steps + 1)
+
+    assert critical_density is not None, "Refraction needs the critical density"
+    positions, electron_densities = __sort_profile(positions, electron_densities)
+    deflection = -np.gradient(electron_densities, positions) / (2 * critical_density)
+
+    ray_positions = np.empty(offsets.shape + (steps + 1,))
+    ray_positions[..., 0] = offsets
+    position = offsets.copy()
+    slope = angles.copy()
+    acceleration = np.interp(position, positions, deflection)
+    for step in range(steps):
+        position = position + slope * step_length + 0.5 * acceleration * step_length ** 2
+        new_acceleration = np.interp(position, positions, deflection)
+        slope = slope + 0.5 * (acceleration + new_acceleration) * step_length
+        acceleration = new_acceleration
+        ray_positions[..., step + 1] = position
+    return ray_positions
+
+
+def integrate_intensity(gain, emissivity, step_length, saturation_intensity=None, initial_intensity=0.0,
+                        history=False):
+    """
+    Integrate the transport equation along rays sampled at equidistant steps, the last axis of the fields runs along
+    the rays. Over a step the saturated gain is held at its value at the predicted midpoint intensity and the step
+    is solved exactly, :math:`I' = I e^{g \\Delta z} + \\varepsilon (e^{g \\Delta z} - 1) / g`. Without saturation
+    the result is exact for piecewise constant fields.
+
+    :param ndarray gain: small signal gain coefficients in cm^-1 of shape (..., steps)
+    :param ndarray emissivity: emissivities per cm of the shape of gain
+    :param float step_length: step length in cm
+    :param saturation_intensity: saturation intensity, a number or an array of the shape of gain, None for no
+        saturation
+    :param initial_intensity: intensity entering the column, a number or an array of the leading shape of gain
+    :param bool history: return the intensities at all step boundaries instead of the output ones
+    :return: ndarray of output intensities of the leading shape of gain, or of shape (..., steps + 1) with history
+    """
+    gain = np.asarray(gain, dtype=float)
+    emissivity = np.broadcast_to(np.asarray(emissivity, dtype=float), gain.shape)
+    if saturation_intensity is not None:
+        saturation_intensity = np.broadcast_to(np.asarray(saturation_intensity, dtype=float), gain.shape)
+
+    intensity = np.array(np.broadcast_to(np.asarray(initial_intensity, dtype=float), gain.shape[:-1]))
+    intensities = [intensity] if history else None
+    for step in range(gain.shape[-1]):
+        step_gain = gain[..., step]
+        if saturation_intensity is not None:
+            growth, source = __get_step(step_gain / (1 + intensity / saturation_intensity[..., step]),
+                                        0.5 * step_length)
+            midpoint_intensity = intensity * growth + emissivity[..., step] * source
+            step_gain = step_gain / (1 + midpoint_intensity / saturation_intensity[..., step])
+        growth, source = __get_step(step_gain, step_length)
+        intensity = intensity * growth + emissivity[..., step] * source
+        if history:
+            intensities.append(intensity)
+    return np.stack(intensities, axis=-1) if history else intensity
+
+
+def __get_step(gain, step_length):
+    # Growth factor e^(g dz) and source factor (e^(g dz) - 1) / g, the latter tends to dz for vanishing gain
+    exponent = gain * step_length
+    small = np.abs(exponent) < 1e-12
+    source = np.where(small, step_length, np.expm1(exponent) / np.where(small, 1.0, gain))
+    return np.exp(exponent), source
+
+
+def get_amplified_intensity(positions, gain, emissivity, offsets, angles, length, steps=200,
+                            saturation_intensity=None, electron_densities=None, transition_energy=None):
+    """
+    Returns the ASE output intensity of rays through the column, see :func:`trace_rays` and
+    :func:`integrate_intensity`. The fields are sampled at the midpoints of the steps.
+
+    :param positions: transverse positions of the cells in cm, e.g. the cell_position of a hydro timestep
+    :param gain: small signal gain coefficients of the cells in cm^-1, see :meth:`GainCalculator.get_gain`
+    :param emissivity: emissivities of the cells per cm
+    :param offsets: transverse positions of the rays at the start of the column in cm
+    :param angles: angles of the rays to the column axis in rad
+    :param float length: length of the column in cm
+    :param int steps: number of steps along the column
+    :param saturation_intensity: saturation intensity, a number or an array of cell values, None for no saturation
+    :param electron_densities: electron densities of the cells in cm^-3 to refract the rays, None for straight rays
+    :param float transition_energy: photon energy in eV, needed for refraction
+    :return: dict of ndarrays **intensity** (output intensity per ray), **gain_length** (small signal gain-length
+        product per ray) and **positions** (transverse ray positions at the step boundaries)
+    """
+    critical_density = None if electron_densities is None else get_critical_density(transition_energy)
+    ray_positions = trace_rays(positions, offsets, angles, length, steps, electron_densities, critical_density)
+    midpoints = 0.5 * (ray_positions[..., 1:] + ray_positions[..., :-1])
+
+    saturation_field = saturation_intensity is not None and np.ndim(saturation_intensity) > 0
+    positions, gain, emissivity, saturation_profile = __sort_profile(
+        positions, gain, emissivity, saturation_intensity if saturation_field else None)
+    if saturation_field:
+        saturation_intensity = np.interp(midpoints, positions, saturation_profile)
+
+    ray_gain = np.interp(midpoints, positions, gain, left=0.0, right=0.0)
+    ray_emissivity = np.interp(midpoints, positions, emissivity, left=0.0, right=0.0)
+    step_length = float(length) / steps
+    return {
+        "intensity": integrate_intensity(ray_gain, ray_emissivity, step_length, saturation_intensity),
+        "gain_length": ray_gain.sum(axis=-1) * step_length,
+        "positions": ray_positions
+    }
@@ -1,53 +1,191 @@
+import importlib
 import itertools
 import pickle
 import numpy as np
-from pfac.crm import *
+
+from gain_calculator.core.instrumentation import instrumentation
+from gain_calculator.core.quantize import quantize_states
+from gain_calculator.gain import profiles
+from gain_calculator.gain.interpolate import StateIndex
 
 
 class GainCalculator:
-    def __init__(self, filename=None):
-        self.get_gain = np.vectorize(self.get_gain)
-        self.get_population_at = np.vectorize(self.get_population_at)
+    """
+    Calculator of the gain coefficient from stored populations of the lasing levels. The stored states are looked up
+    by a :class:`StateIndex`, all states of a call at once. With linear interpolation states that are not stored,
+    e.g. cells of another hydro run, are interpolated from the stored ones, states outside the stored ones get NaN.
+
+    :param str filename: serialized data to load, see :meth:`serialize`
+    :param str interpolation: "exact" to raise for states that are not stored, "linear" (barycentric in log T,
+        log ne) or "nearest"
+    """
+
+    def __init__(self, filename=None, interpolation="exact"):
+        self.interpolation = interpolation
+        self.__indices = {}
         if filename:
             f = open(filename, 'rb')
             self.data = pickle.load(f)
         else:
             self.data = None
 
-    def init_by_calculation(self, transition, temperatures, densities, log=None, combine=itertools.product):
-        generated_populations = transition.get_populations(
-            temperatures,
-            densities,
-            combine=combine,
-            log=log
-        )
+    def init_by_calculation(self, transition, temperatures, densities, log=None, combine=itertools.product,
+                            sensitivities=False, tolerance=None, solver="default", reference_solver=None):
+        """
+        Calculate the populations of the transition levels and store them. With tolerance given, the states
+        produced by combine are first binned on a logarithmic lattice (see :func:`quantize_states`), only one
+        representative per bin is solved and the results are scattered back to all states. The achieved compression,
+        the state error and the error it causes in the populations (divided by degeneracy) and the relative error of
+        the gain (see :meth:`QuantizedStates.propagate_error`) are stored under the "quantization" key. This pays off
+        for hydro cell states combined by zip.
+
+        :param Transition transition: the lasing transition
+        :param temperatures: temperatures in eV
+        :param densities: electron densities in cm^-3
+        :param log: progress callback, see :meth:`Atom.get_populations`
+        :param combine: the way to combine densities and temperatures, default is itertools.product
+        :param bool sensitivities: if True, the derivatives of the populations are calculated by the
+            :class:`RateModel` of the atom and stored along the FAC populations, :meth:`get_gain_derivatives` becomes
+            available
+        :param float tolerance: relative tolerance of state quantization, None means every state is solved
+        :param str solver: CRM iteration preset, see :meth:`Atom.get_populations`
+        :param str reference_solver: CRM iteration preset of a second solve, the convergence error of every point is
+            then stored along the populations under the "convergence_error" key of the levels, see
+            :meth:`Atom.get_populations`
+        """
+        quantization = None
+        if tolerance is None:
+            generated_populations = self.__calculate_populations(
+                transition, temperatures, densities, combine, log, sensitivities, solver, reference_solver)
+        else:
+            pairs = list(combine(np.atleast_1d(temperatures), np.atleast_1d(densities)))
+            states = quantize_states([pair[0] for pair in pairs], [pair[1] for pair in pairs], tolerance)
+            representative_populations = self.__calculate_populations(
+                transition, states.temperatures, states.electron_densities, zip, log, sensitivities, solver,
+                reference_solver)
+            generated_populations = {}
+            population_errors = {}
+            for level, populations in representative_populations.items():
+                population_errors[level] = states.propagate_error(populations["population"])
+                populations = states.scatter(populations)
+                populations["temperature"] = [pair[0] for pair in pairs]
+                populations["electron_density"] = [pair[1] for pair in pairs]
+                generated_populations[level] = populations
+            # The gain is proportional to the inversion, its relative error is the one of the inversion
+            inversion_error = states.propagate_error(representative_populations["upper"]["population"] -
+                                                     representative_populations["lower"]["population"])
+            inversion = np.abs(generated_populations["upper"]["population"] -
+                               generated_populations["lower"]["population"])
+            quantization = {
+                "compression_ratio": states.compression_ratio,
+                "max_temperature_error": states.max_temperature_error,
+                "max_density_error": states.max_density_error,
+                "max_population_error": {level: float(np.max(errors, initial=0.0))
+                                         for level, errors in population_errors.items()},
+                "max_gain_error": float(np.max(inversion_error[inversion > 0] / inversion[inversion > 0],
+                                               initial=0.0))
+            }
+
         self.data = {
             "upper": {
-                "temperature": generated_populations["upper"]["temperature"],
-                "electron_density": generated_populations["upper"]["electron_density"],
-                "population": generated_populations["upper"]["population"],
+                name: generated_populations["upper"][name] for name in generated_populations["upper"].dtype.names
             },
             "lower": {
-                "temperature": generated_populations["lower"]["temperature"],
-                "electron_density": generated_populations["lower"]["electron_density"],
-                "population": generated_populations["lower"]["population"],
+                name: generated_populations["lower"][name] for name in generated_populations["lower"].dtype.names
             },
             "oscillator_strength": transition.weighted_oscillator_strength,
             "transition_energy": transition.energy,
             "temperatures": temperatures,
             "densities": densities
         }
+        if quantization is not None:
+            self.data["quantization"] = quantization
+
+    @staticmethod
+    def __calculate_populations(transition, temperatures, densities, combine, log, sensitivities, solver,
+                                reference_solver):
+        with instrumentation.stage("gain_calculator.calculate_populations"):
+            populations = transition.get_populations(temperatures, densities, combine=combine, log=log, solver=solver,
+                                                     reference_solver=reference_solver)
+            if not sensitivities:
+                return populations
+            # The populations stay the FAC ones, the rate model contributes the derivatives only
+            derivatives = transition.get_sensitivities(temperatures, densities, combine=combine)
+            return {level: GainCalculator.__attach_derivatives(populations[level], derivatives[level])
+                    for level in ["lower", "upper"]}
+
+    @staticmethod
+    def __attach_derivatives(populations, derivatives):
+        result = np.zeros(len(populations), dtype=populations.dtype.descr + [("d_temperature", float),
+                                                                            ("d_electron_density", float)])
+        for name in populations.dtype.names:
+            result[name] = populations[name]
+        for name in ["d_temperature", "d_electron_density"]:
+            result[name] = derivatives[name]
+        return result
+
+    def extend_by_calculation(self, transition, temperatures, densities, log=None, combine=zip, sensitivities=False,
+                              solver="default", reference_solver=None):
+        """
+        Calculate the populations at additional points and append them to the stored ones, see
+        :meth:`init_by_calculation` for the parameters. If nothing is stored yet this is the same as
+        :meth:`init_by_calculation`.
+        """
+        if self.data is None:
+            self.init_by_calculation(transition, temperatures, densities, log, combine, sensitivities,
+                                     solver=solver, reference_solver=reference_solver)
+            return
+
+        addition = GainCalculator()
+        addition.init_by_calculation(transition, temperatures, densities, log, combine, sensitivities,
+                                     solver=solver, reference_solver=reference_solver)
+        self.data.pop("quantization", None)
+        for level in ["upper", "lower"]:
+            assert set(self.data[level]) == set(addition.data[level]), \
+                "Cannot mix data with and without sensitivities or convergence errors"
+            for name in self.data[level]:
+                self.data[level][name] = np.concatenate([self.data[level][name], addition.data[level][name]])
+        for name in ["temperatures", "densities"]:
+            self.data[name] = np.concatenate([np.atleast_1d(self.data[name]), np.atleast_1d(addition.data[name])])
 
     def serialize(self, filename):
         f = open(filename, 'wb')
         pickle.dump(self.data, f, protocol=2)
 
+    def get_index(self, level):  # type: (str) -> StateIndex
+        """
+        Returns the spatial index of the states stored for a level, it is rebuilt whenever the data change
+        :param str level: "upper" or "lower"
+        :return: StateIndex instance
+        """
+        temperatures = self.data[level]["temperature"]
+        index, source = self.__indices.get(level, (None, None))
+        if source is not temperatures:
+            index = StateIndex(temperatures, self.data[level]["electron_density"])
+            self.__indices[level] = (index, temperatures)
+        return index
+
     def get_population_at(self, level, density, temperature):
-        mask = (self.data[level]["temperature"] < temperature + 1e-6) * (
-                self.data[level]["temperature"] > temperature - 1e-6) * (
-                       self.data[level]["electron_density"] <= density + 1e-6) * (
-                       self.data[level]["electron_density"] >= density - 1e-6)
-        return self.data[level]["population"][mask][0]
+        """
+        Returns the population of a level interpolated at given states, see :attr:`interpolation`
+        :param str level: "upper" or "lower"
+        :param density: electron densities in cm^-3, a number or an array
+        :param temperature: temperatures in eV of the shape of density
+        :return: ndarray of populations divided by the level degeneracy
+        """
+        return self.get_index(level).interpolate(self.data[level]["population"], temperature, density,
+                                                 self.interpolation)
+
+    def get_population_derivatives_at(self, level, density, temperature):
+        """
+        Returns derivatives of the stored population with respect to temperature and electron density interpolated
+        at given states. Available only when initialized by calculation with sensitivities.
+        :return: tuple dN/dT, dN/dne
+        """
+        assert "d_temperature" in self.data[level], "Population derivatives were not calculated"
+        index = self.get_index(level)
+        return (index.interpolate(self.data[level]["d_temperature"], temperature, density, self.interpolation),
+                index.interpolate(self.data[level]["d_electron_density"], temperature, density, self.interpolation))
 
     def get_temperatures(self):
         return self.data["temperatures"]
@@ -64,9 +202,44 @@ class GainCalculator:
             electron_number,
             proton_number
     ):
-        relative_inversion = self.get_population_at("upper", electron_density, temperature) - self.get_population_at(
-            "lower", electron_density, temperature)
-        fractional_abundance = self.__get_abundance(temperature, electron_number, proton_number)
+        return self.get_gain_from_populations(
+            self.get_population_at("upper", electron_density, temperature),
+            self.get_population_at("lower", electron_density, temperature),
+            electron_density,
+            temperature,
+            ion_temperature,
+            ionizations,
+            electron_number,
+            proton_number
+        )
+
+    def get_gain_from_populations(
+            self,
+            upper_population,
+            lower_population,
+            electron_density,
+            temperature,
+            ion_temperature,
+            ionizations,
+            electron_number,
+            proton_number
+    ):
+        """
+        Returns the gain coefficient for given populations of the transition levels divided by their degeneracy
+        instead of the stored ones, e.g. the time dependent populations along hydro trajectories::
+
+            populations = transition.get_transient_populations(times, cell_temperatures, cell_densities)
+            gain = calculator.get_gain_from_populations(populations["upper"], populations["lower"], cell_densities,
+                                                        cell_temperatures, cell_ion_temperatures, cell_ionizations,
+                                                        electron_number=10, proton_number=26)
+
+        Only the transition energy and oscillator strength are taken from the stored data.
+        :return: gain coefficient in cm^-1
+        """
+        relative_inversion = np.asarray(upper_population, dtype=float) - np.asarray(lower_population, dtype=float)
+        electron_density, temperature, ion_temperature, ionizations = [
+            np.asarray(array, dtype=float) for array in (electron_density, temperature, ion_temperature, ionizations)]
+        fractional_abundance = self.__get_abundances(temperature, electron_number, proton_number)
         ion_density = electron_density / ionizations * fractional_abundance
         doppler_fwhm = 0.6 * self.__get_doppler_width(ion_temperature, self.data["transition_energy"])
         lorenz_fwhm = self.__get_lorenz_width(temperature, electron_density)
@@ -79,6 +252,164 @@ class GainCalculator:
             self.data["oscillator_strength"]
         )
 
+    def get_line_parameters(
+            self,
+            electron_density,
+            temperature,
+            ion_temperature,
+            ionizations,
+            electron_number,
+            proton_number
+    ):
+        """
+        Returns the parameters of the gain line at given states, the spectral gain is the strength times the area
+        normalized line profile. The widths are the ones :meth:`get_gain` uses.
+        :return: dict of ndarrays **centre** (line centre in Hz), **strength** (frequency integrated gain in
+            cm^-1 Hz), **doppler_fwhm** and **lorentz_fwhm** (in Hz) of the broadcast shape of the states
+        """
+        electron_density, temperature, ion_temperature, ionizations = [
+            np.asarray(array, dtype=float) for array in
+            np.broadcast_arrays(electron_density, temperature, ion_temperature, ionizations)]
+        relative_inversion = self.get_population_at("upper", electron_density, temperature) - self.get_population_at(
+            "lower", electron_density, temperature)
+        fractional_abundance = self.__get_abundances(temperature, electron_number, proton_number)
+        ion_density = electron_density / ionizations * fractional_abundance
+        return {
+            "centre": np.full(electron_density.shape, self.data["transition_energy"] * 1.6021773e-12 /
+                              self.__constants['h']),
+            "strength": self.__get_gain_constant(self.data["oscillator_strength"]) * relative_inversion * ion_density,
+            "doppler_fwhm": 0.6 * self.__get_doppler_width(ion_temperature, self.data["transition_energy"]),
+            "lorentz_fwhm": self.__get_lorenz_width(temperature, electron_density)
+        }
+
+    def get_gain_spectrum(
+            self,
+            frequencies,
+            electron_density,
+            temperature,
+            ion_temperature,
+            ionizations,
+            electron_number,
+            proton_number
+    ):
+        """
+        Returns the gain coefficient on a frequency grid with the Voigt line profile, see :func:`profiles.voigt`.
+        :meth:`get_gain` approximates the profile at the line centre by the inverse sum of the widths instead, so the
+        peak of the spectrum differs from it by a factor of order one. All states are evaluated at once::
+
+            frequencies = calculator.get_line_parameters(density, temperature, ion_temperature, ionization, 10,
+                                                         26)["centre"] + np.linspace(-1e13, 1e13, 401)
+            spectra = calculator.get_gain_spectrum(frequencies, cell_densities, cell_temperatures,
+                                                   cell_ion_temperatures, cell_ionizations, 10, 26)
+
+        :param frequencies: frequencies in Hz
+        :param electron_density: electron densities in cm^-3, a number or an array
+        :param temperature: temperatures in eV
+        :param ion_temperature: ion temperatures in eV
+        :param ionizations: mean ionizations
+        :param int electron_number: number of electrons of the ion
+        :param int proton_number: proton number of the element
+        :return: ndarray of gain coefficients in cm^-1 of shape electron_density.shape + frequencies.shape
+        """
+        line = self.get_line_parameters(electron_density, temperature, ion_temperature, ionizations,
+                                        electron_number, proton_number)
+        frequencies = np.asarray(frequencies, dtype=float)
+        extend = (Ellipsis,) + (None,) * frequencies.ndim
+        return line["strength"][extend] * profiles.voigt(frequencies - line["centre"][extend],
+                                                         line["doppler_fwhm"][extend], line["lorentz_fwhm"][extend])
+
+    def get_gain_bands(self, transition, electron_density, temperature, ion_temperature, ionizations, electron_number,
+                       proton_number, samples=100, radiative_uncertainty=0.1, collision_uncertainty=0.2,
+                       quantiles=(0.05, 0.5, 0.95), seed=None):
+        """
+        Returns confidence bands of the gain coefficient given by :meth:`get_gain` under the uncertainties of the
+        atomic data. The population samples of the transition levels are solved in one batched pass, see
+        :meth:`Transition.get_population_samples`. Every sample scales the stored gain by the relative change of the
+        inversion and of gf against the unperturbed data, so the bands are centred on the stored FAC populations::
+
+            bands = calculator.get_gain_bands(transition, densities, temperatures, ion_temperatures, ionizations,
+                                              electron_number=10, proton_number=26, samples=200, seed=0)
+            lower_band, median, upper_band = bands["quantiles"]
+
+        Points where the unperturbed inversion is close to zero give meaningless relative changes.
+
+        :param Transition transition: the transition the data were calculated for
+        :param electron_density: electron densities in cm^-3 of the points
+        :param temperature: electron temperatures in eV of the points
+        :param ion_temperature: ion temperatures in eV of the points
+        :param ionizations: mean ionizations of the points
+        :param int electron_number: number of electrons of the ion
+        :param int proton_number: proton number of the element
+        :param int samples: number of samples
+        :param float radiative_uncertainty: relative uncertainty of the radiative rates
+        :param float collision_uncertainty: relative uncertainty of the collision strengths
+        :param quantiles: quantiles of the bands
+        :param seed: seed of the random generator for reproducible samples
+        :return: dict of ndarrays **gain** (stored gain per point), **samples** (shape (samples, points)),
+            **mean**, **std** and **quantiles** (shape (len(quantiles), points)) in cm^-1
+        """
+        electron_density = np.atleast_1d(np.asarray(electron_density, dtype=float))
+        temperature = np.atleast_1d(np.asarray(temperature, dtype=float))
+        gain = np.atleast_1d(self.get_gain(electron_density, temperature, ion_temperature, ionizations,
+                                           electron_number, proton_number))
+        populations = transition.get_population_samples(temperature, electron_density, zip, samples,
+                                                        radiative_uncertainty, collision_uncertainty, seed)
+        inversion_ratio = (populations["upper"] - populations["lower"]) / (
+                populations["upper_nominal"] - populations["lower_nominal"])
+        gain_samples = gain * inversion_ratio * populations["oscillator_strength_factor"][:, None]
+        return {
+            "gain": gain,
+            "samples": gain_samples,
+            "mean": gain_samples.mean(axis=0),
+            "std": gain_samples.std(axis=0),
+            "quantiles": np.percentile(gain_samples, 100 * np.asarray(quantiles), axis=0)
+        }
+
+    def get_gain_derivatives(
+            self,
+            electron_density,
+            temperature,
+            ion_temperature,
+            ionizations,
+            electron_number,
+            proton_number
+    ):
+        """
+        Returns derivatives of the gain coefficient given by :meth:`get_gain` with respect to electron temperature
+        and electron density, the ion temperature and ionization are held constant. The population derivatives
+        come from the stored sensitivities, the rest of the gain formula is differentiated analytically.
+        :return: tuple dg/dT in cm^-1 eV^-1 and dg/dne in cm^2
+        """
+        electron_density, temperature, ion_temperature, ionizations = [
+            np.asarray(array, dtype=float) for array in (electron_density, temperature, ion_temperature, ionizations)]
+        relative_inversion = self.get_population_at("upper", electron_density, temperature) - self.get_population_at(
+            "lower", electron_density, temperature)
+        upper_derivatives = self.get_population_derivatives_at("upper", electron_density, temperature)
+        lower_derivatives = self.get_population_derivatives_at("lower", electron_density, temperature)
+        inversion_temperature_derivative = upper_derivatives[0] - lower_derivatives[0]
+        inversion_density_derivative = upper_derivatives[1] - lower_derivatives[1]
+
+        fractional_abundance = self.__get_abundances(temperature, electron_number, proton_number)
+        abundance_derivative = self.__get_abundance_derivative(temperature, electron_number, proton_number)
+        ion_density = electron_density / ionizations * fractional_abundance
+        doppler_fwhm = 0.6 * self.__get_doppler_width(ion_temperature, self.data["transition_energy"])
+        lorenz_fwhm = self.__get_lorenz_width(temperature, electron_density)
+        profile_function = 1 / (doppler_fwhm + lorenz_fwhm)
+        # d(1 / (D + L)) = -dL / (D + L)^2 with dL/dT = -L / 2T and dL/dne = 2L / ne
+        profile_temperature_derivative = np.power(profile_function, 2) * lorenz_fwhm / (2 * temperature)
+        profile_density_derivative = -np.power(profile_function, 2) * 2 * lorenz_fwhm / electron_density
+
+        gain_constant = self.__get_gain_constant(self.data["oscillator_strength"])
+        temperature_derivative = gain_constant * (
+                inversion_temperature_derivative * ion_density * profile_function +
+                relative_inversion * electron_density / ionizations * abundance_derivative * profile_function +
+                relative_inversion * ion_density * profile_temperature_derivative)
+        density_derivative = gain_constant * (
+                inversion_density_derivative * ion_density * profile_function +
+                relative_inversion * fractional_abundance / ionizations * profile_function +
+                relative_inversion * ion_density * profile_density_derivative)
+        return temperature_derivative, density_derivative
+
     __constants = {
         'c': 2.99792458e10,
         'h': 6.626068760e-27,
@@ -89,7 +420,22 @@ class GainCalculator:
     }
 
     def __get_abundance(self, t, e, z):
-        return FracAbund(z, t)[e]
+        # pfac is imported on first use only, loading a serialized table must not pay for it
+        crm = importlib.import_module("pfac.crm")
+        with instrumentation.stage("gain_calculator.abundance"):
+            return crm.FracAbund(z, t)[e]
+
+    def __get_abundances(self, temperature, e, z):
+        # FracAbund is a scalar pfac call, cells of a hydro timestep share few temperatures, so it runs once per
+        # unique temperature
+        temperature = np.asarray(temperature, dtype=float)
+        unique_temperatures, inverse = np.unique(temperature, return_inverse=True)
+        abundances = np.array([self.__get_abundance(t, e, z) for t in unique_temperatures], dtype=float)
+        return abundances[inverse].reshape(temperature.shape)
+
+    def __get_abundance_derivative(self, t, e, z):
+        step = 1e-3 * np.asarray(t, dtype=float)
+        return (self.__get_abundances(t + step, e, z) - self.__get_abundances(t - step, e, z)) / (2 * step)
 
     def __get_doppler_width(self, ion_temperature, transition_energy):
         nu = transition_energy * 1.6021773e-12 / self.__constants['h']
@@ -108,11 +454,13 @@ class GainCalculator:
             lorenz_fwhm,
             weighted_oscillator_strength
     ):
-        eps0 = 1.0 / (4.0 * np.pi)
         delta_n = relative_inversion * ion_density
 
         profile_function = 1 / (doppler_fwhm + lorenz_fwhm)
 
+        return self.__get_gain_constant(weighted_oscillator_strength) * delta_n * profile_function
+
+    def __get_gain_constant(self, weighted_oscillator_strength):
+        eps0 = 1.0 / (4.0 * np.pi)
         return np.power(self.__constants['e'], 2) / (
-                4.0 * self.__constants['c'] * eps0 * self.__constants[
-            'm_e']) * weighted_oscillator_strength * delta_n * profile_function
+                4.0 * self.__constants['c'] * eps0 * self.__constants['m_e']) * weighted_oscillator_strength
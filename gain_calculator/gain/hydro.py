@@ -0,0 +1,138 @@
+"""
+Module coupling the gain calculation to hydrodynamic simulation outputs stored in netCDF. The dataset is opened once
+and cell variables are read a few timesteps at a time, so gain histories of large runs are computed in constant
+memory. netCDF4 is needed only when this module is actually used.
+"""
+import numpy as np
+
+mass_unit = 1.6605e-24
+"""Atomic mass unit in g"""
+
+
+class HydroReader:
+    """
+    Reader of cell variables of a hydro simulation, the variables are expected to have dimensions (time, cell).
+    Use it as a context manager::
+
+        with HydroReader("variables.nc") as reader:
+            for timestep, cells in reader.iterate(["cell_temperature", "cell_density"]):
+                ...
+
+    :param str filename: path to the netCDF file
+    :param int chunk_size: number of timesteps read from the file at once
+    """
+
+    def __init__(self, filename, chunk_size=16):  # type: (str, int) -> None
+        from netCDF4 import Dataset
+
+        self.__dataset = Dataset(filename, "r")
+        self.chunk_size = chunk_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.__dataset.close()
+
+    def has_variable(self, name):  # type: (str) -> bool
+        return name in self.__dataset.variables
+
+    def get_timestep_count(self, variable="cell_temperature"):  # type: (str) -> int
+        return self.__dataset.variables[variable].shape[0]
+
+    def read(self, variable, timestep):  # type: (str, int) -> np.ndarray
+        """
+        Read a single timestep of a variable, e.g. read("cell_density", -1) for the final state
+        :return: ndarray of cell values
+        """
+        return np.asarray(self.__dataset.variables[variable][timestep])
+
+    def iterate(self, variables, start=0, stop=None):
+        """
+        Generator yielding cell variables timestep by timestep. Only chunk_size timesteps of the variables are held
+        in memory at once.
+
+        :param list variables: names of the variables to read
+        :param int start: first timestep
+        :param int stop: timestep to stop at, the last one by default
+        :return: generator of tuples (timestep, dict of ndarrays of cell values)
+        """
+        stop = self.get_timestep_count(variables[0]) if stop is None else stop
+        for chunk_start in range(start, stop, self.chunk_size):
+            chunk_stop = min(chunk_start + self.chunk_size, stop)
+            chunk = {name: np.asarray(self.__dataset.variables[name][chunk_start:chunk_stop]) for name in variables}
+            for offset in range(chunk_stop - chunk_start):
+                yield chunk_start + offset, {name: values[offset] for name, values in chunk.items()}
+
+
+def get_electron_densities(cells, nucleon_number=None):
+    """
+    Derive electron densities from cell mass density and ionization as the run scripts do,
+    :math:`n_e = Z \\rho / (A m_u)`.
+
+    :param dict cells: cell variables with **cell_density** (g cm^-3), **cell_ionization** and optionally
+        **cell_nucleonNumber**
+    :param float nucleon_number: nucleon number A used if the cells do not hold it
+    :return: ndarray of electron densities in cm^-3
+    """
+    if nucleon_number is None:
+        nucleon_number = cells["cell_nucleonNumber"]
+    return cells["cell_ionization"] * cells["cell_density"] / (nucleon_number * mass_unit)
+
+
+def write_gain_history(reader, calculator, filename, electron_number, proton_number, nucleon_number=None, log=None):
+    """
+    Evaluate gain at every timestep of a hydro simulation and write the gain(time, cell) dataset incrementally, one
+    timestep at a time. The cell positions are written alongside if the simulation provides them. Cell states that
+    are not stored in the calculator need linear interpolation, cells outside the stored states get NaN gain, see
+    :attr:`GainCalculator.interpolation`. Example::
+
+        calculator = GainCalculator("data/1D_Fe_data.npy", interpolation="linear")
+        with HydroReader("run/data/variables.nc") as reader:
+            write_gain_history(reader, calculator, "gain.nc", electron_number=10, proton_number=26)
+
+    :param HydroReader reader: the simulation output
+    :param GainCalculator calculator: calculator holding populations of the lasing transition
+    :param str filename: path of the netCDF file to create
+    :param int electron_number: electron count of the ion
+    :param int proton_number: proton count of the element
+    :param float nucleon_number: nucleon number, by default read from the simulation
+    :param func log: Function that get called each timestep with current timestep and timestep count
+    """
+    from netCDF4 import Dataset
+
+    variables = ["cell_density", "cell_ionization", "cell_temperature", "cell_ionTemperature"]
+    if nucleon_number is None:
+        variables.append("cell_nucleonNumber")
+    with_positions = reader.has_variable("cell_position")
+    if with_positions:
+        variables.append("cell_position")
+
+    timestep_count = reader.get_timestep_count()
+    output = Dataset(filename, "w")
+    try:
+        output.createDimension("time", None)
+        output.createDimension("cell", len(reader.read("cell_temperature", 0)))
+        gain = output.createVariable("gain", "f8", ("time", "cell"))
+        gain.units = "cm^-1"
+        positions = output.createVariable("cell_position", "f8", ("time", "cell")) if with_positions else None
+
+        for timestep, cells in reader.iterate(variables):
+            if log:
+                log(float(timestep), float(timestep_count))
+            gain[timestep, :] = calculator.get_gain(
+                get_electron_densities(cells, nucleon_number),
+                cells["cell_temperature"],
+                cells["cell_ionTemperature"],
+                cells["cell_ionization"],
+                electron_number,
+                proton_number
+            )
+            if positions is not None:
+                positions[timestep, :] = cells["cell_position"]
+            output.sync()
+    finally:
+        output.close()
@@ -0,0 +1,112 @@
+"""
+Module containing the spatial index of stored plasma states. Tables combined by zip, e.g. from the cells of a hydro
+run, are irregular clouds of (T, ne) points, so a lookup can neither use a grid nor expect an exact match. The index
+answers vectorized nearest neighbour and barycentric interpolation queries in the space of logarithms of the
+temperature and density, where the populations vary smoothly.
+"""
+import numpy as np
+from scipy import spatial
+
+exact_distance = 1e-9
+"""Distance in log10 space below which a query is considered to hit a stored state exactly"""
+
+
+class StateIndex:
+    """
+    KD-tree over stored states for nearest neighbour queries together with a Delaunay triangulation for linear
+    interpolation, the triangulation is built on first use::
+
+        index = StateIndex(table_temperatures, table_densities)
+        rows, weights = index.get_weights(cell_temperatures, cell_densities)
+        populations = (table_populations[rows] * weights).sum(axis=-1)
+
+    States outside the convex hull of the table, or all states if the table is degenerate (e.g. all its states lie
+    on a line), are not interpolated, they get NaN unless they hit a stored state exactly. Extrapolating by the
+    nearest stored state would hide that the table does not cover them, ask for the "nearest" method explicitly
+    for that.
+
+    :param temperatures: stored temperatures in eV
+    :param electron_densities: stored electron densities in cm^-3
+    """
+
+    def __init__(self, temperatures, electron_densities):
+        self.points = self.__to_points(temperatures, electron_densities)
+        self.tree = spatial.cKDTree(self.points)
+        self.__triangulation = None
+
+    def __len__(self):
+        return len(self.points)
+
+    @staticmethod
+    def __to_points(temperatures, electron_densities):
+        temperatures = np.asarray(temperatures, dtype=float)
+        electron_densities = np.asarray(electron_densities, dtype=float)
+        if np.any(temperatures <= 0) or np.any(electron_densities <= 0):
+            raise ValueError("Temperatures and electron densities must be positive")
+        return np.column_stack([np.log10(temperatures).ravel(), np.log10(electron_densities).ravel()])
+
+    def __get_triangulation(self):
+        if self.__triangulation is None:
+            try:
+                self.__triangulation = spatial.Delaunay(self.points)
+            except (spatial.qhull.QhullError, ValueError):
+                self.__triangulation = False  # degenerate table, nearest neighbours only
+        return self.__triangulation
+
+    def query(self, temperatures, electron_densities):
+        """
+        Find the nearest stored states
+        :param temperatures: temperatures in eV, a number or an array
+        :param electron_densities: electron densities in cm^-3 of the shape of temperatures
+        :return: tuple of integer ndarray of table rows and ndarray of distances in log10 space, both of the
+            broadcast shape of the inputs
+        """
+        temperatures, electron_densities = np.broadcast_arrays(temperatures, electron_densities)
+        distances, rows = self.tree.query(self.__to_points(temperatures, electron_densities))
+        return rows.reshape(temperatures.shape), distances.reshape(temperatures.shape)
+
+    def get_weights(self, temperatures, electron_densities):
+        """
+        Returns the stored states and barycentric weights interpolating linearly at given states
+        :param temperatures: temperatures in eV, a number or an array
+        :param electron_densities: electron densities in cm^-3 of the shape of temperatures
+        :return: tuple of integer ndarray of table rows and ndarray of weights, both of the broadcast shape of the
+            inputs extended by an axis of length 3, the weights of states that cannot be interpolated are NaN
+        """
+        temperatures, electron_densities = np.broadcast_arrays(temperatures, electron_densities)
+        points = self.__to_points(temperatures, electron_densities)
+        distances, nearest_rows = self.tree.query(points)
+        rows = np.repeat(nearest_rows[:, None], 3, axis=1)
+        weights = np.zeros(rows.shape)
+        weights[:, 0] = np.where(distances <= exact_distance, 1.0, np.nan)
+
+        triangulation = self.__get_triangulation()
+        if triangulation:
+            simplices = triangulation.find_simplex(points)
+            inside = simplices >= 0
+            transforms = triangulation.transform[simplices[inside]]
+            barycentric = np.einsum("ijk,ik->ij", transforms[:, :2], points[inside] - transforms[:, 2])
+            rows[inside] = triangulation.simplices[simplices[inside]]
+            weights[inside] = np.column_stack([barycentric, 1.0 - barycentric.sum(axis=1)])
+        return rows.reshape(temperatures.shape + (3,)), weights.reshape(temperatures.shape + (3,))
+
+    def interpolate(self, values, temperatures, electron_densities, method="linear"):
+        """
+        Interpolate stored values at given states
+        :param ndarray values: values at the stored states, one per table row
+        :param temperatures: temperatures in eV, a number or an array
+        :param electron_densities: electron densities in cm^-3 of the shape of temperatures
+        :param str method: "linear" for barycentric interpolation (NaN outside the table), "nearest" for the nearest
+            stored state and "exact" to raise if a state is not stored
+        :return: ndarray of interpolated values of the broadcast shape of the inputs
+        """
+        values = np.asarray(values)
+        if method == "linear":
+            rows, weights = self.get_weights(temperatures, electron_densities)
+            return (values[rows] * weights).sum(axis=-1)
+
+        assert method in ["nearest", "exact"], "Unknown interpolation method {}".format(method)
+        rows, distances = self.query(temperatures, electron_densities)
+        if method == "exact" and np.any(distances > exact_distance):
+            raise IndexError("{} states are not in the table".format(np.count_nonzero(distances > exact_distance)))
+        return values[rows]
@@ -0,0 +1,211 @@
+"""
+Module searching plasma conditions that maximize the gain of a transition. Instead of evaluating a dense product grid
+of temperatures and densities the search follows the gain derivatives, so only tens of population solves are needed.
+"""
+import itertools
+
+import numpy as np
+
+from gain_calculator.gain.calculate import GainCalculator
+
+
+class OptimizationResult:
+    """
+    Result of :meth:`GainOptimizer.optimize`.
+
+    :ivar float temperature: electron temperature of the maximal gain in eV
+    :ivar float electron_density: electron density of the maximal gain in cm^-3
+    :ivar float gain: the maximal gain coefficient in cm^-1
+    :ivar int solves: number of population solves used
+    :ivar GainCalculator calculator: calculator holding populations and sensitivities of all solved points
+    :ivar ndarray contour_temperatures: temperatures of the meshgrid around the optimum
+    :ivar ndarray contour_densities: electron densities of the meshgrid around the optimum
+    :ivar ndarray contour_gains: gains on the meshgrid estimated by a local quadratic surrogate
+    """
+
+    def __init__(self, temperature, electron_density, gain, solves, calculator, contour_temperatures,
+                 contour_densities, contour_gains):
+        self.temperature = temperature
+        self.electron_density = electron_density
+        self.gain = gain
+        self.solves = solves
+        self.calculator = calculator
+        self.contour_temperatures = contour_temperatures
+        self.contour_densities = contour_densities
+        self.contour_gains = contour_gains
+
+    def __repr__(self):
+        return "max gain {:.4g} cm^-1 at T = {:.4g} eV, ne = {:.4g} cm^-3 ({} solves)".format(
+            self.gain, self.temperature, self.electron_density, self.solves)
+
+
+class GainOptimizer:
+    """
+    Finds the electron temperature and density of maximal gain of a transition within given bounds. Use it like
+    this::
+
+        optimizer = GainOptimizer(
+            transition=transition,
+            temperature_bounds=(100, 850),  # eV
+            density_bounds=(1e19, 1e23),  # cm^-3
+            ionization=25,
+            electron_number=10,
+            proton_number=26
+        )
+        result = optimizer.optimize()
+        plt.contourf(result.contour_temperatures, result.contour_densities, result.contour_gains)
+
+    The search runs in logarithmic coordinates scaled to the unit square. A coarse 3x3 design is followed by a
+    trust region ascent along the gain gradient, every step costs a single population solve with sensitivities
+    (see :meth:`GainCalculator.get_gain_derivatives`). The gain contours around the optimum come from a quadratic
+    surrogate fitted to the values and gradients of the solved points, so they cost no additional solves.
+
+    :param Transition transition: the lasing transition
+    :param tuple temperature_bounds: minimal and maximal electron temperature in eV
+    :param tuple density_bounds: minimal and maximal electron density in cm^-3
+    :param ionization: mean ionization, either a number or a function of (temperature, electron_density)
+    :param int electron_number: electron count of the ion
+    :param int proton_number: proton count of the element
+    :param ion_temperature: ion temperature in eV, either a number or a function of (temperature,
+        electron_density), equal to the electron temperature by default
+    :param int max_solves: maximal number of population solves
+    :param float tolerance: the search stops when the trust region shrinks below this size in scaled coordinates
+    """
+
+    def __init__(self, transition, temperature_bounds, density_bounds, ionization, electron_number, proton_number,
+                 ion_temperature=None, max_solves=30, tolerance=1e-3):
+        self.transition = transition
+        self.__log_lower = np.log([temperature_bounds[0], density_bounds[0]])
+        self.__log_span = np.log([temperature_bounds[1], density_bounds[1]]) - self.__log_lower
+        self.ionization = ionization
+        self.electron_number = electron_number
+        self.proton_number = proton_number
+        self.ion_temperature = ion_temperature if ion_temperature is not None else lambda temperature, _: temperature
+        self.max_solves = max_solves
+        self.tolerance = tolerance
+
+        self.calculator = GainCalculator()
+        self.__evaluated = {}
+
+    def __to_state(self, point):
+        temperature, electron_density = np.exp(self.__log_lower + self.__log_span * np.asarray(point))
+        return float(temperature), float(electron_density)
+
+    @staticmethod
+    def __value_of(parameter, temperature, electron_density):
+        return parameter(temperature, electron_density) if callable(parameter) else parameter
+
+    def __get_gain(self, temperature, electron_density, variation=(1.0, 1.0)):
+        # Gain at a solved point with optionally varied state of the ion temperature and ionization functions
+        varied_temperature, varied_density = temperature * variation[0], electron_density * variation[1]
+        return float(self.calculator.get_gain(
+            electron_density,
+            temperature,
+            self.__value_of(self.ion_temperature, varied_temperature, varied_density),
+            self.__value_of(self.ionization, varied_temperature, varied_density),
+            self.electron_number,
+            self.proton_number
+        ))
+
+    def __evaluate(self, point):
+        point = tuple(np.round(np.clip(point, 0.0, 1.0), 12))
+        if point in self.__evaluated:
+            return self.__evaluated[point]
+
+        temperature, electron_density = self.__to_state(point)
+        self.calculator.extend_by_calculation(self.transition, [temperature], [electron_density], sensitivities=True)
+
+        gain = self.__get_gain(temperature, electron_density)
+        d_temperature, d_density = self.calculator.get_gain_derivatives(
+            electron_density,
+            temperature,
+            self.__value_of(self.ion_temperature, temperature, electron_density),
+            self.__value_of(self.ionization, temperature, electron_density),
+            self.electron_number,
+            self.proton_number
+        )
+        # Dependence through ion temperature and ionization needs no solve, populations stay fixed
+        step = 1e-4
+        d_temperature += (self.__get_gain(temperature, electron_density, (1 + step, 1)) -
+                          self.__get_gain(temperature, electron_density, (1 - step, 1))) / (2 * step * temperature)
+        d_density += (self.__get_gain(temperature, electron_density, (1, 1 + step)) -
+                      self.__get_gain(temperature, electron_density, (1, 1 - step))) / (2 * step * electron_density)
+
+        # Chain rule to the scaled logarithmic coordinates
+        gradient = np.array([d_temperature * temperature, d_density * electron_density]) * self.__log_span
+        self.__evaluated[point] = (gain, gradient)
+        return gain, gradient
+
+    def __get_solves(self):
+        return len(self.__evaluated)
+
+    def __fit_surrogate(self, center, width):
+        rows, values, weights = [], [], []
+        for point, (gain, gradient) in self.__evaluated.items():
+            x, y = np.asarray(point) - center
+            weight = np.exp(-(x * x + y * y) / (width * width))
+            rows.extend([[1, x, y, x * x, x * y, y * y], [0, 1, 0, 2 * x, y, 0], [0, 0, 1, 0, x, 2 * y]])
+            values.extend([gain, gradient[0], gradient[1]])
+            weights.extend([weight] * 3)
+        weights = np.sqrt(weights)
+        coefficients = np.linalg.lstsq(np.asarray(rows) * weights[:, None], np.asarray(values) * weights,
+                                       rcond=None)[0]
+
+        def __surrogate(x, y):
+            return np.tensordot(coefficients, [np.ones_like(x), x, y, x * x, x * y, y * y], axes=1)
+
+        return __surrogate
+
+    def optimize(self, contour_width=0.15, contour_size=21):
+        """
+        Run the search.
+
+        :param float contour_width: half width of the contour window around the optimum in scaled coordinates,
+            0.15 means 15 % of the logarithmic range of the bounds in each direction
+        :param int contour_size: number of contour points in each direction
+        :return: OptimizationResult instance
+        """
+        for point in itertools.product([0.15, 0.5, 0.85], repeat=2):
+            if self.__get_solves() >= self.max_solves:
+                break
+            self.__evaluate(point)
+
+        best = max(self.__evaluated, key=lambda point: self.__evaluated[point][0])
+        radius = 0.2
+        while self.__get_solves() < self.max_solves and radius > self.tolerance:
+            gain, gradient = self.__evaluated[best]
+            # Directions pointing out of the bounds are blocked
+            blocked = ((np.asarray(best) <= 0.0) & (gradient < 0)) | ((np.asarray(best) >= 1.0) & (gradient > 0))
+            gradient = np.where(blocked, 0.0, gradient)
+            norm = np.linalg.norm(gradient)
+            if norm == 0:
+                break
+            candidate = tuple(np.round(np.clip(np.asarray(best) + radius * gradient / norm, 0.0, 1.0), 12))
+            if candidate in self.__evaluated:
+                radius *= 0.5
+                continue
+            if self.__evaluate(candidate)[0] > gain:
+                best = candidate
+                radius = min(2 * radius, 0.5)
+            else:
+                radius *= 0.5
+
+        surrogate = self.__fit_surrogate(np.asarray(best), 2 * contour_width)
+        axis_x = np.linspace(max(best[0] - contour_width, 0.0), min(best[0] + contour_width, 1.0), contour_size)
+        axis_y = np.linspace(max(best[1] - contour_width, 0.0), min(best[1] + contour_width, 1.0), contour_size)
+        grid_x, grid_y = np.meshgrid(axis_x, axis_y)
+        contour_temperatures, contour_densities = np.exp(
+            self.__log_lower[:, None, None] + self.__log_span[:, None, None] * np.array([grid_x, grid_y]))
+
+        temperature, electron_density = self.__to_state(best)
+        return OptimizationResult(
+            temperature=temperature,
+            electron_density=electron_density,
+            gain=self.__evaluated[best][0],
+            solves=self.__get_solves(),
+            calculator=self.calculator,
+            contour_temperatures=contour_temperatures,
+            contour_densities=contour_densities,
+            contour_gains=surrogate(grid_x - best[0], grid_y - best[1])
+        )
+
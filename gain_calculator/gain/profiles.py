@@ -0,0 +1,83 @@
+"""
+Module containing line profiles of the spectral gain. The Voigt profile is evaluated by the rational approximation of
+the Faddeeva function of Humlicek (J. Quant. Spectrosc. Radiat. Transfer 27, 437, 1982), its relative error is below
+1e-4 and every region of the complex plane costs a handful of array operations, so whole cubes of cells, frequencies
+and transitions are evaluated at once::
+
+    frequencies = np.linspace(centre - 5 * width, centre + 5 * width, 400)
+    cube = get_gain_cube([calculator_326, calculator_345], frequencies, densities, temperatures, ion_temperatures,
+                         ionizations, electron_number=10, proton_number=26)
+    cube.shape  # (cells, frequencies, transitions)
+"""
+import numpy as np
+
+__sqrt_ln2 = np.sqrt(np.log(2))
+
+
+def faddeeva(x, y):
+    """
+    Returns the Faddeeva function :math:`w(x + iy)` in the upper half plane by the W4 algorithm of Humlicek
+    :param ndarray x: real parts
+    :param ndarray y: non-negative imaginary parts broadcastable to x
+    :return: complex ndarray of the broadcast shape
+    """
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    t = y - 1j * x
+    s = np.abs(x) + y
+    w = np.empty(t.shape, dtype=complex)
+
+    region = s >= 15.0
+    w[region] = t[region] * 0.5641896 / (0.5 + t[region] ** 2)
+
+    region = (s < 15.0) & (s >= 5.5)
+    u = t[region] ** 2
+    w[region] = t[region] * (1.410474 + u * 0.5641896) / (0.75 + u * (3.0 + u))
+
+    region = (s < 5.5) & (y >= 0.195 * np.abs(x) - 0.176)
+    r = t[region]
+    w[region] = (16.4955 + r * (20.20933 + r * (11.96482 + r * (3.778987 + r * 0.5642236)))) / (
+            16.4955 + r * (38.82363 + r * (39.27121 + r * (21.69274 + r * (6.699398 + r)))))
+
+    region = (s < 5.5) & (y < 0.195 * np.abs(x) - 0.176)
+    r = t[region]
+    u = r ** 2
+    w[region] = np.exp(u) - r * (
+            36183.31 - u * (3321.9905 - u * (1540.787 - u * (219.0313 - u * (35.76683 - u * (1.320522 - u * 0.56419)))))
+    ) / (32066.6 - u * (24322.84 - u * (9022.228 - u * (2186.181 - u * (364.2191 - u * (61.57037 - u * (
+            1.841439 - u)))))))
+    return w
+
+
+def voigt(frequency_offsets, doppler_fwhm, lorentz_fwhm):
+    """
+    Returns the area normalized Voigt profile, the convolution of a Gaussian and a Lorentzian profile. The
+    parameters are broadcast together.
+    :param frequency_offsets: offsets from the line centre in Hz
+    :param doppler_fwhm: full width at half maximum of the Gaussian in Hz, must be positive
+    :param lorentz_fwhm: full width at half maximum of the Lorentzian in Hz
+    :return: ndarray of the profile in Hz^-1
+    """
+    doppler_fwhm = np.asarray(doppler_fwhm, dtype=float)
+    assert np.all(doppler_fwhm > 0), "The Doppler width must be positive"
+    # 1/e half width of the Gaussian
+    doppler_width = doppler_fwhm / (2 * __sqrt_ln2)
+    w = faddeeva(np.asarray(frequency_offsets) / doppler_width, 0.5 * np.asarray(lorentz_fwhm) / doppler_width)
+    return w.real / (np.sqrt(np.pi) * doppler_width)
+
+
+def get_gain_cube(calculators, frequencies, electron_density, temperature, ion_temperature, ionizations,
+                  electron_number, proton_number):
+    """
+    Returns the spectral gain of several transitions, e.g. the lines of a multiplet, on a common frequency grid.
+    The profiles of all transitions are evaluated in a single vectorized call, see
+    :meth:`GainCalculator.get_gain_spectrum` for the parameters.
+    :param list calculators: GainCalculator instances, one per transition
+    :return: ndarray of gain coefficients in cm^-1 of shape electron_density.shape + (frequencies, transitions)
+    """
+    lines = [calculator.get_line_parameters(electron_density, temperature, ion_temperature, ionizations,
+                                            electron_number, proton_number) for calculator in calculators]
+    parameters = {name: np.stack([np.broadcast_to(line[name], np.shape(lines[0]["strength"])) for line in lines],
+                                 axis=-1)[..., None, :] for name in lines[0]}
+    frequencies = np.asarray(frequencies, dtype=float)[:, None]
+    return parameters["strength"] * voigt(frequencies - parameters["centre"], parameters["doppler_fwhm"],
+                                          parameters["lorentz_fwhm"])
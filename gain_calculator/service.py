@@ -0,0 +1,283 @@
+"""
+Module containing a long running local service keeping atomic models, parsed tables, warm workers and results
+resident between scripts. Starting the executor, generating the atomic data and parsing it is paid once by the
+service, the scripts and notebooks only send the queries over a local socket. Start the service::
+
+    python -m gain_calculator.service --executor process
+
+and query it through proxies mirroring :class:`Atom`, :class:`Transition` and :class:`GainCalculator`::
+
+    from gain_calculator import service
+
+    client = service.Client()
+    atom = client.atom("Fe", gc.ConfigGroups(base="1*2 2*8", max_n=6), "./atomic_data")
+    transition = client.transition(atom, lower, upper)
+    result = transition.get_populations([900.0], [1e20])
+
+    calculator = client.gain_calculator("data/1D_Fe_data.npy")
+    calculator.get_population_at("upper", densities, temperatures)
+
+Repeated queries are answered from the result cache of the service. Progress callbacks (the log parameters) are not
+forwarded. The socket is a Unix socket of the user by default, connections are authenticated by the key given by the
+GAIN_CALCULATOR_AUTHKEY environment variable.
+"""
+import argparse
+import collections
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from multiprocessing import connection
+
+from gain_calculator.core import executors
+from gain_calculator.core.classes import Atom
+from gain_calculator.core.classes import ConfigGroups
+from gain_calculator.core.classes import Transition
+from gain_calculator.gain.calculate import GainCalculator
+
+default_address = os.path.join(tempfile.gettempdir(), "gain_calculator-{}.sock".format(os.getuid()))
+"""Path of the Unix socket of the service"""
+
+default_authkey = os.environ.get("GAIN_CALCULATOR_AUTHKEY", "gain_calculator").encode()
+"""Key authenticating the connections"""
+
+exposed_methods = {
+    "atom": {"get_populations", "get_level_populations", "get_combined_populations", "get_sensitivities",
+             "get_bundled_populations", "get_transient_populations", "select_levels", "find_transitions",
+             "get_transitions_table"},
+    "transition": {"get_populations", "get_sensitivities", "get_transient_populations"},
+    "gain_calculator": {"get_gain", "get_gain_from_populations", "get_gain_derivatives", "get_population_at",
+                        "get_population_derivatives_at", "get_temperatures", "get_densities"}
+}
+"""Methods callable through the proxies by the kind of the served object"""
+
+executor_methods = {("atom", "get_populations"), ("atom", "get_level_populations"),
+                    ("atom", "get_combined_populations"), ("transition", "get_populations")}
+"""Methods run by the executor of the service whatever executor the query asks for"""
+
+
+class Service:
+    """
+    Service answering the queries of :class:`Client` connections, every connection is served by its own thread
+    while the objects, the executor and the results are shared.
+
+    :param str address: path of the Unix socket
+    :param bytes authkey: key authenticating the connections
+    :param executor: executor instance or name used for the population calculations
+    :param int max_cached_results: number of the most recent results kept
+    :ivar int cache_hits: number of queries answered from the result cache
+    """
+
+    def __init__(self, address=default_address, authkey=default_authkey, executor="process", max_cached_results=1000):
+        self.address = address
+        self.authkey = authkey
+        self.executor = executors.get_executor(executor)
+        self.max_cached_results = max_cached_results
+        self.cache_hits = 0
+        self.__objects = {}
+        self.__results = collections.OrderedDict()
+        self.__lock = threading.Lock()
+        self.__listener = None
+        self.__running = False
+
+    def __create_object(self, kind, spec):
+        if kind == "atom":
+            symbol, base, max_n, data_folder = spec
+            return Atom(symbol, ConfigGroups(base, max_n), data_folder)
+        if kind == "transition":
+            atom_spec, lower, upper = spec
+            return Transition(self.__get_object("atom", atom_spec), lower, upper)
+        return GainCalculator(spec)
+
+    def __get_object(self, kind, spec):
+        # Objects are created once, they keep their generated files, tables and rate models
+        key = (kind, spec)
+        with self.__lock:
+            if key in self.__objects:
+                return self.__objects[key]
+        instance = self.__create_object(kind, spec)
+        with self.__lock:
+            return self.__objects.setdefault(key, instance)
+
+    def call(self, kind, spec, method, args, kwargs):
+        """
+        Call a method of a served object, the result is cached by the whole query
+        :param str kind: "atom", "transition" or "gain_calculator"
+        :param tuple spec: specification of the object as sent by the proxies
+        :param str method: name of the method, one of :data:`exposed_methods`
+        :param tuple args: positional arguments
+        :param dict kwargs: keyword arguments
+        :return: the result of the method
+        """
+        assert method in exposed_methods.get(kind, ()), "Method {} of {} is not exposed".format(method, kind)
+        key = pickle.dumps((kind, spec, method, args, sorted(kwargs.items(), key=lambda item: item[0])), protocol=2)
+        if (kind, method) in executor_methods:
+            kwargs = dict(kwargs, executor=self.executor)
+        with self.__lock:
+            if key in self.__results:
+                self.cache_hits += 1
+                return self.__results[key]
+
+        result = getattr(self.__get_object(kind, spec), method)(*args, **kwargs)
+        with self.__lock:
+            self.__results[key] = result
+            while len(self.__results) > self.max_cached_results:
+                self.__results.popitem(last=False)
+        return result
+
+    def describe(self, kind, spec):
+        """
+        Returns the attributes the proxies mirror, i.e. the transition energy and oscillator strength
+        """
+        instance = self.__get_object(kind, spec)
+        if kind == "transition":
+            return {"weighted_oscillator_strength": instance.weighted_oscillator_strength, "energy": instance.energy}
+        return {}
+
+    def __serve_connection(self, client):
+        try:
+            while True:
+                try:
+                    request = client.recv()
+                except EOFError:
+                    return
+                operation, arguments = request
+                try:
+                    if operation == "shutdown":
+                        self.shutdown()
+                        client.send(("ok", None))
+                        return
+                    assert operation in ["call", "describe"], "Unknown operation {}".format(operation)
+                    response = ("ok", getattr(self, operation)(*arguments))
+                except Exception as error:
+                    logging.getLogger(__name__).exception("Query %s failed", operation)
+                    response = ("error", error)
+                client.send(response)
+        finally:
+            client.close()
+
+    def serve_forever(self):
+        """
+        Accept connections until :meth:`shutdown` is called or a client sends the shutdown request
+        """
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        self.__listener = connection.Listener(self.address, "AF_UNIX", authkey=self.authkey)
+        os.chmod(self.address, 0o600)
+        self.__running = True
+        try:
+            while self.__running:
+                try:
+                    client = self.__listener.accept()
+                except (IOError, OSError, EOFError, connection.AuthenticationError):
+                    continue
+                thread = threading.Thread(target=self.__serve_connection, args=(client,))
+                thread.daemon = True
+                thread.start()
+        finally:
+            # Removes the socket file too
+            self.__listener.close()
+
+    def shutdown(self):
+        """
+        Stop accepting connections, the pending :meth:`serve_forever` returns
+        """
+        self.__running = False
+        # Wake the accepting thread up by a connection of our own
+        try:
+            connection.Client(self.address, "AF_UNIX", authkey=self.authkey).close()
+        except (IOError, OSError, EOFError):
+            pass
+
+
+class Proxy(object):
+    """
+    Object mirroring an object served by the service, calls of the exposed methods are sent to the service
+    """
+
+    def __init__(self, client, kind, spec):
+        self._client = client
+        self._kind = kind
+        self._spec = spec
+        for name, value in client.request("describe", kind, spec).items():
+            setattr(self, name, value)
+
+    def __getattr__(self, name):
+        if name not in exposed_methods[self._kind]:
+            raise AttributeError(name)
+
+        def __call(*args, **kwargs):
+            kwargs.pop("log", None)
+            return self._client.request("call", self._kind, self._spec, name, args, kwargs)
+
+        return __call
+
+
+class Client:
+    """
+    Connection to a running :class:`Service`
+
+    :param str address: path of the Unix socket
+    :param bytes authkey: key authenticating the connection
+    """
+
+    def __init__(self, address=default_address, authkey=default_authkey):
+        self.__connection = connection.Client(address, "AF_UNIX", authkey=authkey)
+        self.__lock = threading.Lock()
+
+    def request(self, operation, *arguments):
+        """
+        Send a single request and wait for its response, exceptions raised by the service are reraised
+        """
+        with self.__lock:
+            self.__connection.send((operation, arguments))
+            status, value = self.__connection.recv()
+        if status == "error":
+            raise value
+        return value
+
+    def atom(self, symbol, config_groups, data_folder):  # type: (str, ConfigGroups, str) -> Proxy
+        """
+        Returns proxy of :class:`Atom`, the parameters are the same
+        """
+        return Proxy(self, "atom", (symbol, config_groups.base_group.config, config_groups.get_max_n(),
+                                    os.path.abspath(data_folder)))
+
+    def transition(self, atom, lower, upper):  # type: (Proxy, EnergyLevel, EnergyLevel) -> Proxy
+        """
+        Returns proxy of :class:`Transition` of an atom proxy, the parameters are the same
+        """
+        return Proxy(self, "transition", (atom._spec, lower, upper))
+
+    def gain_calculator(self, filename):  # type: (str) -> Proxy
+        """
+        Returns proxy of :class:`GainCalculator` loaded from a serialized table
+        """
+        return Proxy(self, "gain_calculator", os.path.abspath(filename))
+
+    def shutdown_service(self):
+        """
+        Stop the service
+        """
+        self.request("shutdown")
+
+    def close(self):
+        self.__connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the gain_calculator population service")
+    parser.add_argument("--address", default=default_address, help="path of the Unix socket")
+    parser.add_argument("--executor", default="process", choices=sorted(executors.executor_types),
+                        help="backend of the population calculations")
+    parser.add_argument("--max-cached-results", type=int, default=1000, help="number of results kept")
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    Service(arguments.address, executor=arguments.executor,
+            max_cached_results=arguments.max_cached_results).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
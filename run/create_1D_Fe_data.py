@@ -21,8 +21,13 @@ def create_data(filename, densities, temperatures):
         temperatures,
         densities,
         combine=zip,
+        tolerance=1e-3,
         log=lambda current, total: gc.print_progress(current, total, "Generating populations:")
     )
+    quantization = calculator.data["quantization"]
+    print "\nSolved {:.1f}x fewer states, max state error T {:.1e}, ne {:.1e}, max gain error {:.1e}".format(
+        quantization["compression_ratio"], quantization["max_temperature_error"], quantization["max_density_error"],
+        quantization["max_gain_error"])
     calculator.serialize(filename)
 
 
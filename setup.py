@@ -21,7 +21,13 @@ setuptools.setup(
     python_requires='>=2.7',
     install_requires=[
         "numpy",
+        "scipy",
         "ray",
+        "futures; python_version < '3'",
+        "trollius; python_version < '3'",
         "typing"
-    ]
+    ],
+    extras_require={
+        "hydro": ["netCDF4"]
+    }
 )
@@ -0,0 +1,96 @@
+import gc
+import itertools
+import threading
+import unittest
+import numpy as np
+from concurrent import futures
+from gain_calculator.core import aio
+from gain_calculator.core import executors
+
+
+def calculate_populations(indices, temperature, electron_density, event):
+    event.wait(5)
+    return np.asarray(indices) * temperature * electron_density
+
+
+class ThreadExecutor:
+    def __init__(self, max_workers):
+        self.pool = futures.ThreadPoolExecutor(max_workers)
+
+    def get_window_size(self):
+        return 2
+
+    def submit(self, function, *args):
+        return self.pool.submit(function, *args)
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+
+class FakeAtom:
+    def __init__(self):
+        self.event = threading.Event()
+        self.event.set()
+
+    def get_population_task(self, indices, temperature, electron_density, population_total=1.0, solver="default",
+                            reference_solver=None):
+        return calculate_populations, (indices, temperature, electron_density, self.event)
+
+
+class TestAio(unittest.TestCase):
+    def setUp(self):
+        self.loop = aio.asyncio.new_event_loop()
+        self.executor = ThreadExecutor(max_workers=4)
+        self.atom = FakeAtom()
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self.loop.close()
+
+    def test_get_level_populations(self):
+        future = aio.get_level_populations(self.atom, [1, 2], [1.0, 2.0], [10.0, 20.0], zip, executor=self.executor,
+                                           loop=self.loop)
+        result = self.loop.run_until_complete(future)
+        np.testing.assert_allclose(result["population"], [[10.0, 20.0], [40.0, 80.0]])
+        np.testing.assert_allclose(result["temperature"], [1.0, 2.0])
+
+    def test_window_is_shared(self):
+        self.atom.event.clear()
+        aio.submit_level_populations(self.atom, [1], [1.0, 2.0, 3.0], [1.0], itertools.product,
+                                     executor=self.executor, loop=self.loop)
+        window = aio.get_window(self.executor, self.loop)
+        aio.submit_level_populations(self.atom, [1], [1.0], [1.0], zip, executor=self.executor, loop=self.loop)
+        self.assertEqual(2, window.running)
+        self.atom.event.set()
+
+    def test_window_released_with_loop(self):
+        windows = getattr(aio, "__windows")
+        count = len(windows)
+        loop = aio.asyncio.new_event_loop()
+        aio.get_window(self.executor, loop)
+        self.assertEqual(count + 1, len(windows))
+        loop.close()
+        del loop
+        gc.collect()
+        self.assertEqual(count, len(windows))
+
+    def test_serial_executor_refused(self):
+        self.assertRaises(AssertionError, aio.get_window, executors.SerialExecutor(), self.loop)
+
+    def test_cancel(self):
+        self.atom.event.clear()
+        future = aio.get_level_populations(self.atom, [1], np.arange(10.0), [1.0], itertools.product,
+                                           executor=self.executor, loop=self.loop)
+        window = aio.get_window(self.executor, self.loop)
+        self.assertEqual(8, len(window))
+        future.cancel()
+        self.atom.event.set()
+        self.loop.call_later(0.2, self.loop.stop)
+        self.loop.run_forever()
+        self.assertTrue(future.cancelled())
+        self.assertEqual(0, window.running)
+        self.assertEqual(0, len(window))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
 import os
 import unittest
+import numpy as np
 import gain_calculator.core as core
+from gain_calculator.core import fac_wrapper
+from gain_calculator.core.classes import structurize_populations
 import copy
 
 
@@ -106,6 +109,56 @@ class TestTransition(unittest.TestCase):
         self.assertAlmostEqual(expected['lower'], populations['lower']["population"][0], places=4)
         self.assertAlmostEqual(expected['upper'], populations['upper']["population"][0], places=4)
 
+    def test_get_population_convergence(self):
+        populations = self.transition.get_populations(
+            temperatures=900,
+            electron_densities=1e20,
+            solver="fast",
+            reference_solver="default"
+        )
+        self.assertLess(populations["upper"]["convergence_error"][0], 1e-2)
+
+
+class FakeAtom:
+    # The tables of the generated Ge atom, populations are FAC indices times temperature
+    folder = os.path.join(os.path.abspath(os.path.dirname(__file__)), "atomic_data", "Ge 1*2 2*8 up to n=3")
+
+    def __init__(self):
+        self.calls = []
+
+    def get_level_table(self):
+        return core.LevelTable.from_file(os.path.join(self.folder, "levels.txt"))
+
+    def find_transitions(self, lower_indices, upper_indices):
+        transitions = fac_wrapper.read_transitions_table(os.path.join(self.folder, "transitions.txt"))
+        return transitions[np.in1d(transitions["lower"], lower_indices) & np.in1d(transitions["upper"], upper_indices)]
+
+    def get_level_populations(self, indices, temperatures, electron_densities, combine, population_total=1.0,
+                              log=None, executor=None, solver="default", reference_solver=None):
+        self.calls.append(list(indices))
+        pairs = list(combine(np.atleast_1d(temperatures), np.atleast_1d(electron_densities)))
+        populations = np.array([[index * pair[0] for index in indices] for pair in pairs], dtype=float)
+        convergence_errors = None if reference_solver is None else np.full(len(pairs), 1e-5)
+        return structurize_populations(pairs, populations, convergence_errors)
+
+
+class TestTransitionPopulations(unittest.TestCase):
+    def test_single_calculation(self):
+        atom = FakeAtom()
+        transition = core.Transition(
+            atom=atom,
+            lower=core.EnergyLevel("1s+2(0)0 2s+2(0)0 2p-1(1)1 2p+4(1)1 3s+1(1)2"),
+            upper=core.EnergyLevel("1s+2(0)0 2s+2(0)0 2p-1(1)1 2p+4(6)1 3p+1(3)4"),
+        )
+        populations = transition.get_populations([100.0, 200.0], [1e20], reference_solver="default")
+        self.assertEqual(1, len(atom.calls))
+        lower_index, upper_index = atom.calls[0]
+        np.testing.assert_allclose(populations["lower"]["population"],
+                                   np.array([100.0, 200.0]) * lower_index / transition.lower.degeneracy)
+        np.testing.assert_allclose(populations["upper"]["population"],
+                                   np.array([100.0, 200.0]) * upper_index / transition.upper.degeneracy)
+        np.testing.assert_allclose(populations["upper"]["convergence_error"], 1e-5)
+
 
 class TestEnergyLevel(unittest.TestCase):
     def setUp(self):
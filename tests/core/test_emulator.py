@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import gain_calculator.core as core
+
+
+class TestPopulationEmulator(unittest.TestCase):
+    def setUp(self):
+        folder = os.path.join(os.path.abspath(os.path.dirname(__file__)), "atomic_data", "Ge 1*2 2*8 up to n=3")
+        self.model = core.RateModel(
+            levels=core.LevelTable.from_file(os.path.join(folder, "levels.txt")),
+            transitions=core.fac_wrapper.read_transitions_table(os.path.join(folder, "transitions.txt")),
+            excitations=core.rates.read_excitation_table(os.path.join(folder, "excitation.txt"))
+        )
+        self.rows = self.model.levels.get_rows([1, 4, 13])
+        self.emulator = core.PopulationEmulator.fit(
+            solve=self.__solve,
+            indices=[1, 4, 13],
+            temperature_bounds=(300.0, 1500.0),
+            density_bounds=(1e19, 1e21),
+            tolerance=1e-3
+        )
+
+    def tearDown(self):
+        del self.emulator
+
+    def __solve(self, temperatures, densities):
+        return np.array([self.model.get_populations(temperature, density)[self.rows]
+                         for temperature, density in zip(temperatures, densities)])
+
+    def test_error_bound(self):
+        temperatures = np.array([350.0, 777.0, 1400.0])
+        densities = np.array([2e19, 3.3e20, 9e20])
+        np.testing.assert_allclose(self.emulator.evaluate(temperatures, densities),
+                                   self.__solve(temperatures, densities), rtol=self.emulator.get_error_bound() * 2)
+        self.assertLessEqual(self.emulator.get_error_bound(), 1e-3)
+
+    def test_shape(self):
+        self.assertSequenceEqual((4, 5, 3), self.emulator.evaluate(np.full((4, 5), 900.0), 1e20).shape)
+
+    def test_save_load(self):
+        folder = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(folder, "emulator.npz")
+            self.emulator.save(filename)
+            loaded = core.PopulationEmulator.load(filename)
+            np.testing.assert_allclose(self.emulator.evaluate(900.0, 1e20), loaded.evaluate(900.0, 1e20))
+        finally:
+            shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import operator
+import unittest
+from gain_calculator.core import executors
+
+
+class TestExecutors(unittest.TestCase):
+    def test_serial_executor(self):
+        future = executors.SerialExecutor().submit(operator.mul, 3, 4)
+        self.assertTrue(future.done())
+        self.assertEqual(12, future.result())
+
+    def test_serial_executor_exception(self):
+        future = executors.SerialExecutor().submit(operator.truediv, 1, 0)
+        self.assertRaises(ZeroDivisionError, future.result)
+
+    def test_process_pool_executor(self):
+        executor = executors.ProcessPoolExecutor(max_workers=2)
+        try:
+            results = [executor.submit(operator.mul, i, i).result() for i in range(4)]
+        finally:
+            executor.shutdown()
+        self.assertEqual([0, 1, 4, 9], results)
+
+    def test_get_executor(self):
+        self.assertIs(executors.get_executor("serial"), executors.get_executor("serial"))
+        self.assertIs(executors.get_executor("serial"), executors.get_executor(u"serial"))
+        executor = executors.SerialExecutor()
+        self.assertIs(executor, executors.get_executor(executor))
+        self.assertRaises(AssertionError, executors.get_executor, "unknown")
+
+    def test_window_size(self):
+        self.assertEqual(8, executors.get_window_size(4, memory_budget=1e6, task_memory=100))
+        self.assertEqual(3, executors.get_window_size(4, memory_budget=350, task_memory=100))
+        self.assertEqual(1, executors.get_window_size(4, memory_budget=10, task_memory=100))
+        executor = executors.ProcessPoolExecutor(max_workers=4, memory_budget=400, task_memory=100)
+        try:
+            self.assertEqual(4, executor.get_window_size())
+        finally:
+            executor.shutdown()
+
+    def test_cluster_window_size(self):
+        # Two nodes each bound by its own budget, not the budget of one node shared by the cluster
+        self.assertEqual(6, executors.get_cluster_window_size([4, 4], memory_budget=350, task_memory=100))
+        self.assertEqual(12, executors.get_cluster_window_size([4, 2], memory_budget=1e6, task_memory=100))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import numpy as np
+import gain_calculator.core as core
+from gain_calculator.core import fac_wrapper
+from gain_calculator.core.fac_wrapper.generator import Generator
+from gain_calculator.core.rates import read_excitation_table
+
+try:
+    import pfac.crm
+    has_pfac = True
+except ImportError:
+    has_pfac = False
+
+smaller_model = "Ge 1*2 2*8 up to n=3"
+
+
+@unittest.skipUnless(has_pfac, "needs pfac to generate the atomic data")
+class TestGenerator(unittest.TestCase):
+    def setUp(self):
+        core.init(executor="serial")
+        # The cached n=3 model the n=4 model can extend, the reference n=4 model is generated from scratch
+        self.folder = tempfile.mkdtemp()
+        self.direct_folder = tempfile.mkdtemp()
+        shutil.copytree(os.path.join(os.path.abspath(os.path.dirname(__file__)), "atomic_data", smaller_model),
+                        os.path.join(self.folder, smaller_model))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+        shutil.rmtree(self.direct_folder)
+
+    @staticmethod
+    def __create_atom(folder, **options):
+        return core.Atom("Ge", core.ConfigGroups(base="1*2 2*8", max_n=4), folder, **options)
+
+    def __read_table(self, folder, filename):
+        return os.path.join(folder, smaller_model.replace("n=3", "n=4"), filename)
+
+    def test_extension_off_by_default(self):
+        atom = self.__create_atom(self.folder)
+        self.assertFalse(atom.extend_smaller_models)
+        levels = atom.get_level_table()
+        direct_levels = self.__create_atom(self.direct_folder).get_level_table()
+        np.testing.assert_array_equal(direct_levels.name, levels.name)
+        np.testing.assert_allclose(direct_levels.energy, levels.energy)
+
+    def test_extended_model(self):
+        levels = self.__create_atom(self.folder, extend_smaller_models=True).get_level_table()
+        direct_levels = self.__create_atom(self.direct_folder).get_level_table()
+        smaller_levels = core.LevelTable.from_file(os.path.join(self.folder, smaller_model, "levels.txt"))
+
+        # The old levels come first and are the ones of the smaller model
+        self.assertEqual(len(direct_levels), len(levels))
+        np.testing.assert_array_equal(smaller_levels.name, levels.name[:len(smaller_levels)])
+        np.testing.assert_allclose(smaller_levels.energy, levels.energy[:len(smaller_levels)])
+
+        # Without the neglected interaction of the n=3 and n=4 groups the levels are the directly computed ones
+        self.assertEqual(set(direct_levels.name), set(levels.name))
+        rows = [direct_levels.get_row(name) for name in levels.name]
+        np.testing.assert_allclose(direct_levels.energy[rows], levels.energy, rtol=1e-3, atol=1.0)
+
+        # The old tables are kept, the tables of the new groups are appended
+        for read_table, filename in [(fac_wrapper.read_transitions_table, "transitions.txt"),
+                                     (read_excitation_table, "excitation.txt")]:
+            smaller_table = read_table(os.path.join(self.folder, smaller_model, filename))
+            table = read_table(self.__read_table(self.folder, filename))
+            direct_table = read_table(self.__read_table(self.direct_folder, filename))
+            self.assertEqual(len(direct_table["lower"]), len(table["lower"]))
+            old = np.in1d(table["upper"], smaller_levels.index) & np.in1d(table["lower"], smaller_levels.index)
+            self.assertEqual(len(smaller_table["lower"]), np.count_nonzero(old))
+
+
+
+class RecordingFac:
+    # Stands in for pfac.fac, records the calls and writes the saved potentials
+    def __init__(self, cache_supported):
+        self.calls = []
+        if cache_supported:
+            self.SavePotential = self.__save_potential
+            self.RestorePotential = lambda filename: self.calls.append(("RestorePotential", filename))
+
+    def __save_potential(self, filename):
+        self.calls.append(("SavePotential", filename))
+        with open(filename, "w") as f:
+            f.write("potential")
+
+    def __getattr__(self, name):
+        if name in ["SavePotential", "RestorePotential", "JoinTable"]:
+            raise AttributeError(name)
+        return lambda *args: self.calls.append((name,) + args)
+
+    def get_names(self):
+        return [call[0] for call in self.calls if call[0] in ["OptimizeRadial", "SavePotential", "RestorePotential"]]
+
+
+class PotentialAtom:
+    symbol = "Ge"
+    config_groups = core.ConfigGroups(base="1*2 2*8", max_n=3)
+    extend_smaller_models = False
+
+    def __str__(self):
+        return "Ge 1*2 2*8"
+
+
+class TestPotentialCache(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.modules = {name: sys.modules.get(name) for name in ["pfac", "pfac.fac"]}
+
+    def tearDown(self):
+        for name, module in self.modules.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+        shutil.rmtree(self.folder)
+
+    def __generate(self, max_n, cache_supported=True):
+        fac = RecordingFac(cache_supported)
+        sys.modules["pfac"] = type(sys)("pfac")
+        sys.modules["pfac.fac"] = sys.modules["pfac"].fac = fac
+        atom = PotentialAtom()
+        atom.config_groups = core.ConfigGroups(base="1*2 2*8", max_n=max_n)
+        Generator(atom, self.folder)
+        return fac
+
+    def test_saved_then_restored(self):
+        potential_filename = os.path.join(self.folder, "potentials", "Ge 1*2 2*8.pot")
+        self.assertEqual(["OptimizeRadial", "SavePotential"], self.__generate(3).get_names())
+        # The temporary file is renamed to the cached one
+        self.assertEqual([os.path.basename(potential_filename)], os.listdir(os.path.dirname(potential_filename)))
+
+        fac = self.__generate(4)
+        self.assertEqual(["RestorePotential"], fac.get_names())
+        self.assertIn(("RestorePotential", potential_filename), fac.calls)
+
+    def test_without_cache_support(self):
+        self.assertEqual(["OptimizeRadial"], self.__generate(3, cache_supported=False).get_names())
+        self.assertEqual(["OptimizeRadial"], self.__generate(4, cache_supported=False).get_names())
+        self.assertFalse(os.path.exists(os.path.join(self.folder, "potentials")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from gain_calculator.core.instrumentation import Instrumentation
+from gain_calculator.core.instrumentation import get_peak_memory
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.instrumentation = Instrumentation(tracing=True)
+        for _ in range(3):
+            with self.instrumentation.stage("parser.crm_solve"):
+                pass
+        with self.instrumentation.stage("atom.wait"):
+            pass
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        del self.instrumentation
+        shutil.rmtree(self.folder)
+
+    def test_report(self):
+        report = self.instrumentation.get_report()
+        self.assertEqual({"parser.crm_solve", "atom.wait"}, set(report))
+        self.assertEqual(3, report["parser.crm_solve"]["count"])
+        self.assertGreaterEqual(report["parser.crm_solve"]["max"], report["parser.crm_solve"]["mean"])
+        self.assertGreaterEqual(report["atom.wait"]["peak_memory"], 0.0)
+
+    def test_chrome_trace(self):
+        filename = os.path.join(self.folder, "trace.json")
+        self.instrumentation.save_chrome_trace(filename)
+        with open(filename) as f:
+            events = json.load(f)["traceEvents"]
+        self.assertEqual(4, len(events))
+        self.assertEqual("X", events[0]["ph"])
+        self.assertEqual("parser", events[0]["cat"])
+
+    def test_disabled(self):
+        self.instrumentation.reset()
+        self.instrumentation.enabled = False
+        with self.instrumentation.stage("atom.wait"):
+            pass
+        self.assertEqual({}, self.instrumentation.get_report())
+
+    def test_peak_memory(self):
+        # Any Python process takes a few MB and far less than a TB, whatever unit the platform reports
+        self.assertGreater(get_peak_memory(), 1.0)
+        self.assertLess(get_peak_memory(), 1e6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import pickle
+import unittest
+import numpy as np
+import gain_calculator.core as core
+
+
+class TestCompactLevel(unittest.TestCase):
+    def test_interned(self):
+        level = core.CompactLevel.from_fac_name("2p-1(1)1.3p-1(1)0")
+        self.assertIs(level, core.CompactLevel.from_fac_name("2p-1(1)1.3p-1(1)0"))
+
+    def test_terms(self):
+        level = core.CompactLevel.from_fac_name("2p-1(1)1.3p-1(1)0")
+        self.assertSequenceEqual(((2, 1, -1, 1, 1, 1), (3, 1, -1, 1, 1, 0)), level.terms)
+        self.assertEqual(1, level.degeneracy)
+
+    def test_multi_digit_angular_momentum(self):
+        level = core.CompactLevel.from_fac_name("2p+3(3)3.5g+1(9)12")
+        self.assertEqual(12, level.j2)
+
+    def test_pickle_keeps_interning(self):
+        level = core.CompactLevel.from_fac_name("2p+3(3)3.3s+1(1)4")
+        self.assertIs(level, pickle.loads(pickle.dumps(level, protocol=2)))
+
+    def test_energy_level_compact(self):
+        energy_level = core.EnergyLevel("1s+2(0)0 2s+2(0)0 2p-2(0)0 2p+3(3)3 3s+1(1)4")
+        self.assertIs(core.CompactLevel.from_fac_name("2p+3(3)3.3s+1(1)4"), energy_level.get_compact())
+
+    def test_invalid_name(self):
+        self.assertRaises(AssertionError, core.CompactLevel.from_fac_name, "2p+3(3)3 3s+1(1)4")
+
+    def test_encode_level_names(self):
+        codes, term_counts = core.encode_level_names(["2p+4(0)0", "2p-1(1)1.3p-1(1)0"])
+        self.assertSequenceEqual((2, 2, 6), codes.shape)
+        self.assertSequenceEqual([1, 2], list(term_counts))
+        self.assertSequenceEqual([0, 0, 0, 0, 0, 0], list(codes[0, 1]))
+        self.assertSequenceEqual([3, 1, -1, 1, 1, 0], list(codes[1, 1]))
+
+
+class TestLevelTable(unittest.TestCase):
+    def setUp(self):
+        self.table = core.LevelTable.from_file(os.path.join(
+            os.path.abspath(os.path.dirname(__file__)), "atomic_data", "Ge 1*2 2*8 up to n=3", "levels.txt"))
+
+    def tearDown(self):
+        del self.table
+
+    def test_length(self):
+        self.assertEqual(37, len(self.table))
+
+    def test_get_index(self):
+        self.assertEqual(14, self.table.get_index("2p-1(1)1.3p-1(1)0"))
+
+    def test_select(self):
+        self.assertSequenceEqual([10, 14], list(self.table.select(configuration="2p5 3p", j2=0)))
+
+    def test_subshell_occupancy(self):
+        row = self.table.get_row("2p-1(1)1.3p-1(1)0")
+        occupancy = dict(zip(self.table.subshells, self.table.subshell_occupancy[row]))
+        self.assertEqual({"1s": 2, "2s": 2, "2p": 5, "3s": 0, "3p": 1, "3d": 0}, occupancy)
+
+    def test_mask_energy(self):
+        self.assertTrue(np.all(self.table.energy[self.table.mask(max_energy=1.3e3)] <= 1.3e3))
+
+
+if __name__ == '__main__':
+    unittest.main()
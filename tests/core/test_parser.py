@@ -0,0 +1,14 @@
+import unittest
+import numpy as np
+from gain_calculator.core import fac_wrapper
+
+
+class TestConvergence(unittest.TestCase):
+    def test_convergence_error(self):
+        reference = np.array([0.5, 0.25, 0.0])
+        self.assertAlmostEqual(0.1, fac_wrapper.get_convergence_error(np.array([0.5, 0.275, 1e-9]), reference))
+        self.assertEqual(0.0, fac_wrapper.get_convergence_error(np.array([1e-9]), np.array([0.0])))
+
+
+if __name__ == '__main__':
+    unittest.main()
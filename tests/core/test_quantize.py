@@ -0,0 +1,47 @@
+import unittest
+import numpy as np
+import gain_calculator.core as core
+
+
+class TestQuantizeStates(unittest.TestCase):
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.temperatures = np.repeat(random.uniform(100, 1000, 50), 20) * random.uniform(0.999, 1.001, 1000)
+        self.densities = np.repeat(10 ** random.uniform(19, 22, 50), 20) * random.uniform(0.999, 1.001, 1000)
+        self.states = core.quantize_states(self.temperatures, self.densities, tolerance=1e-2)
+
+    def test_compression(self):
+        self.assertLessEqual(len(self.states.temperatures), 200)
+        self.assertGreaterEqual(self.states.compression_ratio, 5)
+
+    def test_error(self):
+        self.assertLessEqual(self.states.max_temperature_error, 6e-3)
+        self.assertLessEqual(self.states.max_density_error, 6e-3)
+
+    def test_scatter(self):
+        np.testing.assert_allclose(self.states.scatter(self.states.temperatures), self.temperatures, rtol=6e-3)
+
+    def test_propagate_error(self):
+        # Dense states, linear in the logarithms the first order estimate is exact
+        random = np.random.RandomState(1)
+        temperatures = 10 ** random.uniform(2, 2.05, 2000)
+        densities = 10 ** random.uniform(20, 20.05, 2000)
+        states = core.quantize_states(temperatures, densities, tolerance=1e-2)
+        values = 2 * np.log(states.temperatures) - 3 * np.log(states.electron_densities)
+        errors = states.propagate_error(values)
+        self.assertEqual((2000,), errors.shape)
+        # The errors along both axes add up, so the estimate bounds the actual error
+        temperature_offsets = np.abs(np.log(temperatures) - states.scatter(np.log(states.temperatures)))
+        density_offsets = np.abs(np.log(densities) - states.scatter(np.log(states.electron_densities)))
+        np.testing.assert_allclose(errors, 2 * temperature_offsets + 3 * density_offsets)
+        actual_errors = np.abs(states.scatter(values) - 2 * np.log(temperatures) + 3 * np.log(densities))
+        self.assertTrue(np.all(errors >= actual_errors - 1e-12))
+        self.assertEqual((2000, 2), states.propagate_error(np.column_stack([values, values])).shape)
+
+    def test_rejects_non_positive(self):
+        self.assertRaises(ValueError, core.quantize_states, [0.0, 100.0], [1e20, 1e20])
+        self.assertRaises(ValueError, core.quantize_states, [100.0, 100.0], [-1e20, 1e20])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import gain_calculator.core as core
+from gain_calculator.core import fac_wrapper
+
+
+class TestRateModel(unittest.TestCase):
+    def setUp(self):
+        folder = os.path.join(os.path.abspath(os.path.dirname(__file__)), "atomic_data", "Ge 1*2 2*8 up to n=3")
+        self.model = core.RateModel(
+            levels=core.LevelTable.from_file(os.path.join(folder, "levels.txt")),
+            transitions=fac_wrapper.read_transitions_table(os.path.join(folder, "transitions.txt")),
+            excitations=core.rates.read_excitation_table(os.path.join(folder, "excitation.txt"))
+        )
+
+    def tearDown(self):
+        del self.model
+
+    def test_rate_matrix_conserves_population(self):
+        rate_matrix = self.model.get_rate_matrix(900.0, 1e20)
+        np.testing.assert_allclose(rate_matrix.sum(axis=0), 0.0, atol=1e-6 * np.abs(rate_matrix).max())
+
+    def test_populations_normalized(self):
+        self.assertAlmostEqual(2.0, self.model.get_populations(900.0, 1e20, population_total=2.0).sum())
+
+    def test_sensitivities(self):
+        populations, d_temperature, d_electron_density = self.model.get_sensitivities(900.0, 1e20)
+        np.testing.assert_allclose(populations, self.model.get_populations(900.0, 1e20))
+
+        expected_d_temperature = (self.model.get_populations(901.0, 1e20) -
+                                  self.model.get_populations(899.0, 1e20)) / 2.0
+        expected_d_electron_density = (self.model.get_populations(900.0, 1.001e20) -
+                                       self.model.get_populations(900.0, 0.999e20)) / 2e17
+        np.testing.assert_allclose(d_temperature, expected_d_temperature, rtol=1e-3,
+                                   atol=1e-6 * np.abs(expected_d_temperature).max())
+        np.testing.assert_allclose(d_electron_density, expected_d_electron_density, rtol=1e-3,
+                                   atol=1e-6 * np.abs(expected_d_electron_density).max())
+
+    def test_residual(self):
+        populations = self.model.get_populations(900.0, 1e20)
+        self.assertLess(self.model.get_residual(populations, 900.0, 1e20), 1e-10)
+        perturbed = populations * np.linspace(0.9, 1.1, len(populations))
+        self.assertGreater(self.model.get_residual(perturbed, 900.0, 1e20), 1e-3)
+
+    def test_rate_matrices_batched(self):
+        rate_matrices = self.model.get_rate_matrix(np.array([500.0, 900.0]), np.array([1e21, 1e20]))
+        np.testing.assert_allclose(rate_matrices[1], self.model.get_rate_matrix(900.0, 1e20))
+
+    def test_evolve_relaxes_to_steady_state(self):
+        times = np.array([0.0, 1e-13, 1e-9])
+        temperatures = np.array([[900.0, 900.0], [500.0, 900.0], [500.0, 900.0]])
+        electron_densities = np.array([[1e20, 1e20], [1e21, 1e20], [1e21, 1e20]])
+        populations = self.model.evolve(times, temperatures, electron_densities, substeps=8)
+
+        self.assertEqual((3, 2, len(self.model)), populations.shape)
+        np.testing.assert_allclose(populations.sum(axis=-1), 1.0)
+        np.testing.assert_allclose(populations[:, 1], np.tile(self.model.get_populations(900.0, 1e20), (3, 1)),
+                                   rtol=1e-6, atol=1e-12)
+        np.testing.assert_allclose(populations[-1, 0], self.model.get_populations(500.0, 1e21), rtol=1e-4,
+                                   atol=1e-12)
+
+    def test_evolve_implicit_euler_step(self):
+        initial = np.full((2, len(self.model)), 1.0 / len(self.model))
+        populations = self.model.evolve([0.0, 2e-12], [[900.0, 500.0], [900.0, 500.0]], [[1e20, 1e21], [1e20, 1e21]],
+                                        initial, substeps=2)
+        for cell, (temperature, electron_density) in enumerate([(900.0, 1e20), (500.0, 1e21)]):
+            step_matrix = np.eye(len(self.model)) - 1e-12 * self.model.get_rate_matrix(temperature, electron_density)
+            expected = np.linalg.solve(step_matrix, np.linalg.solve(step_matrix, initial[cell]))
+            np.testing.assert_allclose(populations[1, cell], expected, rtol=1e-10)
+
+    def test_bundle(self):
+        unbundled = self.model.bundle(min_n=4)
+        self.assertEqual(len(self.model), len(unbundled))
+        self.assertLess(unbundled.get_error(900.0, 1e20), 1e-10)
+
+        reduced = self.model.bundle(min_energy=1330.0, retained=[3, 14])
+        self.assertLess(len(reduced), len(self.model))
+        self.assertIn(3, self.model.levels.index[reduced.resolved])
+        rate_matrix = reduced.get_rate_matrix(900.0, 1e20)
+        np.testing.assert_allclose(rate_matrix.sum(axis=0), 0.0, atol=1e-6 * np.abs(rate_matrix).max())
+        self.assertAlmostEqual(1.0, reduced.get_populations(900.0, 1e20).sum())
+        # The superlevels approach the Boltzmann distribution they assume as collisions dominate
+        self.assertLess(reduced.get_error(900.0, 1e26), reduced.get_error(900.0, 1e20))
+
+    def test_process_rates(self):
+        sources, destinations, rates = self.model.get_process_rates(900.0, 1e20)
+        rate_matrix = np.zeros((len(self.model), len(self.model)))
+        np.add.at(rate_matrix, (destinations, sources), rates)
+        np.add.at(rate_matrix, (sources, sources), -rates)
+        np.testing.assert_allclose(rate_matrix, self.model.get_rate_matrix(900.0, 1e20), rtol=1e-12)
+
+    def test_bundled_rate_matrix(self):
+        reduced = self.model.bundle(min_energy=1330.0, retained=[3, 14])
+        # Aggregation of the full matrix weighted by the Boltzmann fractions within the superlevels
+        aggregation = np.zeros((len(reduced), len(self.model)))
+        aggregation[reduced.superlevels, np.arange(len(self.model))] = 1.0
+        weights = self.model.levels.degeneracy * np.exp(-self.model.levels.energy / 900.0)
+        distribution = weights / aggregation.dot(weights)[reduced.superlevels]
+        expected = aggregation.dot(self.model.get_rate_matrix(900.0, 1e20) * distribution).dot(aggregation.T)
+        np.testing.assert_allclose(reduced.get_rate_matrix(900.0, 1e20), expected, rtol=1e-8,
+                                   atol=1e-12 * np.abs(expected).max())
+
+    def test_sample_populations(self):
+        temperatures, densities = np.array([500.0, 900.0]), np.array([1e21, 1e20])
+        result = self.model.sample_populations(temperatures, densities, samples=20, seed=0, max_memory=0.01)
+        self.assertEqual((20, 2, len(self.model)), result["populations"].shape)
+        np.testing.assert_allclose(result["populations"].sum(axis=-1), 1.0)
+        np.testing.assert_allclose(result["nominal"][1], self.model.get_populations(900.0, 1e20), rtol=1e-8)
+        self.assertTrue(np.all(result["populations"].std(axis=0).max(axis=-1) > 0))
+
+        unperturbed = self.model.sample_populations(temperatures, densities, samples=3, radiative_uncertainty=0.0,
+                                                    collision_uncertainty=0.0)
+        np.testing.assert_allclose(unperturbed["populations"], np.tile(unperturbed["nominal"], (3, 1, 1)))
+        np.testing.assert_allclose(
+            self.model.sample_populations(temperatures, densities, samples=5, seed=1)["populations"],
+            self.model.sample_populations(temperatures, densities, samples=5, seed=1)["populations"])
+
+    def test_missing_excitation_table(self):
+        # Data folder copied without the excitation table and its binary
+        folder = tempfile.mkdtemp()
+        try:
+            source = os.path.join(os.path.abspath(os.path.dirname(__file__)), "atomic_data", "Ge 1*2 2*8 up to n=3")
+            for name in ["levels.txt", "transitions.txt"]:
+                shutil.copy(os.path.join(source, name), folder)
+            files = fac_wrapper.generator.FacFiles(
+                *[os.path.join(folder, name) for name in ["fac_binary_temp", "fac_binary_temp.ce",
+                                                          "fac_binary_temp.ham", "fac_binary_temp.en",
+                                                          "fac_binary_temp.tr", "levels.txt", "excitation.txt",
+                                                          "transitions.txt"]] + [folder])
+            self.assertRaises(IOError, core.RateModel.from_files, files)
+        finally:
+            shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import multiprocessing
+import os
+import unittest
+from concurrent import futures
+from gain_calculator.core import utility
+
+
+class TestUtility(unittest.TestCase):
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "needs /proc to count descriptors")
+    def test_no_stdout_restores_descriptor(self):
+        descriptor_count = len(os.listdir("/proc/self/fd"))
+        original = os.fstat(1)
+        for _ in range(10):
+            with utility.no_stdout():
+                os.write(1, b"silenced\n")
+        self.assertEqual((original.st_dev, original.st_ino), (os.fstat(1).st_dev, os.fstat(1).st_ino))
+        self.assertLessEqual(len(os.listdir("/proc/self/fd")), descriptor_count + 1)
+
+    def test_scratch_folder(self):
+        folder = utility.get_scratch_folder()
+        self.assertTrue(os.path.isdir(folder))
+        self.assertEqual(folder, utility.get_scratch_folder())
+
+    def test_scratch_folder_removed_by_workers(self):
+        # Pool workers leave by os._exit, the folder of the worker is removed anyway
+        executor = futures.ProcessPoolExecutor(max_workers=1)
+        try:
+            folder = executor.submit(utility.get_scratch_folder).result()
+            self.assertTrue(os.path.isdir(folder))
+        finally:
+            executor.shutdown()
+        self.assertFalse(os.path.exists(folder))
+
+    def test_scratch_folder_kept_by_children(self):
+        folder = utility.get_scratch_folder()
+        process = multiprocessing.Process(target=utility.get_scratch_folder)
+        process.start()
+        process.join()
+        self.assertTrue(os.path.isdir(folder))
+
+
+if __name__ == '__main__':
+    unittest.main()
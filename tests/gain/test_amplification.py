@@ -0,0 +1,62 @@
+import unittest
+import numpy as np
+from gain_calculator.gain import amplification
+
+
+class TestAmplification(unittest.TestCase):
+    def setUp(self):
+        self.positions = np.linspace(0.0, 0.01, 101)
+
+    def test_exponential_growth(self):
+        intensity = amplification.integrate_intensity(np.full((3, 50), 10.0), 0.0, 0.01, initial_intensity=2.0)
+        np.testing.assert_allclose(intensity, 2.0 * np.exp(5.0))
+
+    def test_spontaneous_emission(self):
+        gain = np.array([[10.0] * 20, [0.0] * 20])
+        intensity = amplification.integrate_intensity(gain, 3.0, 0.01)
+        np.testing.assert_allclose(intensity, [3.0 / 10.0 * np.expm1(2.0), 3.0 * 0.2])
+
+    def test_saturation(self):
+        # Without a source the intensity solves ln(I / I0) + (I - I0) / Is = g L
+        saturation_intensity = 1e3
+        history = amplification.integrate_intensity(np.full(2000, 20.0), 0.0, 1e-3, saturation_intensity,
+                                                    initial_intensity=1.0, history=True)
+        self.assertEqual((2001,), history.shape)
+        lengths = 1e-3 * np.arange(2001)
+        np.testing.assert_allclose(np.log(history) + (history - 1.0) / saturation_intensity, 20.0 * lengths,
+                                   rtol=1e-5, atol=1e-8)
+        # Deep in saturation the growth is nearly linear
+        slope = (history[-1] - history[-2]) / 1e-3
+        self.assertAlmostEqual(20.0 * history[-1] / (1 + history[-1] / saturation_intensity), slope, delta=1.0)
+        self.assertGreater(slope, 0.95 * 20.0 * saturation_intensity)
+
+    def test_rays(self):
+        gain = np.where(self.positions < 0.005, 20.0, 0.0)
+        result = amplification.get_amplified_intensity(self.positions, gain, np.ones_like(gain),
+                                                       offsets=[0.002, 0.002, 0.008], angles=[0.0, 0.01, 0.0],
+                                                       length=0.5, steps=500)
+        self.assertEqual((3,), result["intensity"].shape)
+        self.assertEqual((3, 501), result["positions"].shape)
+        self.assertAlmostEqual(10.0, result["gain_length"][0])
+        # The tilted ray leaves the gain region, linearly interpolated up to the cell at 0.005 cm, after 0.295 cm
+        self.assertAlmostEqual(5.9, result["gain_length"][1], delta=0.02)
+        self.assertAlmostEqual(np.expm1(10.0) / 20.0, result["intensity"][0], delta=1e-6 * np.exp(10.0))
+        self.assertGreater(result["intensity"][0], result["intensity"][1])
+        self.assertAlmostEqual(0.5, result["intensity"][2])
+
+    def test_refraction(self):
+        # A linear density profile bends the rays on parabolas towards the lower density
+        critical_density = amplification.get_critical_density(1000.0)
+        densities = 1e20 + 1e22 * self.positions
+        ray_positions = amplification.trace_rays(self.positions, [0.004], [0.0], 0.5, 100, densities,
+                                                 critical_density)
+        lengths = 0.005 * np.arange(101)
+        np.testing.assert_allclose(ray_positions[0], 0.004 - 1e22 / (4 * critical_density) * lengths ** 2)
+
+    def test_critical_density(self):
+        # 1.1e21 cm^-3 at 1 um, i.e. 1.24 eV
+        self.assertAlmostEqual(1.115e21, amplification.get_critical_density(1.23984), delta=1e18)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import numpy as np
+from gain_calculator.gain import GainCalculator
+
+
+def structurize(temperatures, densities, **fields):
+    result = np.zeros(len(temperatures), dtype=[(name, float) for name in
+                                                 ["temperature", "electron_density"] + sorted(fields)])
+    result["temperature"] = temperatures
+    result["electron_density"] = densities
+    for name, values in fields.items():
+        result[name] = values
+    return result
+
+
+class FakeTransition:
+    # FAC and rate model populations differ, as the rates of both models do
+    weighted_oscillator_strength = 0.3
+    energy = 1000.0
+
+    def get_populations(self, temperatures, electron_densities, combine, log=None, solver="default",
+                        reference_solver=None):
+        temperatures, densities = np.array(list(combine(temperatures, electron_densities))).T
+        fields = {"convergence_error": np.full(len(temperatures), 1e-3 if solver == "fast" else 1e-5)} \
+            if reference_solver is not None else {}
+        return {level: structurize(temperatures, densities, population=temperatures * factor, **fields)
+                for level, factor in [("lower", 1e-6), ("upper", 2e-6)]}
+
+    def get_sensitivities(self, temperatures, electron_densities, combine, log=None):
+        temperatures, densities = np.array(list(combine(temperatures, electron_densities))).T
+        return {level: structurize(temperatures, densities, population=temperatures * factor * 1.1,
+                                   d_temperature=np.full(len(temperatures), factor * 1.1),
+                                   d_electron_density=np.zeros(len(temperatures)))
+                for level, factor in [("lower", 1e-6), ("upper", 2e-6)]}
+
+
+class TestGainCalculator(unittest.TestCase):
+    def test_sensitivities_keep_fac_populations(self):
+        calculator = GainCalculator()
+        calculator.init_by_calculation(FakeTransition(), [100.0, 1000.0], [1e20, 1e21], sensitivities=True)
+        self.assertEqual({"temperature", "electron_density", "population", "d_temperature", "d_electron_density"},
+                         set(calculator.data["upper"]))
+        np.testing.assert_allclose(calculator.data["upper"]["population"],
+                                   2e-6 * calculator.data["upper"]["temperature"])
+        np.testing.assert_allclose(calculator.data["lower"]["d_temperature"], 1.1e-6)
+
+    def test_without_sensitivities(self):
+        calculator = GainCalculator()
+        calculator.init_by_calculation(FakeTransition(), [100.0, 1000.0], [1e20, 1e21])
+        self.assertEqual({"temperature", "electron_density", "population"}, set(calculator.data["lower"]))
+        self.assertRaises(AssertionError, calculator.get_population_derivatives_at, "lower", 1e20, 100.0)
+
+    def test_convergence_errors(self):
+        calculator = GainCalculator()
+        calculator.init_by_calculation(FakeTransition(), [100.0, 1000.0], [1e20, 1e21], solver="fast",
+                                       reference_solver="default")
+        np.testing.assert_allclose(calculator.data["upper"]["convergence_error"], 1e-3)
+        calculator.extend_by_calculation(FakeTransition(), [500.0], [1e20], solver="default",
+                                         reference_solver="precise")
+        np.testing.assert_allclose(calculator.data["lower"]["convergence_error"], [1e-3] * 4 + [1e-5])
+        self.assertRaises(AssertionError, calculator.extend_by_calculation, FakeTransition(), [500.0], [1e20])
+
+    def test_gain_of_arrays(self):
+        calculator = GainCalculator()
+        calculator.init_by_calculation(FakeTransition(), [100.0, 1000.0], [1e20, 1e21])
+        temperatures = []
+        calculator._GainCalculator__get_abundance = lambda t, e, z: temperatures.append(t) or 0.5
+        densities, cell_temperatures = np.array([1e20, 1e21, 1e20, 1e21]), np.array([100.0, 100.0, 1000.0, 100.0])
+        gain = calculator.get_gain(densities, cell_temperatures, 500.0, 10.0, 10, 26)
+        # One abundance per unique temperature
+        self.assertEqual([100.0, 1000.0], temperatures)
+        self.assertEqual((4,), gain.shape)
+        for i in range(4):
+            self.assertAlmostEqual(1.0, calculator.get_gain(densities[i], cell_temperatures[i], 500.0, 10.0, 10, 26) /
+                                   gain[i])
+
+    def test_quantization_error(self):
+        temperatures = np.linspace(100.0, 110.0, 200)
+        calculator = GainCalculator()
+        calculator.init_by_calculation(FakeTransition(), temperatures, np.full(200, 1e20), combine=zip,
+                                       tolerance=1e-2)
+        quantization = calculator.data["quantization"]
+        self.assertGreater(quantization["compression_ratio"], 10)
+        # Populations proportional to the temperature
+        self.assertAlmostEqual(2e-6 * 110.0 * quantization["max_temperature_error"],
+                               quantization["max_population_error"]["upper"], delta=5e-8)
+        self.assertAlmostEqual(quantization["max_temperature_error"], quantization["max_gain_error"], delta=2e-4)
+
+
+if __name__ == '__main__':
+    unittest.main()
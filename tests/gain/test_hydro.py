@@ -0,0 +1,77 @@
+import itertools
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from netCDF4 import Dataset
+from gain_calculator.gain import GainCalculator
+from gain_calculator.gain import HydroReader
+from gain_calculator.gain import write_gain_history
+from gain_calculator.gain import hydro
+
+
+class TestHydro(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, "variables.nc")
+        random = np.random.RandomState(0)
+        self.cells = {
+            "cell_temperature": random.uniform(200.0, 800.0, (3, 4)),
+            "cell_ionTemperature": random.uniform(200.0, 800.0, (3, 4)),
+            "cell_ionization": random.uniform(20.0, 24.0, (3, 4)),
+            "cell_density": random.uniform(0.01, 0.1, (3, 4)),
+            "cell_nucleonNumber": np.full((3, 4), 56.0),
+            "cell_position": np.tile(np.linspace(0.0, 0.01, 4), (3, 1))
+        }
+        dataset = Dataset(self.filename, "w")
+        dataset.createDimension("time", None)
+        dataset.createDimension("cell", 4)
+        for name, values in self.cells.items():
+            dataset.createVariable(name, "f8", ("time", "cell"))[:] = values
+        dataset.close()
+
+        # Populations linear in the logarithms on a table that holds none of the cell states
+        temperatures, densities = np.array(list(itertools.product([100.0, 1000.0], [1e19, 1e23]))).T
+        self.calculator = GainCalculator(interpolation="linear")
+        self.calculator.data = {
+            level: {
+                "temperature": temperatures,
+                "electron_density": densities,
+                "population": factor * (1 + 0.1 * np.log10(temperatures) + 0.01 * np.log10(densities))
+            } for level, factor in [("upper", 2e-3), ("lower", 1e-3)]
+        }
+        self.calculator.data.update({"transition_energy": 800.0, "oscillator_strength": 0.3})
+        # The abundance needs pfac, a constant one stands for it
+        self.calculator._GainCalculator__get_abundance = lambda temperature, electron_number, proton_number: 0.5
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_iterate(self):
+        with HydroReader(self.filename, chunk_size=2) as reader:
+            self.assertEqual(3, reader.get_timestep_count())
+            steps = list(reader.iterate(["cell_temperature", "cell_density"]))
+            np.testing.assert_allclose(reader.read("cell_density", -1), self.cells["cell_density"][-1])
+        self.assertEqual([0, 1, 2], [timestep for timestep, _ in steps])
+        np.testing.assert_allclose(steps[1][1]["cell_temperature"], self.cells["cell_temperature"][1])
+
+    def test_write_gain_history(self):
+        output = os.path.join(self.folder, "gain.nc")
+        with HydroReader(self.filename, chunk_size=2) as reader:
+            write_gain_history(reader, self.calculator, output, electron_number=10, proton_number=26)
+
+        densities = hydro.get_electron_densities(self.cells)
+        expected = self.calculator.get_gain(densities, self.cells["cell_temperature"],
+                                            self.cells["cell_ionTemperature"], self.cells["cell_ionization"], 10, 26)
+        dataset = Dataset(output, "r")
+        try:
+            np.testing.assert_allclose(dataset.variables["gain"][:], expected)
+            np.testing.assert_allclose(dataset.variables["cell_position"][:], self.cells["cell_position"])
+        finally:
+            dataset.close()
+        self.assertTrue(np.all(expected > 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
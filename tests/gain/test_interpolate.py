@@ -0,0 +1,89 @@
+import itertools
+import unittest
+import numpy as np
+from gain_calculator.gain import GainCalculator
+from gain_calculator.gain.interpolate import StateIndex
+
+
+def get_population(temperatures, densities):
+    # Linear in the logarithms, so the barycentric interpolation is exact
+    return 0.1 * np.log10(temperatures) + 0.01 * np.log10(densities)
+
+
+class TestStateIndex(unittest.TestCase):
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.temperatures = np.power(10, random.uniform(2, 3, 200))
+        self.densities = np.power(10, random.uniform(19, 22, 200))
+        self.index = StateIndex(self.temperatures, self.densities)
+
+    def test_exact_hits(self):
+        values = get_population(self.temperatures, self.densities)
+        for method in ["linear", "nearest", "exact"]:
+            np.testing.assert_allclose(self.index.interpolate(values, self.temperatures[:10], self.densities[:10],
+                                                              method), values[:10])
+
+    def test_linear_off_grid(self):
+        values = get_population(self.temperatures, self.densities)
+        temperatures, densities = np.array([300.0, 500.0]), np.array([1e20, 3e21])
+        np.testing.assert_allclose(self.index.interpolate(values, temperatures, densities),
+                                   get_population(temperatures, densities))
+        self.assertRaises(IndexError, self.index.interpolate, values, temperatures, densities, "exact")
+
+    def test_nearest_off_grid(self):
+        rows, distances = self.index.query(self.temperatures[5] * 1.0001, self.densities[5])
+        self.assertEqual(5, rows)
+        self.assertGreater(distances, 0)
+
+    def test_outside_table(self):
+        values = get_population(self.temperatures, self.densities)
+        self.assertTrue(np.isnan(self.index.interpolate(values, 1e6, 1e30)))
+        self.assertFalse(np.isnan(self.index.interpolate(values, 1e6, 1e30, "nearest")))
+
+    def test_degenerate_table(self):
+        # States of a zip combined table on a line, only the stored states are known
+        index = StateIndex([100.0, 200.0, 400.0], [1e20, 2e20, 4e20])
+        np.testing.assert_allclose(index.interpolate(np.array([1.0, 2.0, 3.0]), [200.0, 190.0, 1000.0],
+                                                     [2e20, 2e20, 1e21]), [2.0, np.nan, np.nan])
+
+    def test_rejects_non_positive(self):
+        self.assertRaises(ValueError, StateIndex, [0.0, 100.0, 200.0], [1e20, 1e20, 1e21])
+
+
+class TestGainCalculatorLookup(unittest.TestCase):
+    def setUp(self):
+        temperatures, densities = np.array(list(itertools.product([100.0, 1000.0], [1e19, 1e22]))).T
+        self.calculator = GainCalculator(interpolation="linear")
+        self.calculator.data = {
+            level: {
+                "temperature": temperatures,
+                "electron_density": densities,
+                "population": get_population(temperatures, densities) * factor
+            } for level, factor in [("upper", 1.0), ("lower", 0.5)]
+        }
+
+    def test_population_off_grid(self):
+        temperatures, densities = np.array([316.0, 500.0, 1000.0]), np.array([1e20, 1e21, 1e22])
+        np.testing.assert_allclose(self.calculator.get_population_at("upper", densities, temperatures),
+                                   get_population(temperatures, densities))
+
+    def test_index_rebuilt_when_data_change(self):
+        index = self.calculator.get_index("upper")
+        self.assertIs(index, self.calculator.get_index("upper"))
+        self.calculator.data["upper"]["temperature"] = self.calculator.data["upper"]["temperature"] * 2
+        self.assertIsNot(index, self.calculator.get_index("upper"))
+
+    def test_population_outside_table(self):
+        populations = self.calculator.get_population_at("upper", [1e30, 1e20], [1e6, 316.0])
+        self.assertTrue(np.isnan(populations[0]))
+        self.assertAlmostEqual(get_population(316.0, 1e20), populations[1])
+
+    def test_exact_interpolation(self):
+        self.assertEqual("exact", GainCalculator().interpolation)
+        self.calculator.interpolation = "exact"
+        self.assertRaises(IndexError, self.calculator.get_population_at, "upper", 1e20, 316.0)
+        self.assertAlmostEqual(get_population(100.0, 1e19), self.calculator.get_population_at("upper", 1e19, 100.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
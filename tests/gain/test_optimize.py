@@ -0,0 +1,118 @@
+import itertools
+import os
+import unittest
+import numpy as np
+import gain_calculator.core as core
+from gain_calculator.gain import GainCalculator
+from gain_calculator.gain import GainOptimizer
+
+try:
+    import pfac.crm
+    has_pfac = True
+except ImportError:
+    has_pfac = False
+
+
+class PeakedTransition:
+    # Inversion peaked at 500 eV and 3e20 cm^-3 with analytic derivatives
+    weighted_oscillator_strength = 0.3
+    energy = 1000.0
+
+    @staticmethod
+    def __get_levels(temperatures, electron_densities, combine):
+        temperatures, densities = np.array(list(combine(np.atleast_1d(temperatures),
+                                                        np.atleast_1d(electron_densities)))).T
+        x, y = np.log10(temperatures / 500.0), np.log10(densities / 3e20)
+        population = 1e-3 * np.exp(-x ** 2 / 0.1 - y ** 2 / 0.5)
+        levels = {}
+        for level, factor in [("lower", 0.0), ("upper", 1.0)]:
+            levels[level] = np.zeros(len(temperatures), dtype=[(name, float) for name in [
+                "temperature", "electron_density", "population", "d_temperature", "d_electron_density"]])
+            levels[level]["temperature"] = temperatures
+            levels[level]["electron_density"] = densities
+            levels[level]["population"] = factor * population
+            levels[level]["d_temperature"] = factor * population * -2 * x / 0.1 / (temperatures * np.log(10))
+            levels[level]["d_electron_density"] = factor * population * -2 * y / 0.5 / (densities * np.log(10))
+        return levels
+
+    def get_populations(self, temperatures, electron_densities, combine, log=None, solver="default",
+                        reference_solver=None):
+        levels = self.__get_levels(temperatures, electron_densities, combine)
+        return {level: populations[["temperature", "electron_density", "population"]]
+                for level, populations in levels.items()}
+
+    def get_sensitivities(self, temperatures, electron_densities, combine, log=None):
+        return self.__get_levels(temperatures, electron_densities, combine)
+
+
+def constant_abundance(calculator):
+    # The abundance needs pfac, a constant one stands for it
+    calculator._GainCalculator__get_abundance = lambda temperature, electron_number, proton_number: 0.5
+    return calculator
+
+
+class TestGainOptimizerSurface(unittest.TestCase):
+    def setUp(self):
+        self.optimizer = GainOptimizer(PeakedTransition(), (100.0, 2000.0), (1e19, 1e22), ionization=22,
+                                       electron_number=10, proton_number=32, max_solves=25)
+        constant_abundance(self.optimizer.calculator)
+
+    def test_optimum(self):
+        result = self.optimizer.optimize(contour_size=5)
+        grid = constant_abundance(GainCalculator())
+        temperatures, densities = np.logspace(2, np.log10(2000.0), 9), np.logspace(19, 22, 9)
+        grid.init_by_calculation(PeakedTransition(), temperatures, densities)
+        pairs = np.array(list(itertools.product(temperatures, densities)))
+        grid_gains = grid.get_gain(pairs[:, 1], pairs[:, 0], pairs[:, 0], 22, 10, 32)
+        self.assertGreaterEqual(result.gain, 0.99 * grid_gains.max())
+        self.assertLessEqual(result.solves, 25)
+        self.assertEqual((5, 5), result.contour_gains.shape)
+        self.assertAlmostEqual(result.gain, result.contour_gains.max(), delta=0.1 * result.gain)
+
+    def test_gradient_step_increases_gain(self):
+        # The 3x3 design alone against the design followed by the ascent
+        design_optimizer = GainOptimizer(PeakedTransition(), (100.0, 2000.0), (1e19, 1e22), ionization=22,
+                                         electron_number=10, proton_number=32, max_solves=9)
+        constant_abundance(design_optimizer.calculator)
+        design = design_optimizer.optimize(contour_size=3)
+        self.assertEqual(9, design.solves)
+        self.assertGreater(self.optimizer.optimize(contour_size=3).gain, design.gain)
+
+
+@unittest.skipUnless(has_pfac, "needs pfac to solve the populations")
+class TestGainOptimizer(unittest.TestCase):
+    def setUp(self):
+        core.init(executor="serial")
+        atom = core.Atom(
+            symbol="Ge",
+            config_groups=core.ConfigGroups(base="1*2 2*8", max_n=3),
+            data_folder=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "core",
+                                     "atomic_data")
+        )
+        self.transition = core.Transition(
+            atom=atom,
+            lower=core.EnergyLevel("1s+2(0)0 2s+2(0)0 2p-1(1)1 2p+4(1)1 3s+1(1)2"),
+            upper=core.EnergyLevel("1s+2(0)0 2s+2(0)0 2p-1(1)1 2p+4(6)1 3p+1(3)4"),
+        )
+        self.bounds = {"temperature_bounds": (300.0, 1500.0), "density_bounds": (1e19, 1e21)}
+
+    def test_gradient_step_increases_gain(self):
+        # The 3x3 design alone against the design followed by a few ascent steps
+        design = GainOptimizer(self.transition, ionization=22, electron_number=10, proton_number=32, max_solves=9,
+                               **self.bounds).optimize(contour_size=3)
+        result = GainOptimizer(self.transition, ionization=22, electron_number=10, proton_number=32, max_solves=13,
+                               **self.bounds).optimize(contour_size=3)
+        self.assertEqual(9, design.solves)
+        self.assertGreater(result.gain, design.gain)
+
+    def test_stores_fac_populations(self):
+        result = GainOptimizer(self.transition, ionization=22, electron_number=10, proton_number=32, max_solves=9,
+                               **self.bounds).optimize(contour_size=3)
+        populations = self.transition.get_populations([result.temperature], [result.electron_density], zip)
+        self.assertAlmostEqual(populations["upper"]["population"][0],
+                               result.calculator.get_population_at("upper", result.electron_density,
+                                                                   result.temperature), places=8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import itertools
+import unittest
+import numpy as np
+from scipy import special
+from gain_calculator.gain import GainCalculator
+from gain_calculator.gain import get_gain_cube
+from gain_calculator.gain import profiles
+
+
+def create_calculator(transition_energy, oscillator_strength):
+    temperatures, densities = np.array(list(itertools.product([100.0, 1000.0], [1e19, 1e22]))).T
+    calculator = GainCalculator(interpolation="linear")
+    calculator.data = {
+        "upper": {"temperature": temperatures, "electron_density": densities, "population": np.full(4, 0.02)},
+        "lower": {"temperature": temperatures, "electron_density": densities, "population": np.full(4, 0.01)},
+        "transition_energy": transition_energy,
+        "oscillator_strength": oscillator_strength
+    }
+    # The abundance needs pfac, a constant one stands for it
+    calculator._GainCalculator__get_abundance = lambda temperature, electron_number, proton_number: 0.5
+    return calculator
+
+
+class TestVoigt(unittest.TestCase):
+    def test_faddeeva(self):
+        x, y = np.meshgrid(np.linspace(-30, 30, 601), np.concatenate([[0.0], np.logspace(-4, 2, 61)]))
+        exact = special.wofz(x + 1j * y)
+        np.testing.assert_allclose(profiles.faddeeva(x, y), exact, rtol=0, atol=1e-4 * np.abs(exact).max())
+        np.testing.assert_allclose(profiles.faddeeva(x, y).real, exact.real, rtol=2e-4, atol=1e-12)
+
+    def test_normalization(self):
+        offsets = np.linspace(-2e4, 2e4, 400001)
+        for lorentz_fwhm in [0.0, 1.0, 10.0]:
+            profile = profiles.voigt(offsets, 2.0, lorentz_fwhm)
+            self.assertAlmostEqual(1.0, np.trapz(profile, offsets), delta=1e-3)
+
+    def test_limits(self):
+        offsets = np.linspace(-5.0, 5.0, 11)
+        sigma = 2.0 / (2 * np.sqrt(2 * np.log(2)))
+        np.testing.assert_allclose(profiles.voigt(offsets, 2.0, 0.0),
+                                   np.exp(-offsets ** 2 / (2 * sigma ** 2)) / (sigma * np.sqrt(2 * np.pi)), rtol=2e-4)
+        # A narrow Gaussian leaves the Lorentzian
+        np.testing.assert_allclose(profiles.voigt(offsets, 1e-4, 2.0), 1.0 / (np.pi * (1 + offsets ** 2)),
+                                   rtol=1e-4)
+
+    def test_rejects_zero_doppler_width(self):
+        self.assertRaises(AssertionError, profiles.voigt, [0.0], 0.0, 1.0)
+
+
+class TestGainSpectrum(unittest.TestCase):
+    def setUp(self):
+        self.calculator = create_calculator(1000.0, 0.3)
+        self.states = (np.array([1e20, 1e21, 3e21]), np.array([300.0, 500.0, 800.0]), np.array([300.0, 500.0, 800.0]),
+                       np.array([16.0, 17.0, 18.0]), 10, 26)
+
+    def test_spectrum(self):
+        line = self.calculator.get_line_parameters(*self.states)
+        width = (line["doppler_fwhm"] + line["lorentz_fwhm"]).max()
+        frequencies = line["centre"][0] + np.linspace(-200 * width, 200 * width, 40001)
+        spectra = self.calculator.get_gain_spectrum(frequencies, *self.states)
+        self.assertEqual((3, 40001), spectra.shape)
+        self.assertTrue(np.all(spectra.argmax(axis=1) == 20000))
+        # Integrated over the frequency the profile drops out, the line centre gain uses the inverse sum of widths
+        np.testing.assert_allclose(np.trapz(spectra, frequencies), line["strength"], rtol=1e-2)
+        np.testing.assert_allclose(line["strength"] / (line["doppler_fwhm"] + line["lorentz_fwhm"]),
+                                   self.calculator.get_gain(*self.states))
+
+    def test_cube(self):
+        calculators = [self.calculator, create_calculator(1001.0, 0.6)]
+        centres = [calculator.get_line_parameters(*self.states)["centre"][0] for calculator in calculators]
+        frequencies = np.linspace(centres[0] - 1e14, centres[1] + 1e14, 301)
+        cube = get_gain_cube(calculators, frequencies, *self.states)
+        self.assertEqual((3, 301, 2), cube.shape)
+        for transition, calculator in enumerate(calculators):
+            np.testing.assert_allclose(cube[..., transition], calculator.get_gain_spectrum(frequencies, *self.states))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import unittest
+import numpy as np
+import gain_calculator.core as core
+from gain_calculator.core import fac_wrapper
+from gain_calculator.gain import GainCalculator
+
+
+class SampledTransition:
+    # Transition of the bundled n=3 germanium data without the FAC generated atom
+    def __init__(self, model, lower_index, upper_index):
+        self.model = model
+        self.rows = model.levels.get_rows([lower_index, upper_index])
+        self.line = np.flatnonzero((model.transitions["lower"] == lower_index) &
+                                   (model.transitions["upper"] == upper_index))[0]
+
+    def get_population_samples(self, temperatures, electron_densities, combine, samples, radiative_uncertainty,
+                               collision_uncertainty, seed):
+        result = self.model.sample_populations(temperatures, electron_densities, samples, radiative_uncertainty,
+                                               collision_uncertainty, seed)
+        return {
+            "lower": result["populations"][..., self.rows[0]],
+            "upper": result["populations"][..., self.rows[1]],
+            "lower_nominal": result["nominal"][:, self.rows[0]],
+            "upper_nominal": result["nominal"][:, self.rows[1]],
+            "oscillator_strength_factor": result["radiative_factors"][:, self.line]
+        }
+
+
+class TestGainBands(unittest.TestCase):
+    def setUp(self):
+        folder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "core", "atomic_data",
+                              "Ge 1*2 2*8 up to n=3")
+        model = core.RateModel(
+            levels=core.LevelTable.from_file(os.path.join(folder, "levels.txt")),
+            transitions=fac_wrapper.read_transitions_table(os.path.join(folder, "transitions.txt")),
+            excitations=core.rates.read_excitation_table(os.path.join(folder, "excitation.txt"))
+        )
+        self.transition = SampledTransition(model, 4, 14)
+        self.calculator = GainCalculator()
+        # The stored gain needs pfac for the abundance, a constant gain stands for it
+        self.calculator.get_gain = lambda density, *args: np.full(np.shape(density), 2.0)
+
+    def test_bands(self):
+        bands = self.calculator.get_gain_bands(self.transition, [1e20, 1e21], [900.0, 500.0], [900.0, 500.0],
+                                               [22.0, 22.0], 10, 32, samples=200, seed=0)
+        self.assertEqual((200, 2), bands["samples"].shape)
+        self.assertEqual((3, 2), bands["quantiles"].shape)
+        self.assertTrue(np.all(bands["quantiles"][0] < bands["quantiles"][2]))
+        self.assertTrue(np.all(bands["std"] > 0))
+        np.testing.assert_allclose(bands["quantiles"][1], 2.0, rtol=0.2)
+
+    def test_no_uncertainty(self):
+        bands = self.calculator.get_gain_bands(self.transition, [1e20], [900.0], [900.0], [22.0], 10, 32,
+                                               samples=5, radiative_uncertainty=0.0, collision_uncertainty=0.0)
+        np.testing.assert_allclose(bands["samples"], 2.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
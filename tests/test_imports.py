@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+import unittest
+
+
+class TestImports(unittest.TestCase):
+    def __get_loaded_modules(self, statement):
+        code = "import sys\n{}\nprint(' '.join(sorted(sys.modules)))".format(statement)
+        output = subprocess.check_output([sys.executable, "-c", code],
+                                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        return output.decode().split()
+
+    def test_package_import_is_lazy(self):
+        modules = self.__get_loaded_modules("import gain_calculator")
+        self.assertNotIn("ray", modules)
+        self.assertNotIn("pfac", modules)
+        self.assertNotIn("netCDF4", modules)
+
+    def test_gain_calculator_creation_is_lazy(self):
+        modules = self.__get_loaded_modules("import gain_calculator\ngain_calculator.GainCalculator()")
+        self.assertNotIn("ray", modules)
+        self.assertNotIn("pfac", modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import numpy as np
+from gain_calculator import service
+
+
+class TestService(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.address = os.path.join(self.folder, "service.sock")
+        self.service = service.Service(self.address, executor="serial")
+        self.thread = threading.Thread(target=self.service.serve_forever)
+        self.thread.start()
+        for _ in range(100):
+            if os.path.exists(self.address):
+                break
+            threading.Event().wait(0.01)
+        self.client = service.Client(self.address)
+        self.filename = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "run", "data",
+                                     "1D_Fe_data.npy")
+
+    def tearDown(self):
+        self.client.shutdown_service()
+        self.client.close()
+        self.thread.join(5)
+        shutil.rmtree(self.folder)
+
+    def test_gain_calculator_proxy(self):
+        calculator = self.client.gain_calculator(self.filename)
+        temperatures = calculator.get_temperatures()[:3]
+        densities = calculator.get_densities()[:3]
+        populations = calculator.get_population_at("upper", densities, temperatures)
+        self.assertEqual((3,), np.shape(populations))
+        np.testing.assert_array_equal(populations, calculator.get_population_at("upper", densities, temperatures))
+        self.assertEqual(1, self.service.cache_hits)
+
+    def test_method_not_exposed(self):
+        calculator = self.client.gain_calculator(self.filename)
+        self.assertRaises(AttributeError, getattr, calculator, "serialize")
+        self.assertRaises(AssertionError, self.client.request, "call", "gain_calculator", calculator._spec,
+                          "serialize", ("file",), {})
+        self.assertRaises(AssertionError, self.client.request, "serve_forever")
+
+
+if __name__ == '__main__':
+    unittest.main()